@@ -0,0 +1,128 @@
+"""
+CLI для потоковой выгрузки сессий поддержки в CSV.
+
+Строки читаются из БД порциями через серверный курсор и сразу пишутся
+в выходной поток, поэтому потребление памяти не зависит от размера таблицы.
+
+Пример запуска:
+    python -m app.cli.export_sessions --output sessions.csv --status closed
+"""
+import argparse
+import csv
+import datetime
+import sys
+from typing import Optional, TextIO
+
+from sqlmodel import Session, select
+
+from app.db.session import engine
+from app.models.models import SupportSession
+
+# Количество строк, извлекаемых из курсора за один раз
+FETCH_SIZE = 1000
+
+CSV_HEADER = [
+    "id",
+    "user_telegram_id",
+    "agent_telegram_id",
+    "chat_id",
+    "topic_id",
+    "status",
+    "created_at",
+    "first_response_at",
+    "closed_at",
+    "first_response_seconds",
+    "duration_seconds",
+]
+
+
+def _seconds_between(
+    start: Optional[datetime.datetime], end: Optional[datetime.datetime]
+) -> str:
+    """Возвращает интервал в секундах или пустую строку, если он не определен."""
+    if start is None or end is None:
+        return ""
+    return f"{(end - start).total_seconds():.0f}"
+
+
+def export_sessions_csv(
+    session: Session,
+    output: TextIO,
+    status: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+) -> int:
+    """
+    Записывает сессии в CSV-поток.
+
+    :param session: Сессия базы данных.
+    :param output: Текстовый поток для записи.
+    :param status: Необязательный фильтр по статусу сессии.
+    :param since: Необязательная нижняя граница времени создания.
+    :return: Количество выгруженных сессий.
+    """
+    statement = (
+        select(
+            SupportSession.id,
+            SupportSession.user_telegram_id,
+            SupportSession.agent_telegram_id,
+            SupportSession.chat_id,
+            SupportSession.topic_id,
+            SupportSession.status,
+            SupportSession.created_at,
+            SupportSession.first_response_at,
+            SupportSession.closed_at,
+        )
+        .order_by(SupportSession.id)
+        .execution_options(stream_results=True, yield_per=FETCH_SIZE)
+    )
+    if status:
+        statement = statement.where(SupportSession.status == status)
+    if since:
+        statement = statement.where(SupportSession.created_at >= since)
+
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for row in session.exec(statement):
+        writer.writerow(
+            [
+                row.id,
+                row.user_telegram_id,
+                row.agent_telegram_id,
+                row.chat_id,
+                row.topic_id,
+                row.status,
+                row.created_at.isoformat(),
+                row.first_response_at.isoformat() if row.first_response_at else "",
+                row.closed_at.isoformat() if row.closed_at else "",
+                _seconds_between(row.created_at, row.first_response_at),
+                _seconds_between(row.created_at, row.closed_at),
+            ]
+        )
+        count += 1
+    return count
+
+
+def main(argv: Optional[list] = None) -> None:
+    """Точка входа CLI."""
+    parser = argparse.ArgumentParser(description="Выгрузка сессий поддержки в CSV.")
+    parser.add_argument("--output", "-o", help="Файл для записи (по умолчанию stdout).")
+    parser.add_argument("--status", choices=["active", "closed"], help="Фильтр по статусу.")
+    parser.add_argument(
+        "--since",
+        type=datetime.datetime.fromisoformat,
+        help="Выгружать сессии, созданные не раньше этой даты (ISO 8601).",
+    )
+    args = parser.parse_args(argv)
+
+    with Session(engine) as session:
+        if args.output:
+            with open(args.output, "w", newline="", encoding="utf-8") as output:
+                count = export_sessions_csv(session, output, args.status, args.since)
+        else:
+            count = export_sessions_csv(session, sys.stdout, args.status, args.since)
+    print(f"Exported {count} sessions.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Модуль управления фоновыми задачами.
+
+Хранит ссылки на запущенные задачи (чтобы их не собрал сборщик мусора)
+и позволяет корректно остановить их все при завершении работы бота.
+
+Задачи делятся на два вида:
+- разовые (например, отправка уведомления) — при остановке их дожидаются;
+- сервисные циклы (планировщики, периодические задачи) — при остановке их отменяют.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Coroutine, Optional, Set
+
+_background_jobs: Set[asyncio.Task] = set()
+_service_tasks: Set[asyncio.Task] = set()
+
+
+def _register(tasks: Set[asyncio.Task], coro: Coroutine, name: str) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+
+def start_background_task(coro: Coroutine, name: str) -> asyncio.Task:
+    """
+    Запускает разовую фоновую задачу и регистрирует ее.
+
+    При остановке бота такие задачи дожидаются (в пределах таймаута).
+
+    :param coro: Корутина для выполнения.
+    :param name: Имя задачи (для логов).
+    :return: Созданная задача.
+    """
+    return _register(_background_jobs, coro, name)
+
+
+def start_service_task(coro: Coroutine, name: str) -> asyncio.Task:
+    """
+    Запускает бесконечный сервисный цикл и регистрирует его.
+
+    При остановке бота такие задачи отменяются.
+
+    :param coro: Корутина для выполнения.
+    :param name: Имя задачи (для логов).
+    :return: Созданная задача.
+    """
+    return _register(_service_tasks, coro, name)
+
+
+def start_periodic_task(
+    func: Callable[[], Awaitable[None]],
+    interval: float,
+    name: str,
+    initial_delay: Optional[float] = None,
+) -> asyncio.Task:
+    """
+    Запускает периодическое выполнение `func` с заданным интервалом.
+
+    Исключения внутри `func` логируются и не останавливают расписание.
+
+    :param func: Асинхронная функция без аргументов.
+    :param interval: Интервал между запусками в секундах.
+    :param name: Имя задачи (для логов).
+    :param initial_delay: Задержка перед первым запуском (по умолчанию равна интервалу).
+    :return: Созданная задача.
+    """
+
+    async def runner() -> None:
+        await asyncio.sleep(interval if initial_delay is None else initial_delay)
+        while True:
+            try:
+                await func()
+            except Exception as e:
+                logging.error("Periodic task %s failed: %s", name, e, exc_info=True)
+            await asyncio.sleep(interval)
+
+    return start_service_task(runner(), name)
+
+
+async def stop_background_tasks(timeout: Optional[float] = None) -> None:
+    """
+    Останавливает фоновые задачи.
+
+    Сначала отменяет сервисные циклы, чтобы они не порождали новую работу,
+    затем ждет завершения разовых задач не дольше `timeout` и отменяет оставшиеся.
+
+    :param timeout: Максимальное время ожидания разовых задач (None - без ожидания).
+    """
+    services = list(_service_tasks)
+    for task in services:
+        task.cancel()
+    await asyncio.gather(*services, return_exceptions=True)
+
+    jobs = list(_background_jobs)
+    if jobs and timeout:
+        _, pending = await asyncio.wait(jobs, timeout=timeout)
+    else:
+        pending = set(jobs)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    logging.info(
+        "Stopped %s service tasks, %s jobs finished, %s jobs cancelled.",
+        len(services),
+        len(jobs) - len(pending),
+        len(pending),
+    )
@@ -0,0 +1,28 @@
+"""
+Модуль реестра ботов, обслуживаемых процессом.
+
+Один процесс может обслуживать несколько токенов. Пользователь общается
+с тем ботом, которому написал, поэтому все сообщения пользователю
+в рамках сессии должны отправляться от бота этой сессии (`SupportSession.bot_id`).
+"""
+from typing import Dict, Iterable, Optional
+
+from aiogram import Bot
+
+_bots: Dict[int, Bot] = {}
+
+
+def register_bots(bots: Iterable[Bot]) -> None:
+    """Регистрирует экземпляры Bot по их ID."""
+    for bot in bots:
+        _bots[bot.id] = bot
+
+
+def get_bot(bot_id: Optional[int], default: Bot) -> Bot:
+    """
+    Возвращает бота с заданным ID.
+
+    :param bot_id: ID бота сессии.
+    :param default: Бот, используемый, если бот с таким ID не обслуживается процессом.
+    """
+    return _bots.get(bot_id, default)
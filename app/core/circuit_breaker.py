@@ -0,0 +1,244 @@
+"""
+Модуль автоматического выключателя (circuit breaker) для вызовов Bot API.
+
+Когда Telegram деградирует, каждый вызов ждет таймаута, а хэндлеры
+успевают занять агентов и выполнить откат. Выключатель считает ошибки
+каждого метода Bot API в скользящем окне и при высокой доле ошибок
+«размыкается»: вызовы метода сразу завершаются `CircuitOpenError`.
+Через `open_seconds` выключатель пропускает пробный вызов (half-open):
+успех замыкает его, ошибка снова размыкает.
+
+Ошибками считаются только сбои сети и ответы 5xx; ошибки запроса
+(400, 403, flood control) говорят о самом запросе, а не о доступности Telegram.
+"""
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, FrozenSet, ItemsView, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramServerError
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Значения состояния в метриках
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Long polling имеет собственную задержку повторов и не должен отключаться выключателем
+EXCLUDED_METHODS: FrozenSet[str] = frozenset({"getUpdates"})
+
+
+class CircuitOpenError(Exception):
+    """Вызов метода Bot API отклонен: выключатель разомкнут."""
+
+    def __init__(self, method: str, retry_in: float):
+        super().__init__(f"Circuit for {method} is open, retry in {retry_in:.0f}s")
+        self.method = method
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Выключатель одного метода Bot API.
+
+    :param error_rate: Доля ошибок в окне, при которой выключатель размыкается.
+    :param min_requests: Минимальное количество вызовов в окне для принятия решения.
+    :param window: Длина скользящего окна в секундах.
+    :param open_seconds: Сколько секунд выключатель остается разомкнутым.
+    """
+
+    def __init__(
+        self,
+        error_rate: float,
+        min_requests: int,
+        window: float,
+        open_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.error_rate = error_rate
+        self.min_requests = max(1, min_requests)
+        self.window = window
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._trial_in_progress = False
+        # Исходы вызовов в окне: (время, ошибка ли)
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._errors = 0
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, failed = self._outcomes.popleft()
+            self._errors -= failed
+
+    def retry_in(self) -> float:
+        """Сколько секунд осталось до пробного вызова."""
+        return max(0.0, self.opened_at + self.open_seconds - self.clock())
+
+    def is_open(self) -> bool:
+        """Разомкнут ли выключатель (без учета пробного вызова)."""
+        if self.state == OPEN and self.retry_in() <= 0:
+            self.state = HALF_OPEN
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов; в состоянии half-open пропускает один пробный вызов."""
+        if self.is_open():
+            return False
+        if self.state == HALF_OPEN:
+            if self._trial_in_progress:
+                return False
+            self._trial_in_progress = True
+        return True
+
+    def abandon_trial(self) -> None:
+        """Разрешает новый пробный вызов, если текущий не завершился (например, отменен)."""
+        self._trial_in_progress = False
+
+    def record(self, failed: bool) -> None:
+        """Учитывает исход вызова."""
+        now = self.clock()
+        if self.state == OPEN:
+            # Ответ на вызов, начатый до размыкания
+            return
+        if self.state == HALF_OPEN:
+            self._trial_in_progress = False
+            if failed:
+                self._open(now)
+            else:
+                self.state = CLOSED
+                self._outcomes.clear()
+                self._errors = 0
+            return
+        self._outcomes.append((now, failed))
+        self._errors += failed
+        self._trim(now)
+        total = len(self._outcomes)
+        if failed and total >= self.min_requests and self._errors / total >= self.error_rate:
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self._outcomes.clear()
+        self._errors = 0
+
+
+class CircuitBreakerRegistry:
+    """Выключатели методов Bot API, создаваемые при первом вызове метода."""
+
+    def __init__(self, error_rate: float, min_requests: int, window: float, open_seconds: float):
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def __getitem__(self, method: str) -> CircuitBreaker:
+        breaker = self._breakers.get(method)
+        if breaker is None:
+            breaker = self._breakers[method] = CircuitBreaker(
+                self.error_rate, self.min_requests, self.window, self.open_seconds
+            )
+        return breaker
+
+    def items(self) -> ItemsView[str, CircuitBreaker]:
+        return self._breakers.items()
+
+    def open_method(self, *methods: str) -> Optional[str]:
+        """Возвращает первый из методов, выключатель которого разомкнут."""
+        for method in methods:
+            breaker = self._breakers.get(method)
+            if breaker is not None and breaker.is_open():
+                return method
+        return None
+
+    def ensure_closed(self, *methods: str) -> None:
+        """
+        Проверяет выключатели методов до начала операции.
+
+        :raises CircuitOpenError: Если выключатель одного из методов разомкнут.
+        """
+        method = self.open_method(*methods)
+        if method is not None:
+            raise CircuitOpenError(method, self._breakers[method].retry_in())
+
+    def reset(self) -> None:
+        self._breakers.clear()
+
+
+class CircuitBreakerMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot API, пропускающее вызовы через выключатели методов."""
+
+    def __init__(self, breakers: CircuitBreakerRegistry):
+        self.breakers = breakers
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        if name in EXCLUDED_METHODS:
+            return await make_request(bot, method)
+        breaker = self.breakers[name]
+        if not breaker.allow():
+            rejected_calls.inc(method=name)
+            raise CircuitOpenError(name, breaker.retry_in())
+        previous_state = breaker.state
+        try:
+            response = await make_request(bot, method)
+        except (TelegramNetworkError, TelegramServerError):
+            breaker.record(failed=True)
+            if breaker.state == OPEN:
+                logging.error("Circuit for %s opened for %ss.", name, breaker.open_seconds)
+            raise
+        except TelegramAPIError:
+            # Ошибка запроса — Telegram ответил, значит, он доступен
+            breaker.record(failed=False)
+            raise
+        except BaseException:
+            # Отмена вызова ничего не говорит о доступности Telegram
+            breaker.abandon_trial()
+            raise
+        breaker.record(failed=False)
+        if previous_state == HALF_OPEN and breaker.state == CLOSED:
+            logging.info("Circuit for %s closed.", name)
+        return response
+
+
+circuit_state = registry.gauge(
+    "aegis_telegram_circuit_state", "Bot API circuit state (0 closed, 1 half-open, 2 open)", ("method",)
+)
+rejected_calls = registry.counter(
+    "aegis_telegram_circuit_rejected_total", "Bot API calls rejected by an open circuit", ("method",)
+)
+
+# Единственный экземпляр для всего приложения
+circuit_breakers = CircuitBreakerRegistry(
+    error_rate=settings.CIRCUIT_ERROR_RATE,
+    min_requests=settings.CIRCUIT_MIN_REQUESTS,
+    window=settings.CIRCUIT_WINDOW_SECONDS,
+    open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+)
+
+
+def _collect_metrics() -> None:
+    for method, breaker in circuit_breakers.items():
+        breaker.is_open()  # переводит истекший разомкнутый выключатель в half-open
+        circuit_state.set(STATE_VALUES[breaker.state], method=method)
+
+
+registry.register_collector(_collect_metrics)
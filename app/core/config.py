@@ -4,7 +4,7 @@
 Загружает настройки из переменных окружения и .env файла.
 Использует Pydantic V2 для валидации данных.
 """
-from typing import List
+from typing import Dict, List, Literal
 
 from pydantic import SecretStr, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -23,11 +23,185 @@ class Settings(BaseSettings):
 
     # --- Telegram Bot Settings ---
     BOT_TOKEN: SecretStr
+    # Токены дополнительных ботов через запятую. Лимиты Bot API действуют для каждого
+    # токена отдельно, поэтому несколько ботов увеличивают пропускную способность
+    EXTRA_BOT_TOKENS: SecretStr = SecretStr("")
     ADMIN_ID: int
 
+    # --- Bot API Transport Settings ---
+    # Адрес собственного сервера telegram-bot-api, например "http://localhost:8081" (пусто - api.telegram.org)
+    TELEGRAM_API_URL: str = ""
+    # Сервер запущен с --local: файлы передаются по пути на диске, без ограничения в 20/50 МБ
+    TELEGRAM_API_LOCAL: bool = False
+    # Максимальное количество одновременных HTTP-соединений с Bot API
+    HTTP_POOL_SIZE: int = 100
+    # Максимальное количество соединений с одним хостом (0 - без ограничения)
+    HTTP_POOL_SIZE_PER_HOST: int = 0
+    # Время жизни простаивающего соединения (0 - новое соединение на каждый запрос)
+    HTTP_KEEPALIVE_SECONDS: float = 15.0
+    # Время кэширования DNS (0 - разрешать адрес при каждом соединении)
+    HTTP_DNS_CACHE_SECONDS: int = 3600
+    # Таймаут запроса к Bot API по умолчанию
+    HTTP_TIMEOUT_SECONDS: float = 60.0
+    # Таймауты отдельных методов (JSON), например {"sendMessage": 10, "createForumTopic": 15}
+    HTTP_METHOD_TIMEOUTS: Dict[str, float] = {}
+    # Отключать метод Bot API при массовых сбоях Telegram (circuit breaker): вызовы сразу
+    # завершаются ошибкой, пока Telegram не восстановится
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    # Доля сетевых ошибок и ответов 5xx в окне, при которой метод отключается
+    CIRCUIT_ERROR_RATE: float = 0.5
+    # Минимальное количество вызовов метода в окне для принятия решения
+    CIRCUIT_MIN_REQUESTS: int = 10
+    # Длина окна подсчета ошибок в секундах
+    CIRCUIT_WINDOW_SECONDS: float = 30.0
+    # Через сколько секунд после отключения метода выполняется пробный вызов
+    CIRCUIT_OPEN_SECONDS: float = 15.0
+
     # --- Support Group Settings ---
     SUPERGROUP_ID: int
+    # Дополнительные супергруппы через запятую: сессии распределяются между всеми группами,
+    # что снимает ограничения Telegram на частоту сообщений и количество тем в одном чате
+    EXTRA_SUPERGROUP_IDS: str = ""
+    # Политика выбора группы для новой сессии:
+    # least_loaded - группа с наименьшим числом активных сессий, hash - по ID пользователя
+    SESSION_PLACEMENT: Literal["least_loaded", "hash"] = "least_loaded"
+    # Закрывать темы завершенных сессий вместо удаления и открывать их заново
+    # при повторном обращении пользователя (история переписки сохраняется)
+    TOPIC_REUSE: bool = False
     AGENT_IDS: str  # Ожидается строка с ID через запятую, например "123,456"
+    # Интервал проверки изменений .env для обновления состава агентов (0 - отключено)
+    ROSTER_WATCH_INTERVAL_SECONDS: int = 0
+    # Через сколько секунд профиль агента (username и имя) запрашивается у Telegram заново
+    AGENT_PROFILE_TTL_SECONDS: int = 86400
+
+    # --- Routing Settings ---
+    # Навыки агентов (JSON): языки и темы обращений, например {"987654321": ["ru", "billing"]}
+    AGENT_SKILLS: Dict[int, List[str]] = {}
+    # Темы обращений для стартового меню (JSON): тег навыка -> текст кнопки.
+    # Пусто - меню не показывается, сессии маршрутизируются только по языку пользователя
+    SUPPORT_TOPICS: Dict[str, str] = {}
+    # Назначать любого свободного агента, если нет агента с нужными навыками
+    ROUTING_FALLBACK_TO_ANY: bool = True
+    # Сколько секунд после закрытия сессии вернувшийся пользователь закрепляется
+    # за прежним агентом (0 - отключено)
+    AFFINITY_TTL_SECONDS: int = 86400
+    # Сколько секунд ждать освобождения прежнего агента, прежде чем назначить другого
+    AFFINITY_WAIT_SECONDS: float = 0.0
+    # Сколько пользователей хранить в кэше последних сессий
+    AFFINITY_CACHE_SIZE: int = 50_000
+    # Связи исходных и пересланных сообщений (для правок и ответов): сколько хранить в памяти
+    # и сколько дней в БД
+    MESSAGE_LINK_CACHE_SIZE: int = 50_000
+    MESSAGE_LINK_TTL_DAYS: int = 7
+
+    # --- Logging Settings ---
+    LOG_LEVEL: str = "INFO"
+    # Формат логов: "text" или "json" (структурированный)
+    LOG_FORMAT: str = "text"
+    # Доля сохраняемых INFO-записей по категориям или именам логгеров (по умолчанию сохраняются все)
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+    # Окно (в секундах), в течение которого повторы одной ошибки не логируются (0 - логировать все)
+    LOG_ERROR_DEDUP_SECONDS: int = 60
+    # Логировать SQL-запросы
+    DB_ECHO: bool = False
+
+    # Следить за блокировками event loop и записывать в лог стек блокирующего кода
+    LOOP_WATCHDOG_ENABLED: bool = False
+    # Задержка event loop (в секундах), начиная с которой он считается заблокированным
+    LOOP_LAG_THRESHOLD_SECONDS: float = 0.5
+
+    # --- Metrics Settings ---
+    # Порт HTTP-эндпоинта /metrics в формате Prometheus (0 - отключено)
+    METRICS_PORT: int = 0
+    METRICS_HOST: str = "127.0.0.1"
+
+    # --- Updates Processing Settings ---
+    # Отбрасывать ли обновления, накопившиеся за время простоя бота.
+    # Если False, бот при старте обрабатывает их с ограниченным параллелизмом.
+    DROP_PENDING_UPDATES: bool = True
+    # Максимальное количество накопившихся обновлений, обрабатываемых одновременно
+    BACKLOG_CONCURRENCY: int = 20
+    # Максимальное количество одновременно обрабатываемых обновлений (0 - без ограничения).
+    # Ответы агентов обрабатываются раньше сообщений пользователей, а те — раньше новых сессий
+    UPDATE_CONCURRENCY: int = 50
+    # Максимальное количество ожидающих обработки обновлений; при переполнении
+    # пользователи получают просьбу написать позже (ответы агентов не отбрасываются)
+    UPDATE_QUEUE_LIMIT: int = 1000
+
+    # Максимальное время ожидания незавершенных хэндлеров и задач при остановке (в секундах)
+    SHUTDOWN_TIMEOUT_SECONDS: float = 20.0
+
+    # --- Flood Control Settings ---
+    # Допустимая частота сообщений от одного пользователя (сообщений в секунду, 0 - без ограничений)
+    USER_MESSAGE_RATE: float = 1.0
+    # Сколько сообщений подряд пользователь может отправить без ограничения
+    USER_MESSAGE_BURST: int = 10
+    # Пауза перед повторной попыткой создать сессию, если все операторы были заняты (в секундах)
+    SESSION_CREATE_COOLDOWN_SECONDS: int = 30
+
+    # --- Bulk Operations Settings ---
+    # Максимальная частота вызовов Bot API при массовых операциях (запросов в секунду)
+    BULK_API_RATE_LIMIT: float = 30.0
+    # Максимальное количество одновременных вызовов Bot API при массовых операциях
+    BULK_CONCURRENCY: int = 10
+
+    # --- Broadcast Settings ---
+    # Частота отправки рассылки через одного бота (сообщений в секунду; лимит Telegram — около 30)
+    BROADCAST_RATE_LIMIT: float = 25.0
+    # Количество одновременно отправляющих рассылку воркеров
+    BROADCAST_CONCURRENCY: int = 20
+
+    # --- Reconciliation Settings ---
+    # Интервал периодической сверки сессий, тем и агентов в секундах (0 - только при старте)
+    RECONCILE_INTERVAL_SECONDS: int = 3600
+
+    # --- Database Maintenance Settings ---
+    # Как часто обслуживать БД: инкрементальный VACUUM, ANALYZE и checkpoint WAL (в секундах, 0 - отключено)
+    DB_MAINTENANCE_INTERVAL_SECONDS: int = 21600
+    # Обслуживание откладывается, пока обрабатывается больше обновлений
+    DB_MAINTENANCE_MAX_IN_FLIGHT: int = 2
+    # Сколько свободных страниц возвращать ОС за один запуск
+    DB_VACUUM_PAGES_PER_RUN: int = 2000
+    # Перевести БД в режим инкрементального VACUUM. Для существующей БД это один полный VACUUM
+    # при старте (до начала обработки обновлений); без него обслуживание не возвращает страницы ОС
+    DB_INCREMENTAL_VACUUM: bool = False
+
+    # --- Idle Sessions Settings ---
+    # Время неактивности, после которого сессия закрывается автоматически (0 - отключено)
+    IDLE_TIMEOUT_SECONDS: int = 0
+    # За сколько секунд до автоматического закрытия отправляется предупреждение
+    IDLE_WARNING_SECONDS: int = 300
+
+    @property
+    def bot_tokens(self) -> List[str]:
+        """Токены всех ботов; основной (`BOT_TOKEN`) — первый."""
+        tokens = [self.BOT_TOKEN.get_secret_value()]
+        for token in self.EXTRA_BOT_TOKENS.get_secret_value().split(","):
+            token = token.strip()
+            if token and token not in tokens:
+                tokens.append(token)
+        return tokens
+
+    @property
+    def primary_bot_id(self) -> int:
+        """ID основного бота (первая часть токена до двоеточия)."""
+        return int(self.BOT_TOKEN.get_secret_value().split(":")[0])
+
+    @property
+    def supergroup_ids(self) -> List[int]:
+        """Все супергруппы поддержки; основная (`SUPERGROUP_ID`) — первая."""
+        return [self.SUPERGROUP_ID] + [
+            chat_id for chat_id in self.EXTRA_SUPERGROUP_IDS if chat_id != self.SUPERGROUP_ID
+        ]
+
+    @field_validator("EXTRA_SUPERGROUP_IDS")
+    @classmethod
+    def parse_extra_supergroup_ids(cls, v: str) -> List[int]:
+        """Преобразует строку ID дополнительных супергрупп в список чисел."""
+        try:
+            return [int(chat_id.strip()) for chat_id in v.split(",") if chat_id.strip()]
+        except ValueError:
+            raise ValueError("EXTRA_SUPERGROUP_IDS должен содержать только числа, разделенные запятой.")
 
     @field_validator("AGENT_IDS")
     @classmethod
@@ -0,0 +1,60 @@
+"""
+Модуль исполнителя задач с упорядочиванием по ключу.
+
+Задачи с одинаковым ключом выполняются строго в порядке добавления,
+задачи с разными ключами — параллельно, но не более `concurrency` одновременно.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+
+
+class KeyedExecutor:
+    """
+    Исполнитель с ограниченным параллелизмом и FIFO-порядком внутри ключа.
+
+    Каждая новая задача ключа ждет завершения предыдущей задачи того же ключа
+    и только затем занимает слот семафора, поэтому ожидание очереди
+    не блокирует обработку других ключей.
+    """
+
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._tails: Dict[Hashable, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable[None]]) -> asyncio.Task:
+        """
+        Ставит задачу в очередь ключа.
+
+        :param key: Ключ упорядочивания (например, ID чата).
+        :param job: Фабрика корутины, вызывается в момент выполнения.
+        :return: Задача-обертка.
+        """
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run(previous, job))
+        self._tails[key] = task
+        self._tasks.add(task)
+
+        def on_done(finished: asyncio.Task) -> None:
+            self._tasks.discard(finished)
+            if self._tails.get(key) is finished:
+                del self._tails[key]
+
+        task.add_done_callback(on_done)
+        return task
+
+    async def _run(self, previous: Optional[asyncio.Task], job: Callable[[], Awaitable[None]]) -> None:
+        if previous is not None:
+            # Ошибка предыдущей задачи не должна останавливать очередь ключа
+            await asyncio.wait([previous])
+        async with self._semaphore:
+            try:
+                await job()
+            except Exception as e:
+                logging.error("Keyed job failed: %s", e, exc_info=True)
+
+    async def join(self) -> None:
+        """Дожидается завершения всех поставленных задач."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
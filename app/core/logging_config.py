@@ -0,0 +1,214 @@
+"""
+Модуль настройки логирования.
+
+Хэндлеры в event loop только кладут записи в очередь; форматирование
+и запись в stdout выполняет отдельный поток (`QueueListener`), поэтому
+медленный вывод не задерживает обработку сообщений.
+
+Высокочастотные категории (пересылка сообщений, служебные логи aiogram)
+можно прореживать: из записей уровня INFO и ниже сохраняется заданная доля.
+Предупреждения и ошибки не прореживаются никогда.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Hashable, Optional, TextIO
+
+# Категория логов пересылки сообщений между пользователем и агентом
+RELAY = "relay"
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Стандартные атрибуты LogRecord; все остальные попадают в JSON как поля из `extra`
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+# Максимальное количество различных ошибок, отслеживаемых для дедупликации
+DEDUP_MAX_KEYS = 1000
+
+_listener: Optional[QueueListener] = None
+
+_exception_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует запись в одну строку JSON.
+
+    Поля, переданные через `extra`, добавляются в объект как есть.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Прореживает записи высокочастотных категорий.
+
+    Категория берется из `extra={"category": ...}`, а при ее отсутствии —
+    из имени логгера. Прореживание детерминированное: при доле 0.1
+    пропускается ровно каждая десятая запись категории.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._credits: Dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        category = getattr(record, "category", record.name)
+        rate = self.rates.get(category)
+        if rate is None or rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        # Первая запись категории всегда проходит
+        credit = self._credits.get(category, 1.0 - rate) + rate
+        if credit < 1.0:
+            self._credits[category] = credit
+            return False
+        self._credits[category] = credit - 1.0
+        record.sample_rate = rate
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler, откладывающий форматирование до потока записи.
+
+    Текст сообщения и traceback строятся в вызывающем потоке: к моменту записи
+    аргументы (изменяемые объекты) и состояние исключения могут измениться.
+    Стандартный `QueueHandler.prepare` вдобавок форматирует всю запись, чтобы
+    передать ее в другой процесс; очередь здесь внутрипроцессная, поэтому
+    время, уровень и JSON формирует поток записи.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # Исключения редки, а ссылки на кадры стека не должны жить в очереди
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class ErrorDeduplicator:
+    """
+    Подавляет повторы одной и той же ошибки в течение окна `window` секунд.
+
+    Ошибки считаются одинаковыми, если совпадают тип исключения и место,
+    где оно было выброшено. После окончания окна следующая такая ошибка
+    логируется снова вместе с количеством подавленных повторов.
+    """
+
+    def __init__(self, window: float, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self._clock = clock
+        # ключ ошибки -> [время последней записи в лог, подавлено повторов]
+        self._seen: Dict[Hashable, list] = {}
+
+    @staticmethod
+    def error_key(exception: BaseException) -> Hashable:
+        """Возвращает ключ ошибки: тип исключения и место его возникновения."""
+        traceback = exception.__traceback__
+        while traceback is not None and traceback.tb_next is not None:
+            traceback = traceback.tb_next
+        if traceback is None:
+            return type(exception).__qualname__, str(exception)
+        code = traceback.tb_frame.f_code
+        return type(exception).__qualname__, code.co_filename, traceback.tb_lineno
+
+    def check(self, exception: BaseException) -> Optional[int]:
+        """
+        Регистрирует ошибку.
+
+        :return: None, если ошибку нужно подавить, иначе количество
+                 подавленных с прошлой записи повторов.
+        """
+        if self.window <= 0:
+            return 0
+        key = self.error_key(exception)
+        now = self._clock()
+        entry = self._seen.get(key)
+        if entry is not None and now - entry[0] < self.window:
+            entry[1] += 1
+            return None
+        suppressed = entry[1] if entry is not None else 0
+        if len(self._seen) >= DEDUP_MAX_KEYS:
+            self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+        self._seen[key] = [now, 0]
+        return suppressed
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = False,
+    sample_rates: Optional[Dict[str, float]] = None,
+    stream: TextIO = sys.stdout,
+) -> QueueListener:
+    """
+    Настраивает корневой логгер на запись через очередь и фоновый поток.
+
+    :param level: Уровень логирования.
+    :param json_format: Писать записи в JSON (иначе — в текстовом формате).
+    :param sample_rates: Доля сохраняемых записей по категориям или именам логгеров.
+    :param stream: Поток вывода.
+    :return: Запущенный QueueListener (останавливается автоматически при выходе).
+    """
+    global _listener
+    stop_logging()
+    # Эти поля не выводятся, а их заполнение удорожает создание каждой записи
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    output_handler = logging.StreamHandler(stream)
+    output_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rates or {}))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, output_handler, respect_handler_level=True)
+    listener.start()
+    _listener = listener
+    return listener
+
+
+def stop_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и останавливает поток логирования."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
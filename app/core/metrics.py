@@ -0,0 +1,141 @@
+"""
+Модуль метрик в формате Prometheus.
+
+Метрики хранятся в памяти процесса: счетчики и gauge с метками. Значения,
+которые дешевле вычислить при опросе, чем поддерживать на каждом событии
+(например, длины очередей), обновляются колбэками-сборщиками перед выдачей.
+Если задан `METRICS_PORT`, метрики отдаются по HTTP на `/metrics`.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from aiohttp import web
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """Базовый класс метрики с набором меток."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получены {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels: object) -> float:
+        """Возвращает текущее значение (0, если значение не задавалось)."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        """Формирует строки метрики в текстовом формате Prometheus."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            if key:
+                labels = ",".join(f'{name}="{label}"' for name, label in zip(self.labelnames, key))
+                lines.append(f"{self.name}{{{labels}}} {value:g}")
+            else:
+                lines.append(f"{self.name} {value:g}")
+        return lines
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Значение, которое может как расти, так и уменьшаться."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Повторная регистрация (например, при повторном импорте) возвращает ту же метрику
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована с другим типом или метками.")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Создает (или возвращает существующий) счетчик."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """Создает (или возвращает существующий) gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """Регистрирует колбэк, обновляющий метрики перед каждой выдачей."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.error("Metrics collector failed: %s", e, exc_info=True)
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(host: str, port: int) -> None:
+    """
+    Отдает метрики по HTTP на `/metrics` до отмены задачи.
+
+    Запускается как сервисная задача (`start_service_task`).
+    """
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        logging.info("Metrics are served on http://%s:%s/metrics", host, port)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+# Единственный реестр для всего приложения
+registry = MetricsRegistry()
@@ -0,0 +1,77 @@
+"""
+Модуль учета удаленных тем форума.
+
+Тема сессии может быть удалена вручную, пока сессия в БД остается активной.
+Middleware сессии Bot API запоминает темы, вызов в которые завершился ошибкой
+«тема не найдена»; периодическая сверка закрывает их сессии, не проверяя
+остальные темы запросами к Telegram.
+"""
+from typing import TYPE_CHECKING, Set, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+# Фрагменты описаний ошибок Bot API, означающих, что темы не существует
+MISSING_TOPIC_ERRORS = ("thread not found", "TOPIC_ID_INVALID", "TOPIC_DELETED")
+
+# Тема форума: (ID супергруппы, ID темы)
+TopicKey = Tuple[int, int]
+
+
+def is_missing_topic_error(error: BaseException) -> bool:
+    """Проверяет, что ошибка Bot API означает отсутствие темы."""
+    return isinstance(error, TelegramBadRequest) and any(
+        marker.lower() in error.message.lower() for marker in MISSING_TOPIC_ERRORS
+    )
+
+
+class MissingTopicTracker:
+    """Темы, которые Bot API назвал несуществующими, до их обработки сверкой."""
+
+    def __init__(self):
+        self._topics: Set[TopicKey] = set()
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def report(self, chat_id: int, topic_id: int) -> None:
+        self._topics.add((chat_id, topic_id))
+
+    def drain(self) -> Set[TopicKey]:
+        """Возвращает накопленные темы и очищает список."""
+        topics, self._topics = self._topics, set()
+        return topics
+
+    def clear(self) -> None:
+        self._topics.clear()
+
+
+class MissingTopicMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot API, запоминающее темы, вызовы в которые не нашли тему."""
+
+    def __init__(self, tracker: MissingTopicTracker):
+        self.tracker = tracker
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        try:
+            return await make_request(bot, method)
+        except TelegramBadRequest as e:
+            chat_id = getattr(method, "chat_id", None)
+            topic_id = getattr(method, "message_thread_id", None)
+            if isinstance(chat_id, int) and topic_id is not None and is_missing_topic_error(e):
+                self.tracker.report(chat_id, topic_id)
+            raise
+
+
+# Единственный экземпляр для всего приложения
+missing_topics = MissingTopicTracker()
@@ -0,0 +1,60 @@
+"""
+Модуль асинхронного ограничителя частоты запросов.
+
+Реализует алгоритм "token bucket" для распределения вызовов Bot API
+во времени, чтобы массовые операции не упирались в лимиты Telegram.
+"""
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Ограничитель частоты на основе "ведра токенов".
+
+    Токены пополняются со скоростью `rate` в секунду, но не больше `burst`.
+    Каждый вызов `acquire` забирает один токен или ждет его появления.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate должен быть положительным числом.")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Пополняет ведро пропорционально прошедшему времени."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        """Ожидает, пока не станет доступен токен, и забирает его."""
+        # Блокировка гарантирует честную очередь (FIFO) среди ожидающих
+        async with self._lock:
+            self._refill()
+            # Повторная проверка: за время сна выдача могла быть приостановлена (`pause`)
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """
+        Приостанавливает выдачу токенов на `seconds` секунд.
+
+        Используется, когда Telegram ответил `retry_after`: пауза действует
+        на всех ожидающих этого ограничителя, а не только на получившего ошибку.
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    async def __aenter__(self) -> "AsyncRateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None
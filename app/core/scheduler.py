@@ -0,0 +1,141 @@
+"""
+Модуль приоритетного планировщика обработки обновлений.
+
+aiogram запускает отдельную задачу на каждое обновление, и все они
+конкурируют на равных: при наплыве новых пользователей ответы агентов
+ждут за медленным созданием сессий. Планировщик ограничивает количество
+одновременно обрабатываемых обновлений, а освободившийся слот отдает
+ожидающему с наивысшим приоритетом (внутри приоритета — в порядке прихода).
+
+Очередь ожидающих ограничена: при переполнении отбрасывается самое новое
+обновление с наименьшим приоритетом — ожидающее или только что пришедшее.
+"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Deque, List
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+class Priority(IntEnum):
+    """Классы обновлений: чем меньше значение, тем раньше обработка."""
+    AGENT = 0  # ответы агентов, /close_chat, команды администратора
+    RELAY = 1  # сообщения пользователей в существующих сессиях
+    NEW_SESSION = 2  # создание новых сессий
+
+
+class QueueOverflow(Exception):
+    """Обновление отброшено: очередь планировщика переполнена."""
+
+
+class UpdateScheduler:
+    """
+    Ограничивает параллелизм обработки обновлений с учетом приоритета.
+
+    :param concurrency: Максимальное количество одновременно обрабатываемых обновлений.
+    :param queue_limit: Максимальное количество ожидающих обновлений.
+    :param protected: Обновления с приоритетом не ниже этого не отбрасываются никогда.
+    """
+
+    def __init__(self, concurrency: int, queue_limit: int, protected: Priority = Priority.AGENT):
+        self.concurrency = max(1, concurrency)
+        self.queue_limit = max(0, queue_limit)
+        self.protected = protected
+        self.running = 0
+        self._waiters: List[Deque[asyncio.Future]] = [deque() for _ in Priority]
+
+    @property
+    def queued(self) -> int:
+        """Количество ожидающих обновлений всех приоритетов."""
+        return sum(len(waiters) for waiters in self._waiters)
+
+    def depth(self, priority: Priority) -> int:
+        """Количество ожидающих обновлений указанного приоритета."""
+        return len(self._waiters[priority])
+
+    def _evict(self, priority: Priority) -> bool:
+        """
+        Отбрасывает самое новое ожидающее обновление с приоритетом ниже `priority`.
+
+        :return: True, если место в очереди освободилось.
+        """
+        for level in range(len(self._waiters) - 1, max(priority, self.protected), -1):
+            waiters = self._waiters[level]
+            if waiters:
+                waiters.pop().set_exception(QueueOverflow())
+                shed_updates.inc(priority=Priority(level).name.lower())
+                return True
+        return False
+
+    async def acquire(self, priority: Priority) -> None:
+        """
+        Ждет свободного слота.
+
+        :raises QueueOverflow: Если очередь переполнена и обновление отброшено.
+        """
+        if self.running < self.concurrency and not self.queued:
+            self.running += 1
+            return
+        if self.queued >= self.queue_limit and priority > self.protected and not self._evict(priority):
+            shed_updates.inc(priority=priority.name.lower())
+            raise QueueOverflow()
+
+        waiter = asyncio.get_running_loop().create_future()
+        waiters = self._waiters[priority]
+        waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Слот уже был передан этой задаче — возвращаем его следующему
+                self.release()
+            elif waiter in waiters:
+                waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        """Освобождает слот и передает его ожидающему с наивысшим приоритетом."""
+        for waiters in self._waiters:
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    # Слот переходит к ожидающему, `running` не меняется
+                    waiter.set_result(None)
+                    return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[None]:
+        """Контекстный менеджер: занимает слот на время обработки обновления."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+queue_depth = registry.gauge(
+    "aegis_update_queue_depth", "Updates waiting for a processing slot", ("priority",)
+)
+running_updates = registry.gauge("aegis_updates_running", "Updates being processed")
+shed_updates = registry.counter(
+    "aegis_updates_shed_total", "Updates dropped because the queue was full", ("priority",)
+)
+
+# Единственный экземпляр для всего приложения
+update_scheduler = UpdateScheduler(
+    concurrency=settings.UPDATE_CONCURRENCY,
+    queue_limit=settings.UPDATE_QUEUE_LIMIT,
+)
+
+
+def _collect_metrics() -> None:
+    for priority in Priority:
+        queue_depth.set(update_scheduler.depth(priority), priority=priority.name.lower())
+    running_updates.set(update_scheduler.running)
+
+
+registry.register_collector(_collect_metrics)
@@ -0,0 +1,82 @@
+"""
+Модуль корректной остановки бота.
+
+Последовательность остановки:
+1. Прекратить прием новых обновлений.
+2. Дождаться (не дольше таймаута) завершения начатых хэндлеров.
+3. Попросить долгие фоновые работы (рассылки) остановиться колбэками остановки.
+4. Остановить фоновые задачи, дождавшись отправки запланированных сообщений.
+5. Сбросить отложенные данные зарегистрированными колбэками.
+6. Закрыть соединения с БД.
+
+Сессия бота закрывается aiogram после shutdown-хэндлеров.
+"""
+import inspect
+import logging
+import time
+from typing import Awaitable, Callable, List, Union
+
+from app.core.background import stop_background_tasks
+from app.db.session import engine
+from app.middlewares.inflight_middleware import InFlightMiddleware
+
+FlushCallback = Callable[[], Union[None, Awaitable[None]]]
+
+_stop_callbacks: List[Callable[[], None]] = []
+_flush_callbacks: List[FlushCallback] = []
+
+
+def register_stop_callback(callback: Callable[[], None]) -> None:
+    """
+    Регистрирует колбэк, который просит долгую фоновую работу завершиться.
+
+    Колбэки вызываются до ожидания фоновых задач, чтобы те успели
+    закончить и сохранить результат в пределах таймаута.
+    """
+    _stop_callbacks.append(callback)
+
+
+def register_flush_callback(callback: FlushCallback) -> None:
+    """
+    Регистрирует колбэк для сброса отложенных данных при остановке.
+
+    Колбэк может быть синхронным или асинхронным.
+    """
+    _flush_callbacks.append(callback)
+
+
+async def _run_callbacks(callbacks: List[FlushCallback]) -> None:
+    for callback in callbacks:
+        try:
+            result = callback()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logging.error("Shutdown callback failed: %s", e, exc_info=True)
+
+
+async def graceful_shutdown(inflight: InFlightMiddleware, timeout: float) -> int:
+    """
+    Выполняет корректную остановку в пределах `timeout` секунд.
+
+    :param inflight: Middleware учета обрабатываемых обновлений.
+    :param timeout: Общий бюджет времени на ожидание хэндлеров и фоновых задач.
+    :return: Количество хэндлеров, отмененных по истечении таймаута.
+    """
+    started = time.monotonic()
+    logging.info("Graceful shutdown: waiting for %s in-flight handlers...", inflight.in_flight)
+    cancelled = await inflight.drain(timeout)
+
+    await _run_callbacks(_stop_callbacks)
+    remaining = max(0.0, timeout - (time.monotonic() - started))
+    await stop_background_tasks(timeout=remaining)
+
+    await _run_callbacks(_flush_callbacks)
+
+    engine.dispose()
+    logging.info(
+        "Graceful shutdown finished in %.1fs (%s handlers cancelled).",
+        time.monotonic() - started,
+        cancelled,
+    )
+    return cancelled
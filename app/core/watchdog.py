@@ -0,0 +1,159 @@
+"""
+Модуль сторожа задержек event loop.
+
+Запросы к БД в сервисах синхронные, и медленный запрос останавливает
+обработку всех обновлений. Сторож состоит из двух частей:
+- задача в event loop, которая просыпается каждые `interval` секунд
+  и измеряет, на сколько опоздало пробуждение (задержку цикла);
+- отдельный поток, который замечает, что задача давно не просыпалась,
+  и, пока цикл еще заблокирован, записывает в лог стек потока event loop,
+  текущую задачу и обрабатываемое ею обновление.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from aiogram.types import TelegramObject, Update
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Квантили задержки, выдаваемые в метриках
+LAG_QUANTILES = (0.5, 0.9, 0.99, 1.0)
+
+EventResolver = Callable[[Optional[asyncio.Task]], Optional[TelegramObject]]
+
+
+def describe_event(event: Optional[TelegramObject]) -> str:
+    """Краткое описание обновления для лога."""
+    if not isinstance(event, Update):
+        return "no update"
+    message = event.message or event.edited_message
+    if message is not None:
+        user_id = message.from_user.id if message.from_user else None
+        return f"update {event.update_id} (message, chat {message.chat.id}, user {user_id})"
+    if event.callback_query is not None:
+        return f"update {event.update_id} (callback_query, user {event.callback_query.from_user.id})"
+    return f"update {event.update_id} ({event.event_type})"
+
+
+class LoopWatchdog:
+    """
+    Измеряет задержку event loop и находит код, который его блокирует.
+
+    :param threshold: Задержка в секундах, после которой цикл считается заблокированным.
+    :param interval: Период измерения в секундах.
+    :param samples: Количество последних измерений для расчета квантилей.
+    :param resolve_event: Возвращает обновление, обрабатываемое задачей.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        interval: float = 0.1,
+        samples: int = 1000,
+        resolve_event: Optional[EventResolver] = None,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.resolve_event = resolve_event
+        self.stalls = 0
+        self._samples: Deque[float] = deque(maxlen=samples)
+        self._heartbeat = time.monotonic()
+        self._reported = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    async def monitor(self) -> None:
+        """Измеряет задержку event loop; запускается как сервисная задача."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - self._heartbeat - self.interval)
+            # Сначала обновляем отметку, затем разрешаем потоку новое сообщение о блокировке
+            self._heartbeat = now
+            self._reported = False
+            self._samples.append(lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                stalls_total.inc()
+                logging.warning("Event loop was blocked for %.2fs.", lag)
+
+    def start(self) -> None:
+        """Запускает поток, обнаруживающий блокировку event loop."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает поток сторожа."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(max(0.01, min(self.interval, self.threshold / 2))):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for >= self.threshold and not self._reported and self._loop_thread_id is not None:
+                # Одно сообщение на каждую блокировку: флаг сбрасывает задача после пробуждения
+                self._reported = True
+                self._report(blocked_for)
+
+    def _report(self, blocked_for: float) -> None:
+        """Записывает в лог, чем занят поток event loop прямо сейчас."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable"
+        task = None
+        try:
+            # Чтение из другого потока без блокировок: значение нужно только для диагностики
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            pass
+        event = self.resolve_event(task) if self.resolve_event else None
+        logging.warning(
+            "Event loop blocked for %.2fs in task %s while processing %s. Stack:\n%s",
+            blocked_for,
+            task.get_name() if task is not None else None,
+            describe_event(event),
+            stack,
+        )
+
+    def percentiles(self) -> Dict[float, float]:
+        """Квантили задержки event loop по последним измерениям."""
+        samples = sorted(self._samples)
+        if not samples:
+            return {quantile: 0.0 for quantile in LAG_QUANTILES}
+        last = len(samples) - 1
+        return {quantile: samples[round(quantile * last)] for quantile in LAG_QUANTILES}
+
+
+loop_lag = registry.gauge(
+    "aegis_event_loop_lag_seconds", "Event loop lag over recent samples", ("quantile",)
+)
+stalls_total = registry.counter(
+    "aegis_event_loop_stalls_total", "Times the event loop was blocked longer than the threshold"
+)
+
+# Единственный экземпляр для всего приложения; запускается при старте, если включен в настройках
+loop_watchdog = LoopWatchdog(threshold=settings.LOOP_LAG_THRESHOLD_SECONDS)
+
+
+def _collect_metrics() -> None:
+    for quantile, value in loop_watchdog.percentiles().items():
+        loop_lag.set(value, quantile=quantile)
+
+
+registry.register_collector(_collect_metrics)
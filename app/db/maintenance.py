@@ -0,0 +1,221 @@
+"""
+Модуль обслуживания базы данных SQLite.
+
+Без обслуживания файл БД только растет: страницы удаленных строк остаются
+в файле, статистика для планировщика запросов не собирается. Периодически,
+когда бот почти простаивает, выполняется:
+- `PRAGMA incremental_vacuum` — возврат ОС не больше `vacuum_pages` свободных
+  страниц за запуск, чтобы блокировка записи была короткой;
+- `ANALYZE` при первом запуске и `PRAGMA optimize` в остальных;
+- `PRAGMA wal_checkpoint(PASSIVE)`, если БД работает в режиме WAL.
+
+Запросы выполняются в отдельном потоке на собственном соединении
+и не занимают event loop.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import Connection, Engine
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.session import engine
+
+# Значение PRAGMA auto_vacuum для режима INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Как часто проверять, пора ли обслуживать БД (в секундах)
+MAINTENANCE_CHECK_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class DatabaseStats:
+    """Размер файла БД в страницах."""
+    page_size: int
+    page_count: int
+    freelist_count: int
+
+    @property
+    def size_bytes(self) -> int:
+        return self.page_size * self.page_count
+
+    @property
+    def fragmentation(self) -> float:
+        """Доля свободных страниц в файле."""
+        return self.freelist_count / self.page_count if self.page_count else 0.0
+
+
+@dataclass
+class MaintenanceReport:
+    """Итог обслуживания БД."""
+    vacuumed_pages: int
+    analyzed: bool
+    checkpoint_seconds: Optional[float]
+    seconds: float
+    stats: DatabaseStats
+
+    def summary(self) -> str:
+        checkpoint = "skipped" if self.checkpoint_seconds is None else f"{self.checkpoint_seconds:.3f}s"
+        return (
+            f"freed {self.vacuumed_pages} pages, {'ANALYZE' if self.analyzed else 'optimize'}, "
+            f"checkpoint {checkpoint}, size {self.stats.size_bytes} bytes, "
+            f"fragmentation {self.stats.fragmentation:.1%}, took {self.seconds:.3f}s"
+        )
+
+
+def _pragma(connection: Connection, statement: str) -> int:
+    return connection.exec_driver_sql(f"PRAGMA {statement}").scalar()
+
+
+def read_stats(connection: Connection) -> DatabaseStats:
+    return DatabaseStats(
+        page_size=_pragma(connection, "page_size"),
+        page_count=_pragma(connection, "page_count"),
+        freelist_count=_pragma(connection, "freelist_count"),
+    )
+
+
+def enable_incremental_vacuum(db_engine: Engine) -> bool:
+    """
+    Переводит БД в режим `auto_vacuum = INCREMENTAL`.
+
+    Для уже созданной БД режим меняется только полным VACUUM, который
+    перезаписывает весь файл и блокирует БД, поэтому перевод включается
+    настройкой `DB_INCREMENTAL_VACUUM` и выполняется при старте, до начала
+    обработки обновлений. Блокирующая функция для запуска в отдельном потоке.
+
+    :return: True, если режим был изменен.
+    """
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if _pragma(connection, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+            return False
+        started = time.monotonic()
+        connection.exec_driver_sql(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        connection.exec_driver_sql("VACUUM")
+        logging.info("Database switched to incremental auto-vacuum in %.2fs.", time.monotonic() - started)
+    return True
+
+
+def run_maintenance(db_engine: Engine, vacuum_pages: int) -> MaintenanceReport:
+    """
+    Выполняет обслуживание БД; блокирующая функция для запуска в отдельном потоке.
+
+    :param db_engine: Движок БД.
+    :param vacuum_pages: Максимальное количество свободных страниц, возвращаемых ОС.
+    """
+    started = time.monotonic()
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        free_before = _pragma(connection, "freelist_count")
+        if vacuum_pages > 0 and _pragma(connection, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+            # sqlite3 делает один шаг запроса, а каждый шаг incremental_vacuum освобождает одну
+            # страницу; executescript выполняет запрос до конца
+            connection.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({vacuum_pages});")
+        vacuumed_pages = free_before - _pragma(connection, "freelist_count")
+
+        # Без сохраненной статистики PRAGMA optimize может ее не собрать
+        analyzed = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).first() is None
+        connection.exec_driver_sql("ANALYZE" if analyzed else "PRAGMA optimize")
+
+        checkpoint_seconds = None
+        if connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal":
+            checkpoint_started = time.monotonic()
+            # PASSIVE не ждет читателей и писателей: страницы, занятые ими, переносятся в следующий раз
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").all()
+            checkpoint_seconds = time.monotonic() - checkpoint_started
+
+        stats = read_stats(connection)
+    return MaintenanceReport(
+        vacuumed_pages=vacuumed_pages,
+        analyzed=analyzed,
+        checkpoint_seconds=checkpoint_seconds,
+        seconds=time.monotonic() - started,
+        stats=stats,
+    )
+
+
+class MaintenanceScheduler:
+    """
+    Запускает обслуживание БД не чаще раза в `interval` секунд и только в простое.
+
+    :param db_engine: Движок БД.
+    :param interval: Минимальный интервал между запусками в секундах.
+    :param vacuum_pages: Сколько свободных страниц возвращать ОС за запуск.
+    :param is_busy: Возвращает True, если бот сейчас нагружен и обслуживание нужно отложить.
+    """
+
+    def __init__(
+        self,
+        db_engine: Engine,
+        interval: float,
+        vacuum_pages: int,
+        is_busy: Optional[Callable[[], bool]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.engine = db_engine
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.is_busy = is_busy
+        self.clock = clock
+        self.last_report: Optional[MaintenanceReport] = None
+        self._last_run: Optional[float] = None
+
+    def is_due(self) -> bool:
+        return self._last_run is None or self.clock() - self._last_run >= self.interval
+
+    async def tick(self) -> Optional[MaintenanceReport]:
+        """
+        Выполняет обслуживание, если оно назначено и бот не нагружен.
+
+        :return: Итог обслуживания или None, если оно не выполнялось.
+        """
+        if not self.is_due():
+            return None
+        if self.is_busy is not None and self.is_busy():
+            logging.debug("Database maintenance postponed: bot is busy.")
+            return None
+        self._last_run = self.clock()
+        report = await asyncio.to_thread(run_maintenance, self.engine, self.vacuum_pages)
+        self.last_report = report
+        maintenance_runs.inc()
+        logging.info("Database maintenance: %s", report.summary())
+        return report
+
+
+db_size = registry.gauge("aegis_db_size_bytes", "Database file size", ("file",))
+db_fragmentation = registry.gauge("aegis_db_free_pages_ratio", "Share of free pages in the database file")
+maintenance_seconds = registry.gauge("aegis_db_maintenance_seconds", "Duration of the last database maintenance")
+checkpoint_seconds = registry.gauge("aegis_db_checkpoint_seconds", "Duration of the last WAL checkpoint")
+maintenance_runs = registry.counter("aegis_db_maintenance_runs_total", "Database maintenance runs")
+
+# Единственный экземпляр для всего приложения; проверку нагрузки задает main
+db_maintenance = MaintenanceScheduler(
+    engine,
+    interval=settings.DB_MAINTENANCE_INTERVAL_SECONDS,
+    vacuum_pages=settings.DB_VACUUM_PAGES_PER_RUN,
+)
+
+
+def _collect_metrics() -> None:
+    path = db_maintenance.engine.url.database
+    if path and path != ":memory:":
+        # Размеры файлов берутся из ФС: сбор метрик не обращается к БД
+        for suffix, file in (("", "main"), ("-wal", "wal")):
+            try:
+                db_size.set(os.path.getsize(path + suffix), file=file)
+            except OSError:
+                db_size.set(0, file=file)
+    report = db_maintenance.last_report
+    if report is not None:
+        db_fragmentation.set(report.stats.fragmentation)
+        maintenance_seconds.set(report.seconds)
+        if report.checkpoint_seconds is not None:
+            checkpoint_seconds.set(report.checkpoint_seconds)
+
+
+registry.register_collector(_collect_metrics)
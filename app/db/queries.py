@@ -0,0 +1,70 @@
+"""
+Запросы горячего пути обработки сообщений.
+
+Каждое сообщение пользователя или агента начинается с поиска активной
+сессии. Здесь эти запросы построены один раз при импорте (с параметрами
+`bindparam`), поэтому SQLAlchemy не собирает выражение заново и берет
+скомпилированный SQL из кэша движка. Запросы выполняются на уровне Core
+и возвращают легкие кортежи `ActiveSessionRow` без создания ORM-объектов
+и их регистрации в сессии.
+
+Для изменения сессии (закрытие, учет первого ответа) нужен ORM-объект:
+его загружает `session.get(SupportSession, row.id)`.
+"""
+import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, select
+from sqlmodel import Session
+
+from app.models.models import SupportSession
+
+_sessions = SupportSession.__table__
+
+
+class ActiveSessionRow(NamedTuple):
+    """Поля активной сессии, нужные для пересылки сообщений."""
+    id: int
+    user_telegram_id: int
+    agent_telegram_id: int
+    chat_id: int
+    topic_id: int
+    bot_id: int
+    first_response_at: Optional[datetime.datetime]
+
+    @property
+    def topic_key(self) -> Tuple[int, int]:
+        """Ключ темы сессии: (ID супергруппы, ID темы)."""
+        return self.chat_id, self.topic_id
+
+
+_active_session_columns = select(
+    _sessions.c.id,
+    _sessions.c.user_telegram_id,
+    _sessions.c.agent_telegram_id,
+    _sessions.c.chat_id,
+    _sessions.c.topic_id,
+    _sessions.c.bot_id,
+    _sessions.c.first_response_at,
+).where(_sessions.c.status == "active")
+
+ACTIVE_SESSION_BY_USER = _active_session_columns.where(
+    _sessions.c.user_telegram_id == bindparam("user_telegram_id")
+).limit(1)
+
+ACTIVE_SESSION_BY_TOPIC = _active_session_columns.where(
+    _sessions.c.chat_id == bindparam("chat_id"),
+    _sessions.c.topic_id == bindparam("topic_id"),
+).limit(1)
+
+
+def active_session_for_user(session: Session, user_telegram_id: int) -> Optional[ActiveSessionRow]:
+    """Возвращает активную сессию пользователя."""
+    row = session.connection().execute(ACTIVE_SESSION_BY_USER, {"user_telegram_id": user_telegram_id}).first()
+    return ActiveSessionRow(*row) if row is not None else None
+
+
+def active_session_in_topic(session: Session, chat_id: int, topic_id: int) -> Optional[ActiveSessionRow]:
+    """Возвращает активную сессию темы (chat_id, topic_id)."""
+    row = session.connection().execute(ACTIVE_SESSION_BY_TOPIC, {"chat_id": chat_id, "topic_id": topic_id}).first()
+    return ActiveSessionRow(*row) if row is not None else None
@@ -1,8 +1,13 @@
 """
 Модуль для управления сессиями базы данных.
 """
+import logging
+from typing import Any, Dict
+
+from sqlalchemy import Table, UniqueConstraint, inspect, text
 from sqlmodel import Session, SQLModel, create_engine
 
+from app.core.config import settings
 from app.models import models
 
 # Имя файла базы данных будет в корне проекта для простоты доступа
@@ -11,7 +16,19 @@ DATABASE_URL = f"sqlite:///{DATABASE_FILE}"
 
 # connect_args={"check_same_thread": False} - обязательный флаг для SQLite
 # при работе с асинхронными фреймворками, такими как aiogram.
-engine = create_engine(DATABASE_URL, echo=True, connect_args={"check_same_thread": False})
+# max_overflow=-1: сессия удерживает соединение, пока хэндлер ждет ответа Bot API,
+# поэтому при ограниченном пуле конкурентные хэндлеры блокировали бы event loop
+# в ожидании свободного соединения.
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    max_overflow=-1,
+)
+
+# SQL пишется через общий конвейер логирования: echo=True добавил бы
+# собственный синхронный обработчик в обход очереди
+if settings.DB_ECHO:
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
 
 
 def create_db_and_tables():
@@ -21,6 +38,111 @@ def create_db_and_tables():
     Вызывается один раз при старте приложения.
     """
     SQLModel.metadata.create_all(engine)
+    migrate_tables()
+    add_missing_columns()
+    create_missing_indexes()
+
+
+def rebuild_table(table: Table, fill_values: Dict[str, Any]) -> None:
+    """
+    Пересоздает таблицу по текущей модели, сохраняя данные.
+
+    SQLite не умеет менять ограничения существующей таблицы через ALTER TABLE,
+    поэтому таблица переименовывается, создается заново и заполняется
+    данными из старой. Колонки, которых в старой таблице не было,
+    заполняются значениями из `fill_values` (или значениями по умолчанию).
+    """
+    inspector = inspect(engine)
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    old_indexes = [index["name"] for index in inspector.get_indexes(table.name)]
+    old_name = f"{table.name}_old"
+    copied = [column.name for column in table.columns if column.name in existing]
+    filled = [name for name in fill_values if name not in existing]
+
+    with engine.begin() as connection:
+        connection.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"'))
+        # Индексы переезжают вместе с таблицей и заняли бы имена новых индексов
+        for index_name in old_indexes:
+            connection.execute(text(f'DROP INDEX "{index_name}"'))
+        table.create(connection)
+        target = ", ".join(f'"{name}"' for name in copied + filled)
+        source = ", ".join([f'"{name}"' for name in copied] + [f":{name}" for name in filled])
+        connection.execute(
+            text(f'INSERT INTO "{table.name}" ({target}) SELECT {source} FROM "{old_name}"'),
+            {name: fill_values[name] for name in filled},
+        )
+        connection.execute(text(f'DROP TABLE "{old_name}"'))
+    logging.info("Rebuilt table %s (%s columns filled).", table.name, filled)
+
+
+def migrate_tables() -> None:
+    """
+    Пересоздает таблицы, в которых появились обязательные колонки или изменились ключи.
+
+    - `SupportSession`: `chat_id` (несколько супергрупп) и `bot_id` (несколько ботов);
+      существующие сессии относятся к основной супергруппе и основному боту.
+      Уникальность темы (прежде `topic_id`, затем пары (chat_id, topic_id))
+      заменена частичным уникальным индексом по активным сессиям.
+    - `ProcessedUpdate`: `bot_id` в первичном ключе, так как ID обновлений
+      уникальны только в пределах бота.
+    - `MessageLink`: `bot_id` в первичном ключе, так как ID сообщений личного
+      чата у каждого бота свои; существующие связи относятся к основному боту.
+    """
+    rebuilds = [
+        (
+            models.SupportSession.__table__,
+            {"chat_id": settings.SUPERGROUP_ID, "bot_id": settings.primary_bot_id},
+        ),
+        (models.ProcessedUpdate.__table__, {"bot_id": settings.primary_bot_id}),
+        (models.MessageLink.__table__, {"bot_id": settings.primary_bot_id}),
+    ]
+    inspector = inspect(engine)
+    for table, fill_values in rebuilds:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        # Ограничения UNIQUE нельзя удалить через ALTER TABLE
+        unique_constraints = {
+            constraint["name"] for constraint in inspector.get_unique_constraints(table.name)
+        }
+        model_constraints = {
+            constraint.name for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint)
+        }
+        if not fill_values.keys() <= columns or unique_constraints != model_constraints:
+            rebuild_table(table, fill_values)
+
+
+def add_missing_columns():
+    """
+    Добавляет в существующие таблицы колонки, появившиеся в моделях позже.
+
+    `create_all` не изменяет уже созданные таблицы, поэтому новые колонки
+    (например, `SupportSession.first_response_at`) добавляются через ALTER TABLE.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" '
+                ddl += column.type.compile(dialect=engine.dialect)
+                # Для колонок со скалярным значением по умолчанию заполняем старые строки
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {column.default.arg!r}"
+                connection.execute(text(ddl))
+                logging.info("Added missing column %s.%s", table.name, column.name)
+
+
+def create_missing_indexes():
+    """
+    Создает в существующих таблицах индексы, появившиеся в моделях позже.
+
+    `create_all` создает индексы только вместе с новой таблицей.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 
 def get_session():
@@ -0,0 +1,246 @@
+"""
+Обработчики административных команд.
+
+Доступны только администратору (`settings.ADMIN_ID`) в личном чате с ботом.
+"""
+
+import logging
+import time
+from typing import List, Optional
+
+from aiogram import Bot, F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from sqlmodel import Session
+
+from app.core.background import start_background_task
+from app.core.config import settings
+from app.db.session import get_session
+from app.models.models import StatsBucket
+from app.services import agent_service, broadcast_service, bulk_service, reconcile_service, stats_service
+
+router = Router()
+router.message.filter(F.chat.type == "private", F.from_user.id == settings.ADMIN_ID)
+
+# Минимальный интервал между обновлениями сообщения о прогрессе (в секундах)
+PROGRESS_UPDATE_INTERVAL = 2.0
+
+
+class ProgressReporter:
+    """
+    Отображает прогресс массовой операции, редактируя одно сообщение.
+
+    Обновления прореживаются, чтобы не упираться в лимиты на редактирование.
+    """
+
+    def __init__(self, status_message: Message, title: str):
+        self.status_message = status_message
+        self.title = title
+        self._last_update = 0.0
+
+    async def __call__(self, done: int, total: int) -> None:
+        now = time.monotonic()
+        if done < total and now - self._last_update < PROGRESS_UPDATE_INTERVAL:
+            return
+        self._last_update = now
+        try:
+            await self.status_message.edit_text(f"⏳ {self.title}: {done}/{total}")
+        except Exception as e:
+            logging.warning("Failed to update progress message: %s", e)
+
+
+def _parse_ids(command: CommandObject, count: int) -> Optional[List[int]]:
+    """Извлекает из аргументов команды ровно `count` числовых ID."""
+    args = (command.args or "").split()
+    if len(args) != count:
+        return None
+    try:
+        return [int(arg) for arg in args]
+    except ValueError:
+        return None
+
+
+def _format_result(title: str, result: bulk_service.BulkOperationResult) -> str:
+    """Формирует итоговый отчет о массовой операции."""
+    text = f"✅ {title}: успешно {result.succeeded} из {result.total}."
+    if result.failed_session_ids:
+        failed = ", ".join(str(session_id) for session_id in result.failed_session_ids)
+        text += f"\n🔴 Ошибки в сессиях: {failed}"
+    return text
+
+
+@router.message(Command("close_agent"))
+async def handle_close_agent_command(
+    message: Message, command: CommandObject, bot: Bot, session: Session
+):
+    """
+    Закрывает все активные сессии агента: /close_agent <agent_id>.
+    """
+    ids = _parse_ids(command, 1)
+    if not ids:
+        await message.answer("Использование: /close_agent <agent_id>")
+        return
+
+    status_message = await message.answer("⏳ Закрываю сессии агента...")
+    result = await bulk_service.close_sessions_bulk(
+        session=session,
+        bot=bot,
+        agent_telegram_id=ids[0],
+        on_progress=ProgressReporter(status_message, "Закрытие сессий"),
+    )
+    await message.answer(_format_result("Закрытие сессий агента", result))
+
+
+@router.message(Command("reassign"))
+async def handle_reassign_command(
+    message: Message, command: CommandObject, bot: Bot, session: Session
+):
+    """
+    Передает все активные сессии одного агента другому: /reassign <from_id> <to_id>.
+    """
+    ids = _parse_ids(command, 2)
+    if not ids:
+        await message.answer("Использование: /reassign <from_agent_id> <to_agent_id>")
+        return
+
+    status_message = await message.answer("⏳ Передаю сессии...")
+    result = await bulk_service.reassign_sessions_bulk(
+        session=session,
+        bot=bot,
+        from_agent_id=ids[0],
+        to_agent_id=ids[1],
+        on_progress=ProgressReporter(status_message, "Передача сессий"),
+    )
+    if result is None:
+        await message.answer("⛔️ Целевой агент не найден или неактивен.")
+        return
+    await message.answer(_format_result("Передача сессий", result))
+
+
+@router.message(Command("drain"))
+async def handle_drain_command(message: Message, bot: Bot, session: Session):
+    """
+    Закрывает все активные сессии перед обслуживанием: /drain.
+    """
+    status_message = await message.answer("⏳ Закрываю все активные сессии...")
+    result = await bulk_service.close_sessions_bulk(
+        session=session,
+        bot=bot,
+        on_progress=ProgressReporter(status_message, "Закрытие сессий"),
+    )
+    await message.answer(_format_result("Закрытие всех сессий", result))
+
+
+async def _run_broadcast_job(bot: Bot, broadcast_id: int, status_message: Message) -> None:
+    """Выполняет рассылку в фоне со своей сессией БД и сообщает итог администратору."""
+    with next(get_session()) as session:
+        result = await broadcast_service.run_broadcast(
+            session, bot, broadcast_id, on_progress=ProgressReporter(status_message, f"Рассылка #{broadcast_id}")
+        )
+    if result is None:
+        text = f"⛔️ Рассылка #{broadcast_id} не найдена, уже завершена или выполняется."
+    elif result.finished:
+        text = f"📣 Рассылка #{broadcast_id} завершена: {result.summary()}."
+    else:
+        text = (
+            f"📣 Рассылка #{broadcast_id} выполнена частично: {result.summary()}.\n"
+            f"Отправить отложенные: /broadcast_resume {broadcast_id}"
+        )
+    await status_message.answer(text)
+
+
+@router.message(Command("broadcast"))
+async def handle_broadcast_command(message: Message, command: CommandObject, bot: Bot, session: Session):
+    """
+    Отправляет сообщение всем пользователям, обращавшимся в поддержку: /broadcast <текст>.
+    """
+    if not command.args:
+        await message.answer("Использование: /broadcast <текст сообщения>")
+        return
+
+    broadcast = broadcast_service.create_broadcast(session, command.args)
+    status_message = await message.answer(f"⏳ Рассылка #{broadcast.id} запущена...")
+    # Рассылка может занять часы: выполняем ее в фоне, не занимая обработку обновлений
+    start_background_task(
+        _run_broadcast_job(bot, broadcast.id, status_message), name=f"broadcast-{broadcast.id}"
+    )
+
+
+@router.message(Command("broadcast_resume"))
+async def handle_broadcast_resume_command(message: Message, command: CommandObject, bot: Bot):
+    """
+    Продолжает прерванную рассылку: /broadcast_resume <broadcast_id>.
+    """
+    ids = _parse_ids(command, 1)
+    if not ids:
+        await message.answer("Использование: /broadcast_resume <broadcast_id>")
+        return
+
+    status_message = await message.answer(f"⏳ Продолжаю рассылку #{ids[0]}...")
+    start_background_task(_run_broadcast_job(bot, ids[0], status_message), name=f"broadcast-{ids[0]}")
+
+
+@router.message(Command("reconcile"))
+async def handle_reconcile_command(message: Message, bot: Bot, session: Session):
+    """
+    Запускает внеплановую сверку сессий, тем и агентов: /reconcile.
+    """
+    await message.answer("⏳ Выполняю сверку состояния...")
+    report = await reconcile_service.reconcile(session, bot)
+    await message.answer(f"🛠 Сверка завершена: {report.summary()}")
+
+
+@router.message(Command("reload_agents"))
+async def handle_reload_agents_command(message: Message, bot: Bot, session: Session):
+    """
+    Перечитывает состав агентов из .env без перезапуска: /reload_agents.
+    """
+    try:
+        diff = agent_service.reload_agents(session, bot)
+    except ValueError as e:
+        await message.answer(f"🔴 Не удалось обновить состав агентов: {e}")
+        return
+    if diff.has_changes:
+        await message.answer(f"👥 Состав агентов обновлен: {diff.summary()}")
+    else:
+        await message.answer("👥 Состав агентов не изменился.")
+
+
+def _average(total: float, count: int) -> str:
+    """Форматирует среднее значение в секундах."""
+    return f"{total / count:.0f} с" if count else "—"
+
+
+def _format_bucket(title: str, bucket: Optional[StatsBucket]) -> str:
+    """Формирует блок отчета по одному периоду."""
+    if bucket is None:
+        return f"<b>{title}:</b> нет данных"
+    return (
+        f"<b>{title}:</b> создано {bucket.sessions_created}, "
+        f"закрыто {bucket.sessions_closed}, отказов {bucket.sessions_rejected}\n"
+        f"  первый ответ ≈ {_average(bucket.first_response_seconds_total, bucket.first_responses)}, "
+        f"длительность ≈ {_average(bucket.duration_seconds_total, bucket.sessions_closed)}"
+    )
+
+
+@router.message(Command("stats"))
+async def handle_stats_command(message: Message, session: Session):
+    """
+    Показывает SLA-статистику из инкрементальных агрегатов: /stats.
+    """
+    snapshot = stats_service.get_stats_snapshot(session)
+    lines = [
+        "📊 <b>Статистика поддержки</b>",
+        _format_bucket("Текущий час", snapshot.current_hour),
+        _format_bucket("Сегодня", snapshot.today),
+        _format_bucket("Всего", snapshot.total),
+    ]
+    if snapshot.agents:
+        lines.append("<b>По агентам:</b>")
+        for agent in snapshot.agents:
+            lines.append(
+                f"  {agent.agent_telegram_id}: назначено {agent.sessions_assigned}, "
+                f"закрыто {agent.sessions_closed}, первый ответ ≈ "
+                f"{_average(agent.first_response_seconds_total, agent.first_responses)}"
+            )
+    await message.answer("\n".join(lines))
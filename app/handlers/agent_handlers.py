@@ -5,18 +5,25 @@
 import logging
 
 from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import Message, ReplyParameters
 from sqlmodel import Session, select
 
 from app.core.config import settings
+from app.core.logging_config import RELAY
+from app.db.queries import active_session_in_topic
 from app.models.models import SupportSession
-from app.services import session_service
+from app.services import message_link_service, session_service, stats_service
+from app.services.idle_service import idle_tracker
 
 router = Router()
-# Фильтруем сообщения: только из нашей супергруппы и только из тем (не из General)
+# Фильтруем сообщения: только из наших супергрупп и только из тем (не из General)
 router.message.filter(
-    F.chat.id == settings.SUPERGROUP_ID, F.message_thread_id.is_not(None)
+    F.chat.id.in_(settings.supergroup_ids), F.message_thread_id.is_not(None)
+)
+router.edited_message.filter(
+    F.chat.id.in_(settings.supergroup_ids), F.message_thread_id.is_not(None)
 )
 
 
@@ -30,12 +37,20 @@ async def handle_close_chat_command(message: Message, bot: Bot, session: Session
     topic_id = message.message_thread_id
 
     statement = select(SupportSession).where(
-        SupportSession.topic_id == topic_id, SupportSession.status == "active"
+        SupportSession.chat_id == message.chat.id,
+        SupportSession.topic_id == topic_id,
+        SupportSession.status == "active",
     )
     active_session = session.exec(statement).first()
 
+    # Сообщения из темы получают все боты группы; сессию обслуживает только ее бот
+    if active_session and active_session.bot_id != bot.id:
+        return
+
     if not active_session:
-        await message.reply("⚠️ Не найдено активной сессии в этой теме.")
+        # Ответить, что сессии нет, должен один бот, а не каждый бот группы
+        if bot.id == settings.primary_bot_id:
+            await message.reply("⚠️ Не найдено активной сессии в этой теме.")
         return
 
     # Проверяем, что команду дает именно назначенный агент
@@ -72,42 +87,105 @@ async def handle_agent_message(message: Message, bot: Bot, session: Session):
     agent_id = message.from_user.id
     topic_id = message.message_thread_id
 
-    # 1. Находим сессию по ID темы
-    statement = select(SupportSession).where(
-        SupportSession.topic_id == topic_id, SupportSession.status == "active"
-    )
-    active_session = session.exec(statement).first()
+    # 1. Находим сессию по супергруппе и ID темы
+    active_session = active_session_in_topic(session, message.chat.id, topic_id)
 
     if not active_session:
         logging.warning(
-            f"Received message in topic {topic_id}, but no active session found."
+            "Received message in topic %s of chat %s, but no active session found.",
+            topic_id,
+            message.chat.id,
         )
         return
 
+    if active_session.bot_id != bot.id:
+        return
+
     # 2. Проверяем, что пишет именно назначенный на сессию агент
     if active_session.agent_telegram_id != agent_id:
         logging.warning(
-            f"Agent {agent_id} tried to write to session {active_session.id} "
-            f"of agent {active_session.agent_telegram_id}. Denied."
+            "Agent %s tried to write to session %s of agent %s. Denied.",
+            agent_id,
+            active_session.id,
+            active_session.agent_telegram_id,
         )
         return
 
     # 3. Пересылаем копию сообщения пользователю
     logging.info(
-        f"Copying message from agent {agent_id} to user {active_session.user_telegram_id}"
+        "Copying message from agent %s to user %s",
+        agent_id,
+        active_session.user_telegram_id,
+        extra={"category": RELAY, "agent_id": agent_id, "topic_id": topic_id},
     )
+    target = message_link_service.find_reply_target(session, bot.id, message)
+    reply_parameters = None
+    if target is not None and target[0] == active_session.user_telegram_id:
+        # Ответ агента на сообщение из переписки остается ответом и у пользователя
+        reply_parameters = ReplyParameters(message_id=target[1], allow_sending_without_reply=True)
     try:
-        await bot.copy_message(
+        copied = await bot.copy_message(
             chat_id=active_session.user_telegram_id,
             from_chat_id=message.chat.id,
             message_id=message.message_id,
+            reply_parameters=reply_parameters,
         )
     except Exception as e:
         logging.error(
-            f"Failed to copy message to user {active_session.user_telegram_id}: {e}"
+            "Failed to copy message to user %s: %s",
+            active_session.user_telegram_id,
+            e,
         )
         await message.reply(
             "🔴 **Ошибка доставки!**\n"
             "Не удалось доставить сообщение пользователю. "
             "Возможно, он заблокировал бота. Сессия остается открытой."
         )
+        return
+
+    message_link_service.link_messages(
+        session, bot.id, (message.chat.id, message.message_id), (active_session.user_telegram_id, copied.message_id)
+    )
+    idle_tracker.touch(active_session.topic_key)
+
+    # 4. Фиксируем время первого ответа агента для SLA-статистики
+    if active_session.first_response_at is None:
+        stats_service.record_first_response(session, session.get(SupportSession, active_session.id))
+        session.commit()
+
+
+@router.edited_message()
+async def handle_agent_edit(message: Message, bot: Bot, session: Session):
+    """
+    Применяет правку сообщения агента к его копии у пользователя.
+
+    Изменяются текст и подпись; замена медиафайла не переносится.
+    """
+    active_session = active_session_in_topic(session, message.chat.id, message.message_thread_id)
+    if (
+        active_session is None
+        or active_session.bot_id != bot.id
+        or active_session.agent_telegram_id != message.from_user.id
+    ):
+        return
+    copy = message_link_service.find_peer(session, bot.id, message.chat.id, message.message_id)
+    if copy is None or copy[0] != active_session.user_telegram_id:
+        return
+
+    chat_id, message_id = copy
+    try:
+        # Разметка передается сущностями исходного сообщения, parse_mode по умолчанию не применяется
+        if message.text is not None:
+            await bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=message.text, entities=message.entities, parse_mode=None
+            )
+        elif message.caption is not None:
+            await bot.edit_message_caption(
+                chat_id=chat_id,
+                message_id=message_id,
+                caption=message.caption,
+                caption_entities=message.caption_entities,
+                parse_mode=None,
+            )
+    except TelegramBadRequest as e:
+        logging.warning("Failed to apply edit of message %s for user %s: %s", message.message_id, chat_id, e)
@@ -5,22 +5,146 @@
 import asyncio
 import logging
 from collections import defaultdict
+from typing import Awaitable, Callable, Optional, Sequence
 
 from aiogram import Bot, F, Router
-from aiogram.types import Message
-from sqlmodel import Session, select
+from aiogram.types import (
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    Message,
+    ReplyParameters,
+    User,
+)
+from cachetools import TTLCache
+from sqlmodel import Session
 
+from app.core.circuit_breaker import CircuitOpenError
 from app.core.config import settings
+from app.core.logging_config import RELAY
+from app.db.queries import ActiveSessionRow, active_session_for_user
+from app.middlewares.throttling_middleware import throttling
 from app.models.models import SupportSession
-from app.services import session_service
+from app.services import message_link_service, session_service
+from app.services.idle_service import idle_tracker
+from app.services.routing_service import build_route
 
 router = Router()
 router.message.filter(F.chat.type == "private")
+router.edited_message.filter(F.chat.type == "private")
 
 # Словарь для хранения блокировок для каждого пользователя.
 # Это предотвращает состояние гонки при одновременном создании сессии.
 user_locks = defaultdict(asyncio.Lock)
 
+TOPIC_CALLBACK_PREFIX = "topic:"
+CHOOSE_TOPIC_TEXT = "Выберите тему обращения, чтобы мы подключили профильного специалиста:"
+SESSION_STARTED_TEXT = (
+    "✅ Оператор поддержки скоро подключится к вашему чату. "
+    "Пожалуйста, ожидайте."
+)
+NO_AGENTS_TEXT = (
+    "К сожалению, все операторы сейчас заняты. "
+    "Пожалуйста, попробуйте написать позже."
+)
+TELEGRAM_UNAVAILABLE_TEXT = (
+    "⚠️ Сейчас наблюдаются сбои в работе Telegram, и мы не можем подключить оператора. "
+    "Пожалуйста, напишите нам снова через несколько минут."
+)
+USER_EDITED_TEXT = "✏️ Пользователь изменил сообщение:"
+
+# Первые сообщения пользователей, ожидающих выбора темы обращения (ID пользователя -> ID сообщения).
+# Сообщение пересылается в тему после выбора; невыбранные записи забываются через 10 минут.
+pending_first_messages: TTLCache = TTLCache(maxsize=10_000, ttl=600)
+
+
+def topic_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура стартового меню с темами обращений из настроек."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=title, callback_data=f"{TOPIC_CALLBACK_PREFIX}{tag}")]
+            for tag, title in settings.SUPPORT_TOPICS.items()
+        ]
+    )
+
+
+async def open_session(
+    bot: Bot,
+    session: Session,
+    user: User,
+    first_message_id: Optional[int],
+    route: Sequence[str],
+    answer: Callable[[str], Awaitable],
+) -> Optional[SupportSession]:
+    """
+    Создает сессию для пользователя и пересылает в тему его первое сообщение.
+
+    :param first_message_id: ID сообщения в личном чате, с которого началось обращение.
+    :param route: Требуемые навыки агента (язык, тема обращения).
+    :param answer: Функция отправки ответа пользователю.
+    """
+    logging.info("No active session for user %s. Creating a new one (route %s).", user.id, route)
+    try:
+        new_session = await session_service.create_new_session(
+            session=session,
+            bot=bot,
+            user_telegram_id=user.id,
+            user_username=user.username,
+            route=route,
+        )
+    except CircuitOpenError as e:
+        # Агент не занят, поэтому задержка повторного создания сессии не нужна
+        logging.warning("Session for user %s not created: %s", user.id, e)
+        await answer(TELEGRAM_UNAVAILABLE_TEXT)
+        return None
+    if not new_session:
+        throttling.start_creation_cooldown(user.id)
+        await answer(NO_AGENTS_TEXT)
+        return None
+
+    await answer(SESSION_STARTED_TEXT)
+    if first_message_id is not None:
+        # Пересылаем первое сообщение, которое инициировало сессию
+        forwarded = await bot.forward_message(
+            chat_id=new_session.chat_id,
+            from_chat_id=user.id,
+            message_id=first_message_id,
+            message_thread_id=new_session.topic_id,
+        )
+        message_link_service.link_messages(
+            session, bot.id, (user.id, first_message_id), (new_session.chat_id, forwarded.message_id)
+        )
+    return new_session
+
+
+async def relay_to_topic(bot: Bot, session: Session, message: Message, active_session: ActiveSessionRow) -> None:
+    """
+    Пересылает сообщение пользователя в тему сессии и запоминает связь с копией.
+
+    Пересланное сообщение не может быть ответом, поэтому ответ пользователя
+    на сообщение из переписки копируется с ответом на его пару в теме.
+    """
+    target = message_link_service.find_reply_target(session, bot.id, message)
+    # Сообщения темы новее самой темы; более ранние остались в прежних темах пользователя
+    if target is not None and target[0] == active_session.chat_id and target[1] > active_session.topic_id:
+        relayed = await bot.copy_message(
+            chat_id=active_session.chat_id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+            message_thread_id=active_session.topic_id,
+            reply_parameters=ReplyParameters(message_id=target[1], allow_sending_without_reply=True),
+        )
+    else:
+        relayed = await bot.forward_message(
+            chat_id=active_session.chat_id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+            message_thread_id=active_session.topic_id,
+        )
+    message_link_service.link_messages(
+        session, bot.id, (message.chat.id, message.message_id), (active_session.chat_id, relayed.message_id)
+    )
+
 
 @router.message()
 async def handle_user_message(message: Message, bot: Bot, session: Session):
@@ -36,47 +160,84 @@ async def handle_user_message(message: Message, bot: Bot, session: Session):
     # Захватываем блокировку для конкретного пользователя
     async with user_locks[user_id]:
         # 1. Проверяем, есть ли у пользователя активная сессия
-        statement = select(SupportSession).where(
-            SupportSession.user_telegram_id == user_id,
-            SupportSession.status == "active",
-        )
-        active_session = session.exec(statement).first()
+        active_session = active_session_for_user(session, user_id)
 
         if active_session:
             # 2. Если сессия есть, пересылаем сообщение в тему
             logging.info(
-                f"Forwarding message from user {user_id} to topic {active_session.topic_id}"
-            )
-            await bot.forward_message(
-                chat_id=settings.SUPERGROUP_ID,
-                from_chat_id=message.chat.id,
-                message_id=message.message_id,
-                message_thread_id=active_session.topic_id,
+                "Forwarding message from user %s to topic %s",
+                user_id,
+                active_session.topic_id,
+                extra={"category": RELAY, "user_id": user_id, "topic_id": active_session.topic_id},
             )
+            await relay_to_topic(bot, session, message, active_session)
+            idle_tracker.touch(active_session.topic_key)
+        elif settings.SUPPORT_TOPICS:
+            # 3. Сначала узнаем тему обращения, чтобы назначить профильного агента
+            pending_first_messages.setdefault(user_id, message.message_id)
+            await message.answer(CHOOSE_TOPIC_TEXT, reply_markup=topic_keyboard())
         else:
-            # 3. Если сессии нет, создаем новую
-            logging.info(f"No active session for user {user_id}. Creating a new one.")
-            new_session = await session_service.create_new_session(
-                session=session,
-                bot=bot,
-                user_telegram_id=user_id,
-                user_username=message.from_user.username,
+            # 4. Если меню тем не настроено, создаем сессию с маршрутом по языку
+            await open_session(
+                bot,
+                session,
+                message.from_user,
+                message.message_id,
+                route=build_route(message.from_user.language_code),
+                answer=message.answer,
             )
 
-            if new_session:
-                await message.answer(
-                    "✅ Оператор поддержки скоро подключится к вашему чату. "
-                    "Пожалуйста, ожидайте."
-                )
-                # Пересылаем первое сообщение, которое инициировало сессию
-                await bot.forward_message(
-                    chat_id=settings.SUPERGROUP_ID,
-                    from_chat_id=message.chat.id,
-                    message_id=message.message_id,
-                    message_thread_id=new_session.topic_id,
-                )
-            else:
-                await message.answer(
-                    "К сожалению, все операторы сейчас заняты. "
-                    "Пожалуйста, попробуйте написать позже."
-                )
+
+@router.edited_message()
+async def handle_user_edit(message: Message, bot: Bot, session: Session):
+    """
+    Сообщает агенту, что пользователь изменил уже пересланное сообщение.
+
+    Пересланное сообщение изменить нельзя, поэтому в тему отправляется новый
+    текст ответом на прежнюю копию; связь переносится на это уведомление.
+    """
+    active_session = active_session_for_user(session, message.from_user.id)
+    if active_session is None:
+        return
+    copy = message_link_service.find_peer(session, bot.id, message.chat.id, message.message_id)
+    text = message.html_text
+    if copy is None or copy[0] != active_session.chat_id or not text:
+        return
+    notice = await bot.send_message(
+        chat_id=active_session.chat_id,
+        text=f"{USER_EDITED_TEXT}\n\n{text}",
+        message_thread_id=active_session.topic_id,
+        reply_parameters=ReplyParameters(message_id=copy[1], allow_sending_without_reply=True),
+    )
+    message_link_service.link_messages(
+        session, bot.id, (message.chat.id, message.message_id), (active_session.chat_id, notice.message_id)
+    )
+
+
+@router.callback_query(F.data.startswith(TOPIC_CALLBACK_PREFIX))
+async def handle_topic_choice(callback: CallbackQuery, bot: Bot, session: Session):
+    """
+    Создает сессию после выбора темы обращения в стартовом меню.
+
+    Сессия маршрутизируется на агента, владеющего языком пользователя и выбранной темой.
+    """
+    user = callback.from_user
+    topic = callback.data.removeprefix(TOPIC_CALLBACK_PREFIX)
+    await callback.answer()
+
+    async with user_locks[user.id]:
+        # Повторное нажатие, когда сессия уже создана
+        if active_session_for_user(session, user.id) is not None:
+            return
+
+        # Кнопка из устаревшего меню: тему не учитываем
+        if topic not in settings.SUPPORT_TOPICS:
+            topic = None
+        await open_session(
+            bot,
+            session,
+            user,
+            pending_first_messages.pop(user.id, None),
+            route=build_route(user.language_code, topic),
+            answer=lambda text: bot.send_message(user.id, text),
+        )
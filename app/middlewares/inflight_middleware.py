@@ -0,0 +1,88 @@
+"""
+Модуль учета обновлений, находящихся в обработке.
+
+Используется при остановке бота: новые обновления перестают приниматься,
+а уже начатые хэндлеры получают время завершиться (и отменяются по таймауту)
+до закрытия соединений с БД.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """
+    Middleware для учета обновлений, находящихся в обработке.
+
+    Позволяет при остановке бота перестать принимать новые обновления
+    и дождаться завершения уже начатых хэндлеров.
+    """
+
+    def __init__(self):
+        self.accepting = True
+        # Задача хэндлера -> обрабатываемое ею обновление
+        self._tasks: Dict[asyncio.Task, TelegramObject] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def in_flight(self) -> int:
+        """Количество обновлений, обрабатываемых в данный момент."""
+        return len(self._tasks)
+
+    def event_for_task(self, task: Optional[asyncio.Task]) -> Optional[TelegramObject]:
+        """Возвращает обновление, которое обрабатывает задача (для диагностики)."""
+        return self._tasks.get(task) if task is not None else None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        """
+        Регистрирует текущую задачу на время обработки обновления.
+
+        После начала остановки новые обновления отбрасываются.
+        """
+        if not self.accepting:
+            update_id = event.update_id if isinstance(event, Update) else None
+            logging.warning("Shutting down, update %s is not processed.", update_id)
+            return None
+
+        task = asyncio.current_task()
+        self._tasks[task] = event
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self._tasks.pop(task, None)
+            if not self._tasks:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Прекращает прием обновлений и ждет завершения начатых хэндлеров.
+
+        Хэндлеры, не завершившиеся за `timeout`, отменяются — их код
+        отката (например, в `create_new_session`) выполняется при отмене.
+
+        :param timeout: Максимальное время ожидания в секундах.
+        :return: Количество отмененных хэндлеров.
+        """
+        self.accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return 0
+        except asyncio.TimeoutError:
+            pending = list(self._tasks)
+            if not pending:
+                return 0
+            logging.warning("%s handlers did not finish in %ss, cancelling.", len(pending), timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return len(pending)
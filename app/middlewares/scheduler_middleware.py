@@ -0,0 +1,106 @@
+"""
+Модуль приоритетной обработки обновлений при перегрузке.
+
+Обновления распределяются по приоритетам без обращения к БД: сообщения агентов
+и действующих сессий обрабатываются раньше новых обращений, а при переполнении
+очереди пользователь получает уведомление о перегрузке.
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from cachetools import TTLCache
+
+from app.core.config import settings
+from app.core.scheduler import Priority, QueueOverflow, UpdateScheduler
+from app.services.idle_service import idle_tracker
+
+# Пользователь получает не больше одного уведомления о перегрузке за это время (в секундах)
+OVERLOAD_NOTICE_SECONDS = 60
+OVERLOAD_NOTICE_CACHE_SIZE = 10_000
+
+OVERLOADED_TEXT = (
+    "⏳ Сейчас к нам обращается очень много пользователей. "
+    "Пожалуйста, напишите нам снова через пару минут."
+)
+RELAY_OVERLOADED_TEXT = (
+    "⚠️ Из-за высокой нагрузки сообщение не было доставлено оператору, "
+    "пожалуйста, отправьте его еще раз чуть позже."
+)
+
+
+def classify_update(update: Update) -> Priority:
+    """
+    Определяет приоритет обновления без обращения к БД.
+
+    Наличие активной сессии проверяется по трекеру неактивности,
+    который хранит все активные сессии в памяти.
+    """
+    message = update.message or update.edited_message
+    if message is not None:
+        if message.chat.type != "private":
+            # Сообщения в темах супергруппы пишут агенты
+            return Priority.AGENT
+        user = message.from_user
+        if user is None or user.id == settings.ADMIN_ID:
+            return Priority.AGENT
+        if idle_tracker.topic_for_user(user.id) is not None:
+            return Priority.RELAY
+        return Priority.NEW_SESSION
+    if update.callback_query is not None:
+        # Единственные кнопки — меню тем перед созданием сессии
+        return Priority.NEW_SESSION
+    return Priority.RELAY
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """
+    Middleware приоритетной обработки обновлений.
+
+    Ставит обновление в очередь планировщика и вызывает хэндлер, когда
+    освободится слот. Если обновление отброшено из-за переполнения очереди,
+    пользователь получает короткое уведомление.
+    """
+
+    def __init__(self, scheduler: UpdateScheduler):
+        self.scheduler = scheduler
+        self._notified: TTLCache = TTLCache(maxsize=OVERLOAD_NOTICE_CACHE_SIZE, ttl=OVERLOAD_NOTICE_SECONDS)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        """
+        Выполняет хэндлер в слоте планировщика с приоритетом обновления.
+        """
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        priority = classify_update(event)
+        try:
+            async with self.scheduler.slot(priority):
+                return await handler(event, data)
+        except QueueOverflow:
+            logging.warning("Update queue is full, update %s (%s) dropped.", event.update_id, priority.name)
+            await self._notify_overloaded(event, priority, data)
+            return None
+
+    async def _notify_overloaded(self, update: Update, priority: Priority, data: Dict[str, Any]) -> None:
+        """Сообщает пользователю, что обращение не обработано из-за нагрузки."""
+        text = RELAY_OVERLOADED_TEXT if priority == Priority.RELAY else OVERLOADED_TEXT
+        try:
+            if update.callback_query is not None:
+                await update.callback_query.answer(OVERLOADED_TEXT, show_alert=True)
+                return
+            message = update.message or update.edited_message
+            if message is None or message.from_user is None:
+                return
+            user_id = message.from_user.id
+            if user_id in self._notified:
+                return
+            self._notified[user_id] = True
+            await data["bot"].send_message(message.chat.id, text)
+        except Exception as e:
+            logging.error("Failed to send overload notice for update %s: %s", update.update_id, e)
@@ -0,0 +1,143 @@
+"""
+Модуль ограничения частоты сообщений и нажатий кнопок от пользователей.
+
+Лишние обновления отбрасываются до обращения к БД и Bot API; после неудачной
+попытки создать сессию пользователь получает паузу на повторные попытки.
+"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from cachetools import TTLCache
+
+from app.core.config import settings
+from app.services.backlog_service import BACKLOG_REPLAY
+
+# Максимальное количество одновременно отслеживаемых пользователей
+THROTTLE_CACHE_SIZE = 10_000
+
+THROTTLED_TEXT = (
+    "⚠️ Вы отправляете сообщения слишком часто. "
+    "Часть сообщений не была доставлена оператору, пожалуйста, повторите их чуть позже."
+)
+THROTTLED_CALLBACK_TEXT = "⚠️ Слишком много нажатий, попробуйте чуть позже."
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Middleware ограничения частоты сообщений и нажатий кнопок от пользователей.
+
+    Для каждого пользователя хранится token bucket: `burst` сообщений подряд,
+    далее не чаще `rate` сообщений в секунду. Лишние сообщения отбрасываются
+    до обращения к БД и Bot API, пользователь получает одно предупреждение.
+
+    Кроме того, после неудачной попытки создать сессию (все операторы заняты)
+    пользователь получает паузу `cooldown` секунд, в течение которой
+    новые попытки отклоняются без обращения к БД.
+
+    Состояние хранится в TTLCache: запись бакета живет ровно столько, сколько
+    нужно для его полного восстановления, поэтому неактивные пользователи
+    вытесняются без потери точности.
+
+    Обновления, накопившиеся за время простоя бота, частотой не ограничиваются:
+    пользователь отправил их, когда бот не работал, и их нельзя терять.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        cooldown: float,
+        clock: Callable[[], float] = time.monotonic,
+        maxsize: int = THROTTLE_CACHE_SIZE,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        refill_seconds = self.burst / rate if rate > 0 else 1.0
+        # user_id -> (оставшиеся токены, время последнего пересчета)
+        self._buckets: TTLCache = TTLCache(maxsize=maxsize, ttl=refill_seconds, timer=clock)
+        # Пользователи, уже предупрежденные о превышении лимита
+        self._warned: TTLCache = TTLCache(maxsize=maxsize, ttl=refill_seconds, timer=clock)
+        self._cooldowns: Optional[TTLCache] = (
+            TTLCache(maxsize=maxsize, ttl=cooldown, timer=clock) if cooldown > 0 else None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Включено ли ограничение частоты сообщений."""
+        return self.rate > 0
+
+    def allow(self, user_id: int) -> bool:
+        """
+        Списывает токен из бакета пользователя.
+
+        :return: True, если сообщение укладывается в лимит.
+        """
+        if not self.enabled:
+            return True
+        now = self._clock()
+        tokens, updated = self._buckets.get(user_id, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        self._buckets[user_id] = (tokens, now)
+        return allowed
+
+    def start_creation_cooldown(self, user_id: int) -> None:
+        """Запрещает пользователю повторные попытки создать сессию на время паузы."""
+        if self._cooldowns is not None:
+            self._cooldowns[user_id] = True
+
+    def in_creation_cooldown(self, user_id: int) -> bool:
+        """Проверяет, действует ли для пользователя пауза после неудачной попытки."""
+        return self._cooldowns is not None and user_id in self._cooldowns
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        """
+        Пропускает сообщение или нажатие кнопки к хэндлеру, если оно укладывается в лимиты.
+        """
+        if not isinstance(event, (Message, CallbackQuery)) or event.from_user is None:
+            return await handler(event, data)
+        user_id = event.from_user.id
+        is_callback = isinstance(event, CallbackQuery)
+
+        if self.in_creation_cooldown(user_id):
+            # Пользователь уже получил ответ о занятости операторов
+            logging.info("User %s is in session creation cooldown, update dropped.", user_id)
+            if is_callback:
+                await event.answer()
+            return None
+
+        # Пауза выше действует и на накопившиеся обновления (свободных операторов все равно нет),
+        # а лимит частоты — нет: пользователь писал, пока бот не работал
+        if data.get(BACKLOG_REPLAY):
+            return await handler(event, data)
+
+        if not self.allow(user_id):
+            logging.info("User %s exceeded message rate limit, update dropped.", user_id)
+            if is_callback:
+                # На нажатие нужно ответить в любом случае, иначе кнопка останется в ожидании
+                await event.answer(THROTTLED_CALLBACK_TEXT)
+            elif user_id not in self._warned:
+                self._warned[user_id] = True
+                await event.answer(THROTTLED_TEXT)
+            return None
+
+        return await handler(event, data)
+
+
+# Единственный экземпляр для всего приложения
+throttling = ThrottlingMiddleware(
+    rate=settings.USER_MESSAGE_RATE,
+    burst=settings.USER_MESSAGE_BURST,
+    cooldown=settings.SESSION_CREATE_COOLDOWN_SECONDS,
+)
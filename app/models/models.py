@@ -1,13 +1,17 @@
 """
 Модуль с моделями данных для базы данных.
 
-Определяет таблицы SupportAgent и SupportSession с использованием SQLModel.
+Определяет таблицы SupportAgent, SupportSession, а также служебные таблицы
+(статистика, обработанные обновления, рассылки) с использованием SQLModel.
 """
 import datetime
-from typing import Optional
+from typing import Optional, Tuple
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel
 
+from app.core.config import settings
+
 
 class SupportAgent(SQLModel, table=True):
     """
@@ -15,21 +19,149 @@ class SupportAgent(SQLModel, table=True):
     """
     telegram_id: int = Field(primary_key=True, description="Telegram User ID агента")
     username: Optional[str] = Field(default=None, description="Telegram @username агента")
+    full_name: Optional[str] = Field(default=None, description="Имя агента в Telegram")
+    profile_updated_at: Optional[datetime.datetime] = Field(
+        default=None, description="Время последнего запроса профиля агента у Telegram"
+    )
     is_available: bool = Field(default=True, index=True, description="Доступен ли агент для новых сессий")
     is_active: bool = Field(default=True, index=True, description="Активен ли агент в системе")
+    skills: str = Field(default="", description="Навыки агента через запятую: языки и темы обращений")
 
 
 class SupportSession(SQLModel, table=True):
     """
     Модель сессии поддержки.
+
+    Тема однозначно определяется парой (chat_id, topic_id): ID тем
+    в разных супергруппах могут совпадать. При повторном использовании тем
+    (`TOPIC_REUSE`) у темы может быть несколько сессий, но активная — только одна.
     """
+    __table_args__ = (
+        Index(
+            "uq_supportsession_active_topic",
+            "chat_id",
+            "topic_id",
+            unique=True,
+            sqlite_where=text("status = 'active'"),
+        ),
+        # Поиск активной сессии пользователя на каждое его сообщение; без этого индекса
+        # SQLite выбирает индекс по status и перебирает все активные сессии
+        Index(
+            "ix_supportsession_active_user",
+            "user_telegram_id",
+            sqlite_where=text("status = 'active'"),
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_telegram_id: int = Field(index=True, description="Telegram User ID клиента")
     agent_telegram_id: int = Field(foreign_key="supportagent.telegram_id", description="ID назначенного агента")
-    topic_id: int = Field(unique=True, description="ID темы (topic) в супергруппе")
+    chat_id: int = Field(
+        default_factory=lambda: settings.SUPERGROUP_ID,
+        description="ID супергруппы, в которой создана тема",
+    )
+    topic_id: int = Field(description="ID темы (topic) в супергруппе")
+    bot_id: int = Field(
+        default_factory=lambda: settings.primary_bot_id,
+        index=True,
+        description="ID бота, через которого пользователь ведет диалог",
+    )
     status: str = Field(index=True, default="active", description="Статус сессии: active, closed")
     created_at: datetime.datetime = Field(
         default_factory=datetime.datetime.now,
         description="Время создания сессии"
     )
-    closed_at: Optional[datetime.datetime] = Field(default=None, description="Время закрытия сессии")
\ No newline at end of file
+    first_response_at: Optional[datetime.datetime] = Field(
+        default=None, description="Время первого ответа агента"
+    )
+    closed_at: Optional[datetime.datetime] = Field(default=None, description="Время закрытия сессии")
+
+    @property
+    def topic_key(self) -> Tuple[int, int]:
+        """Ключ темы сессии: (ID супергруппы, ID темы)."""
+        return self.chat_id, self.topic_id
+
+
+class StatsBucket(SQLModel, table=True):
+    """
+    Инкрементально обновляемые счетчики сессий за период.
+
+    Строки с period="hour" и period="day" хранят значения за конкретный час/день,
+    строка с period="total" — за все время.
+    """
+    period: str = Field(primary_key=True, description="Гранулярность: hour, day, total")
+    bucket_start: datetime.datetime = Field(primary_key=True, description="Начало периода")
+    sessions_created: int = Field(default=0, description="Создано сессий")
+    sessions_closed: int = Field(default=0, description="Закрыто сессий")
+    sessions_rejected: int = Field(default=0, description="Отказов из-за отсутствия свободных агентов")
+    first_responses: int = Field(default=0, description="Сессий с первым ответом агента")
+    first_response_seconds_total: float = Field(default=0.0, description="Сумма времени до первого ответа")
+    duration_seconds_total: float = Field(default=0.0, description="Сумма длительностей закрытых сессий")
+
+
+class AgentStats(SQLModel, table=True):
+    """
+    Инкрементально обновляемые счетчики по агенту за все время.
+    """
+    agent_telegram_id: int = Field(primary_key=True, description="Telegram User ID агента")
+    sessions_assigned: int = Field(default=0, description="Назначено сессий")
+    sessions_closed: int = Field(default=0, description="Закрыто сессий")
+    first_responses: int = Field(default=0, description="Сессий с первым ответом агента")
+    first_response_seconds_total: float = Field(default=0.0, description="Сумма времени до первого ответа")
+    duration_seconds_total: float = Field(default=0.0, description="Сумма длительностей закрытых сессий")
+
+
+class ProcessedUpdate(SQLModel, table=True):
+    """
+    Идентификаторы уже обработанных обновлений Telegram.
+
+    Используются для дедупликации при догоняющей обработке накопившихся обновлений.
+    """
+    bot_id: int = Field(primary_key=True, description="ID бота, получившего обновление")
+    update_id: int = Field(primary_key=True, description="ID обновления Telegram (уникален в пределах бота)")
+    processed_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.now, index=True, description="Время обработки"
+    )
+
+
+class Broadcast(SQLModel, table=True):
+    """
+    Рассылка администратора всем пользователям, обращавшимся в поддержку.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    text: str = Field(description="Текст рассылки")
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.now, description="Время создания")
+    finished_at: Optional[datetime.datetime] = Field(
+        default=None, description="Время завершения (пусто - рассылку можно продолжить)"
+    )
+
+
+class BroadcastDelivery(SQLModel, table=True):
+    """
+    Итог доставки рассылки одному пользователю.
+
+    Записываются только окончательные итоги (sent, blocked, failed): пользователи
+    без записи получают рассылку при ее продолжении.
+    """
+    broadcast_id: int = Field(primary_key=True, foreign_key="broadcast.id", description="ID рассылки")
+    user_telegram_id: int = Field(primary_key=True, description="Telegram User ID получателя")
+    status: str = Field(description="Итог: sent, blocked (бот заблокирован), failed")
+    delivered_at: datetime.datetime = Field(default_factory=datetime.datetime.now, description="Время попытки")
+
+
+class MessageLink(SQLModel, table=True):
+    """
+    Связь сообщения с его копией в другом чате (личный чат пользователя <-> тема).
+
+    Каждая пересылка записывается в обе стороны, поэтому копия находится
+    по первичному ключу из любого чата. ID сообщений личного чата у каждого бота
+    свои, поэтому `bot_id` входит в ключ. Записи старше `MESSAGE_LINK_TTL_DAYS` удаляются.
+    """
+    bot_id: int = Field(primary_key=True, description="ID бота, переславшего сообщение")
+    chat_id: int = Field(primary_key=True, description="ID чата сообщения")
+    message_id: int = Field(primary_key=True, description="ID сообщения")
+    peer_chat_id: int = Field(description="ID чата копии")
+    peer_message_id: int = Field(description="ID копии")
+    created_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.now, index=True, description="Время пересылки"
+    )
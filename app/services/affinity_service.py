@@ -0,0 +1,173 @@
+"""
+Сервис закрепления вернувшихся пользователей за прежним агентом.
+
+Последняя закрытая сессия каждого пользователя (агент и тема) хранится
+в ограниченном LRU-кэше. Кэш заполняется при старте одним запросом и
+обновляется при каждом закрытии сессии, поэтому для новых и недавно
+обращавшихся пользователей выбор агента не требует обращения к БД.
+Если из кэша вытеснялись записи, при промахе выполняется запрос
+по индексу `SupportSession.user_telegram_id`.
+"""
+import asyncio
+import datetime
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.models.models import SupportSession
+
+
+@dataclass(frozen=True)
+class LastSession:
+    """Последняя закрытая сессия пользователя."""
+    agent_telegram_id: int
+    chat_id: int
+    topic_id: int
+    closed_at: Optional[datetime.datetime]
+
+
+class LastSessionCache:
+    """
+    LRU-кэш последних закрытых сессий по ID пользователя.
+
+    Отсутствие закрытых сессий тоже кэшируется, поэтому повторные сообщения
+    новых пользователей не приводят к запросам в БД. Пока из кэша ничего
+    не вытеснено, он содержит всех пользователей (`complete`), и промах
+    означает, что закрытых сессий у пользователя нет.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[int, Optional[LastSession]]" = OrderedDict()
+        self.complete = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, user_telegram_id: int, last: Optional[LastSession]) -> None:
+        self._entries[user_telegram_id] = last
+        self._entries.move_to_end(user_telegram_id)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.complete = False
+
+    def remember(self, user_telegram_id: int, last: LastSession) -> None:
+        """Запоминает только что закрытую сессию пользователя."""
+        self._store(user_telegram_id, last)
+
+    def get(self, session: Session, user_telegram_id: int) -> Optional[LastSession]:
+        """
+        Возвращает последнюю закрытую сессию пользователя.
+
+        :param session: Сессия БД для запроса при промахе кэша.
+        """
+        if user_telegram_id in self._entries:
+            self._entries.move_to_end(user_telegram_id)
+            return self._entries[user_telegram_id]
+        if self.complete:
+            return None
+        row = session.exec(
+            select(
+                SupportSession.agent_telegram_id,
+                SupportSession.chat_id,
+                SupportSession.topic_id,
+                SupportSession.closed_at,
+            )
+            .where(
+                SupportSession.user_telegram_id == user_telegram_id,
+                SupportSession.status == "closed",
+            )
+            .order_by(SupportSession.id.desc())
+            .limit(1)
+        ).first()
+        last = LastSession(*row) if row is not None else None
+        self._store(user_telegram_id, last)
+        return last
+
+    def warm(self, session: Session) -> int:
+        """
+        Заполняет кэш последними сессиями недавно обращавшихся пользователей.
+
+        :return: Количество загруженных пользователей.
+        """
+        last_id = func.max(SupportSession.id)
+        # В SQLite остальные колонки при max() берутся из строки с максимальным ID
+        rows = session.exec(
+            select(
+                SupportSession.user_telegram_id,
+                SupportSession.agent_telegram_id,
+                SupportSession.chat_id,
+                SupportSession.topic_id,
+                SupportSession.closed_at,
+                last_id,
+            )
+            .where(SupportSession.status == "closed")
+            .group_by(SupportSession.user_telegram_id)
+            .order_by(last_id.desc())
+            .limit(self.maxsize + 1)
+        ).all()
+        self._entries.clear()
+        # Загружаем от старых к новым, чтобы порядок LRU совпадал с давностью обращений
+        for user_telegram_id, agent_telegram_id, chat_id, topic_id, closed_at, _ in reversed(
+            rows[: self.maxsize]
+        ):
+            self._entries[user_telegram_id] = LastSession(agent_telegram_id, chat_id, topic_id, closed_at)
+        self.complete = len(rows) <= self.maxsize
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Очищает кэш; до следующего `warm` промахи проверяются по БД."""
+        self._entries.clear()
+        self.complete = False
+
+
+def preferred_agent(last: Optional[LastSession], now: Optional[datetime.datetime] = None) -> Optional[int]:
+    """
+    Возвращает прежнего агента пользователя, если закрепление еще действует.
+
+    Закрепление действует `AFFINITY_TTL_SECONDS` после закрытия последней сессии
+    и только для агентов из текущего состава.
+    """
+    if last is None or settings.AFFINITY_TTL_SECONDS <= 0 or last.closed_at is None:
+        return None
+    if last.agent_telegram_id not in settings.AGENT_IDS:
+        return None
+    now = now or datetime.datetime.now()
+    if (now - last.closed_at).total_seconds() > settings.AFFINITY_TTL_SECONDS:
+        return None
+    return last.agent_telegram_id
+
+
+# Ожидающие освобождения конкретного агента: ID агента -> событие
+_release_events: Dict[int, asyncio.Event] = {}
+
+
+def notify_agent_released(agent_id: int) -> None:
+    """Будит создание сессий, ожидающих освобождения агента."""
+    event = _release_events.pop(agent_id, None)
+    if event is not None:
+        event.set()
+
+
+async def wait_for_agent(agent_id: int, timeout: float) -> bool:
+    """
+    Ждет освобождения агента не дольше `timeout` секунд.
+
+    Освобождение при массовых операциях и сверке не сигнализируется —
+    в этих редких случаях ожидание просто завершается по таймауту.
+
+    :return: True, если агент освободился.
+    """
+    # Событие остается в словаре и после таймаута: его разделяют все ожидающие этого агента
+    event = _release_events.setdefault(agent_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+last_sessions = LastSessionCache(maxsize=settings.AFFINITY_CACHE_SIZE)
@@ -2,82 +2,319 @@
 Сервис для управления агентами поддержки.
 """
 import logging
-from typing import Optional
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
 
-from sqlmodel import Session, select
+from aiogram import Bot
+from dotenv import dotenv_values
+from pydantic import TypeAdapter
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, exists, select, update
 
-from app.core.config import settings
-from app.models.models import SupportAgent
+from app.core.background import start_background_task
+from app.core.config import Settings, settings
+from app.models.models import SupportAgent, SupportSession
+from app.services import profile_service
+from app.services.affinity_service import notify_agent_released
+from app.services.routing_service import agent_index, format_skills, parse_skills
 
 
-def sync_agents_from_env(session: Session) -> None:
+@dataclass
+class RosterDiff:
     """
-    Синхронизирует список агентов в БД со списком из переменных окружения.
+    Изменения состава агентов, примененные при синхронизации.
+    """
+    added: List[int] = field(default_factory=list)
+    deactivated: List[int] = field(default_factory=list)
+    reactivated: List[int] = field(default_factory=list)
+    skills_updated: List[int] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.deactivated or self.reactivated or self.skills_updated)
+
+    def summary(self) -> str:
+        return (
+            f"added={self.added}, deactivated={self.deactivated}, "
+            f"reactivated={self.reactivated}, skills_updated={self.skills_updated}"
+        )
+
+
+def sync_agents(session: Session, agent_ids: Iterable[int]) -> RosterDiff:
+    """
+    Приводит список агентов в БД к заданному составу.
 
     - Добавляет новых агентов.
-    - Активирует существующих агентов, если они есть в .env.
-    - Деактивирует агентов, которых убрали из .env.
+    - Активирует существующих агентов, если они есть в списке.
+    - Деактивирует агентов, которых нет в списке.
+
+    Изменения вычисляются по одному SELECT и применяются одним upsert только
+    для затронутых агентов. Флаг `is_available` существующих агентов не меняется,
+    поэтому активные сессии деактивированного агента продолжают работать —
+    он лишь перестает получать новые.
     """
-    logging.info("Starting agent synchronization from .env file...")
-    env_agent_ids = set(settings.AGENT_IDS)
-
-    # 1. Получаем всех агентов из БД
-    statement = select(SupportAgent)
-    db_agents = session.exec(statement).all()
-    db_agent_ids = {agent.telegram_id for agent in db_agents}
-
-    # 2. Находим ID для добавления и для обновления
-    ids_to_add = env_agent_ids - db_agent_ids
-    ids_to_deactivate = db_agent_ids - env_agent_ids
-    ids_to_reactivate = env_agent_ids & db_agent_ids
-
-    # 3. Добавляем новых агентов
-    for agent_id in ids_to_add:
-        new_agent = SupportAgent(telegram_id=agent_id, is_active=True, is_available=True)
-        session.add(new_agent)
-        logging.info(f"Added new agent with ID: {agent_id}")
-
-    # 4. Обновляем статус существующих агентов
-    for agent in db_agents:
-        # Деактивируем агента, только если он есть в списке на деактивацию И он сейчас активен
-        if agent.telegram_id in ids_to_deactivate and agent.is_active:
-            agent.is_active = False
-            session.add(agent)
-            logging.info(f"Deactivated agent with ID: {agent.telegram_id}")
-        # Реактивируем агента, только если он есть в списке на реактивацию И он сейчас неактивен
-        elif agent.telegram_id in ids_to_reactivate and not agent.is_active:
-            agent.is_active = True
-            session.add(agent)
-            logging.info(f"Reactivated agent with ID: {agent.telegram_id}")
+    target_ids = set(agent_ids)
+    db_states = dict(session.exec(select(SupportAgent.telegram_id, SupportAgent.is_active)).all())
+
+    diff = RosterDiff(
+        added=sorted(target_ids - db_states.keys()),
+        deactivated=sorted(
+            agent_id for agent_id, is_active in db_states.items()
+            if is_active and agent_id not in target_ids
+        ),
+        reactivated=sorted(
+            agent_id for agent_id, is_active in db_states.items()
+            if not is_active and agent_id in target_ids
+        ),
+    )
+    if not diff.has_changes:
+        return diff
 
+    rows = [
+        {"telegram_id": agent_id, "is_active": agent_id in target_ids, "is_available": True}
+        for agent_id in diff.added + diff.deactivated + diff.reactivated
+    ]
+    statement = insert(SupportAgent.__table__).values(rows)
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=["telegram_id"],
+            set_={"is_active": statement.excluded.is_active},
+        )
+    )
     session.commit()
+    agent_index.invalidate()
+    logging.info("Agent roster updated: %s", diff.summary())
+    return diff
+
+
+_agents = SupportAgent.__table__
+
+SKILLS_UPDATE = (
+    update(_agents)
+    .where(_agents.c.telegram_id == bindparam("agent_id"))
+    .values(skills=bindparam("new_skills"))
+)
+
+
+def sync_agent_skills(session: Session, agent_skills: Dict[int, Iterable[str]]) -> List[int]:
+    """
+    Приводит навыки агентов в БД к заданным; агенты без навыков в настройках их лишаются.
+
+    :return: ID агентов, навыки которых изменились.
+    """
+    target = {agent_id: format_skills(skills) for agent_id, skills in agent_skills.items()}
+    changes = [
+        {"agent_id": agent_id, "new_skills": target.get(agent_id, "")}
+        for agent_id, skills in session.exec(select(SupportAgent.telegram_id, SupportAgent.skills)).all()
+        if skills != target.get(agent_id, "")
+    ]
+    updated = [change["agent_id"] for change in changes]
+    if updated:
+        # Один UPDATE, выполняемый для всех измененных агентов (executemany)
+        session.connection().execute(SKILLS_UPDATE, changes)
+        session.commit()
+        agent_index.invalidate()
+        logging.info("Agent skills updated: %s", updated)
+    return updated
+
+
+def sync_agents_from_env(session: Session) -> RosterDiff:
+    """
+    Синхронизирует список агентов и их навыки в БД с переменными окружения.
+    """
+    logging.info("Starting agent synchronization from .env file...")
+    diff = sync_agents(session, settings.AGENT_IDS)
+    diff.skills_updated = sync_agent_skills(session, settings.AGENT_SKILLS)
     logging.info("Agent synchronization finished.")
+    return diff
+
+
+def load_agent_ids() -> List[int]:
+    """
+    Заново читает список агентов из .env файла.
+
+    Значение из файла имеет приоритет над переменной окружения процесса:
+    переменные окружения не меняются без перезапуска, а файл можно отредактировать.
+
+    :raises ValueError: Если AGENT_IDS пуст или содержит не числа.
+    """
+    env_file = settings.model_config.get("env_file")
+    raw = dotenv_values(env_file).get("AGENT_IDS") if env_file else None
+    if raw is None:
+        raw = os.environ.get("AGENT_IDS", "")
+    return Settings.parse_agent_ids(raw)
+
+
+def load_agent_skills() -> Dict[int, List[str]]:
+    """
+    Заново читает навыки агентов из .env файла (с тем же приоритетом, что и `load_agent_ids`).
+
+    :raises ValueError: Если AGENT_SKILLS не является корректным JSON.
+    """
+    env_file = settings.model_config.get("env_file")
+    raw = dotenv_values(env_file).get("AGENT_SKILLS") if env_file else None
+    if raw is None:
+        raw = os.environ.get("AGENT_SKILLS")
+    if not raw:
+        return {}
+    return TypeAdapter(Dict[int, List[str]]).validate_json(raw)
+
+
+def reload_agents(session: Session, bot: Optional[Bot] = None) -> RosterDiff:
+    """
+    Перечитывает состав агентов без перезапуска бота.
+
+    Сначала изменения фиксируются в БД, затем одним присваиванием
+    заменяется список в настройках, поэтому остальной код всегда
+    видит согласованный состав. Если передан `bot`, профили добавленных
+    и возвращенных агентов запрашиваются в фоне, чтобы приветствия в новых
+    сессиях сразу использовали их имена.
+
+    :raises ValueError: Если новый список агентов некорректен (старый остается в силе).
+    """
+    agent_ids = load_agent_ids()
+    agent_skills = load_agent_skills()
+    diff = sync_agents(session, agent_ids)
+    diff.skills_updated = sync_agent_skills(session, agent_skills)
+    settings.AGENT_IDS = agent_ids
+    settings.AGENT_SKILLS = agent_skills
+    if bot is not None and (diff.added or diff.reactivated):
+        start_background_task(profile_service.refresh_stale_profiles(bot), name="agent-profiles")
+    return diff
+
+
+def _env_file_mtime() -> Optional[float]:
+    env_file = settings.model_config.get("env_file")
+    try:
+        return os.stat(env_file).st_mtime if env_file else None
+    except OSError:
+        return None
+
+
+# Время последнего изменения .env, с которым синхронизирован состав агентов
+_env_mtime: Optional[float] = _env_file_mtime()
+
+
+def env_file_changed() -> bool:
+    """
+    Проверяет, изменился ли .env с момента предыдущей проверки.
+
+    Сравнивает только время модификации файла, поэтому дешева для частого опроса.
+    """
+    global _env_mtime
+    mtime = _env_file_mtime()
+    if mtime == _env_mtime:
+        return False
+    _env_mtime = mtime
+    return mtime is not None
+
+
+def load_agent_index(session: Session) -> None:
+    """Заполняет индекс маршрутизации свободными активными агентами из БД."""
+    agent_index.load(
+        session.exec(
+            select(SupportAgent.telegram_id, SupportAgent.skills).where(
+                SupportAgent.is_available == True, SupportAgent.is_active == True
+            )
+        ).all()
+    )
+
+
+# У агента есть активная сессия (коррелированный подзапрос для UPDATE агентов).
+# После /reassign у агента может быть несколько сессий: он освобождается только с последней.
+AGENT_HAS_ACTIVE_SESSION = exists().where(
+    SupportSession.agent_telegram_id == SupportAgent.telegram_id,
+    SupportSession.status == "active",
+)
 
 
-def find_available_agent(session: Session) -> Optional[SupportAgent]:
+def release_agent(session: Session, agent: SupportAgent) -> bool:
     """
-    Находит доступного агента и атомарно помечает его как занятого.
+    Делает агента доступным, если у него не осталось активных сессий.
+
+    Изменение не фиксируется: его фиксирует вызывающий код вместе с закрытием сессии.
+
+    :return: True, если агент освобожден.
+    """
+    released = session.exec(
+        update(SupportAgent)
+        .where(SupportAgent.telegram_id == agent.telegram_id, ~AGENT_HAS_ACTIVE_SESSION)
+        .values(is_available=True)
+        .returning(SupportAgent.telegram_id)
+        .execution_options(synchronize_session=False)
+    ).first() is not None
+    if released:
+        agent.is_available = True
+    return released
+
+
+def return_agent_to_index(agent: SupportAgent) -> None:
+    """Возвращает освободившегося агента в индекс маршрутизации."""
+    if agent.is_active and agent.is_available:
+        if agent_index.loaded:
+            agent_index.add(agent.telegram_id, parse_skills(agent.skills))
+        notify_agent_released(agent.telegram_id)
+
+
+def is_agent_free(session: Session, agent_id: int) -> bool:
+    """Проверяет по индексу маршрутизации, свободен ли агент."""
+    if not agent_index.loaded:
+        load_agent_index(session)
+    return agent_id in agent_index
+
+
+def _claim_agent(session: Session, agent_id: int) -> Optional[SupportAgent]:
+    """Занимает агента условным UPDATE; None, если он уже занят или деактивирован."""
+    agent_index.discard(agent_id)
+    result = session.exec(
+        update(SupportAgent)
+        .where(
+            SupportAgent.telegram_id == agent_id,
+            SupportAgent.is_available == True,
+            SupportAgent.is_active == True,
+        )
+        .values(is_available=False)
+    )
+    session.commit()
+    if not result.rowcount:
+        logging.debug("Agent %s from routing index is no longer available.", agent_id)
+        return None
+    return session.get(SupportAgent, agent_id)
+
+
+def find_available_agent(
+    session: Session, route: Sequence[str] = (), preferred_agent_id: Optional[int] = None
+) -> Optional[SupportAgent]:
+    """
+    Находит доступного агента с подходящими навыками и атомарно помечает его как занятого.
+
+    Кандидат берется из индекса маршрутизации за O(1) и сразу убирается из него,
+    поэтому конкурентные хэндлеры не получат одного и того же агента. Агент
+    занимается условным UPDATE: если индекс устарел и агент уже занят
+    или деактивирован, берется следующий кандидат.
 
-    Использует 'SELECT ... FOR UPDATE' для предотвращения состояния гонки.
     :param session: Сессия базы данных.
+    :param route: Требуемые навыки в порядке важности (см. `routing_service.build_route`).
+    :param preferred_agent_id: Агент, которому отдается предпочтение, если он свободен
+                               (прежний агент вернувшегося пользователя).
     :return: Объект SupportAgent или None, если свободных агентов нет.
     """
-    statement = (
-        select(SupportAgent)
-        .where(SupportAgent.is_available == True, SupportAgent.is_active == True)
-        .limit(1)
-        .with_for_update()  # Блокируем найденную строку до конца транзакции
-    )
-    agent = session.exec(statement).first()
+    if not agent_index.loaded:
+        load_agent_index(session)
 
-    if agent:
-        logging.info(f"Found available agent: {agent.telegram_id}. Locking for session.")
-        agent.is_available = False
-        session.add(agent)
-        session.commit()
-        session.refresh(agent)  # Обновляем объект из БД
-        logging.info(f"Agent {agent.telegram_id} is now marked as unavailable.")
-        return agent
+    if preferred_agent_id is not None and preferred_agent_id in agent_index:
+        agent = _claim_agent(session, preferred_agent_id)
+        if agent:
+            logging.info("Agent %s is now marked as unavailable (affinity).", preferred_agent_id)
+            return agent
+
+    while (agent_id := agent_index.candidate(tuple(route), settings.ROUTING_FALLBACK_TO_ANY)) is not None:
+        agent = _claim_agent(session, agent_id)
+        if agent:
+            logging.info("Agent %s is now marked as unavailable (route %s).", agent_id, route)
+            return agent
 
-    logging.warning("No available agents found.")
-    return None
\ No newline at end of file
+    logging.warning("No available agents found for route %s.", route)
+    return None
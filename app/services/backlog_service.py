@@ -0,0 +1,163 @@
+"""
+Сервис догоняющей обработки обновлений, накопившихся за время простоя бота.
+
+Вместо `drop_pending_updates=True` бот при старте забирает накопившиеся
+обновления пачками и обрабатывает их с ограниченным параллелизмом,
+сохраняя порядок в рамках одного пользователя или темы.
+
+Пачка подтверждается в Telegram (следующим `get_updates` со смещением)
+только после полной обработки, а ID обработанных обновлений сохраняются
+в БД — так при повторном сбое обновления не теряются и не обрабатываются дважды.
+"""
+import datetime
+import logging
+import time
+from dataclasses import dataclass
+from typing import Hashable, List, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, col, delete, select
+
+from app.core.keyed_executor import KeyedExecutor
+from app.models.models import ProcessedUpdate
+
+# Максимальный размер пачки get_updates (ограничение Bot API)
+BATCH_SIZE = 100
+
+# Ключ в данных обработки, которым помечены обновления, накопившиеся за время простоя
+BACKLOG_REPLAY = "backlog_replay"
+
+# Сколько хранить ID обработанных обновлений (Telegram хранит обновления до 24 часов)
+PROCESSED_RETENTION = datetime.timedelta(days=2)
+
+
+@dataclass
+class BacklogReport:
+    """
+    Итог догоняющей обработки.
+    """
+    fetched: int = 0
+    processed: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.processed / self.seconds if self.seconds else 0.0
+        return (
+            f"fetched={self.fetched}, processed={self.processed}, "
+            f"duplicates={self.duplicates}, {self.seconds:.1f}s ({rate:.0f} updates/s)"
+        )
+
+
+def update_ordering_key(update: Update) -> Hashable:
+    """
+    Возвращает ключ, в рамках которого обновления должны обрабатываться по порядку.
+
+    - Личные сообщения и колбэки — по пользователю.
+    - Сообщения в темах супергруппы — по (чат, тема).
+    - Прочие обновления порядок не требуют.
+    """
+    message = update.message or update.edited_message
+    if message is not None:
+        if message.chat.type == "private":
+            return ("user", message.chat.id)
+        if message.message_thread_id is not None:
+            return ("topic", message.chat.id, message.message_thread_id)
+        return ("chat", message.chat.id)
+    if update.callback_query is not None:
+        return ("user", update.callback_query.from_user.id)
+    return ("update", update.update_id)
+
+
+def _load_processed_ids(session: Session, bot_id: int, updates: List[Update]) -> Set[int]:
+    """Возвращает ID обновлений пачки, которые уже были обработаны."""
+    ids = [update.update_id for update in updates]
+    return set(
+        session.exec(
+            select(ProcessedUpdate.update_id).where(
+                ProcessedUpdate.bot_id == bot_id, col(ProcessedUpdate.update_id).in_(ids)
+            )
+        ).all()
+    )
+
+
+def _save_processed_ids(session: Session, bot_id: int, update_ids: List[int]) -> None:
+    """Сохраняет ID обработанных обновлений одним INSERT."""
+    if not update_ids:
+        return
+    now = datetime.datetime.now()
+    session.exec(
+        insert(ProcessedUpdate.__table__)
+        .values(
+            [
+                {"bot_id": bot_id, "update_id": update_id, "processed_at": now}
+                for update_id in update_ids
+            ]
+        )
+        .on_conflict_do_nothing()
+    )
+    session.commit()
+
+
+def cleanup_processed_updates(session: Session) -> int:
+    """Удаляет устаревшие записи об обработанных обновлениях."""
+    threshold = datetime.datetime.now() - PROCESSED_RETENTION
+    result = session.exec(delete(ProcessedUpdate).where(ProcessedUpdate.processed_at < threshold))
+    session.commit()
+    return result.rowcount
+
+
+async def drain_backlog(
+    dispatcher: Dispatcher, bot: Bot, session: Session, concurrency: int
+) -> BacklogReport:
+    """
+    Обрабатывает все накопившиеся обновления одного бота.
+
+    :param dispatcher: Диспетчер с подключенными роутерами.
+    :param bot: Экземпляр aiogram Bot.
+    :param session: Сессия базы данных для учета обработанных обновлений.
+    :param concurrency: Максимальное количество одновременно обрабатываемых обновлений.
+    :return: Отчет об обработке.
+    """
+    report = BacklogReport()
+    started = time.monotonic()
+    allowed_updates = dispatcher.resolve_used_update_types()
+    offset = None
+
+    while True:
+        # Запрос со смещением подтверждает в Telegram все предыдущие обновления
+        updates = await bot.get_updates(
+            offset=offset, limit=BATCH_SIZE, timeout=0, allowed_updates=allowed_updates
+        )
+        if not updates:
+            break
+        report.fetched += len(updates)
+        processed_ids = _load_processed_ids(session, bot.id, updates)
+        executor = KeyedExecutor(concurrency)
+        done: List[int] = []
+
+        for update in updates:
+            if update.update_id in processed_ids:
+                report.duplicates += 1
+                continue
+
+            async def process(update: Update = update) -> None:
+                try:
+                    await dispatcher.feed_update(bot, update, **{BACKLOG_REPLAY: True})
+                finally:
+                    # Даже неудачно обработанное обновление не повторяем бесконечно
+                    done.append(update.update_id)
+
+            executor.submit(update_ordering_key(update), process)
+
+        await executor.join()
+        _save_processed_ids(session, bot.id, done)
+        report.processed += len(done)
+        offset = updates[-1].update_id + 1
+
+    cleanup_processed_updates(session)
+    report.seconds = time.monotonic() - started
+    logging.info("Backlog drained: %s", report.summary())
+    return report
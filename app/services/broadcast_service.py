@@ -0,0 +1,270 @@
+"""
+Сервис рассылок администратора всем пользователям, обращавшимся в поддержку.
+
+Получатели читаются из `SupportSession` постранично по возрастанию ID
+пользователя (keyset-пагинация), поэтому память не зависит от числа
+пользователей. Отправку выполняют воркеры с общим ограничителем частоты
+на каждого бота; ответ Telegram `retry_after` приостанавливает всех воркеров
+этого бота. Окончательный итог по каждому пользователю сохраняется в
+`BroadcastDelivery`, и прерванную рассылку можно продолжить с того же места.
+При остановке бота рассылки перестают брать новых получателей, досылают
+уже взятых и сохраняют итоги (см. `stop_broadcasts`).
+"""
+import asyncio
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from sqlmodel import Session, exists, func, select
+
+from app.core.bots import get_bot
+from app.core.config import settings
+from app.core.rate_limiter import AsyncRateLimiter
+from app.models.models import Broadcast, BroadcastDelivery, SupportSession
+from app.services.bulk_service import ProgressCallback
+
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+# Количество получателей, читаемых из БД за один запрос
+PAGE_SIZE = 500
+# Итоги доставки записываются в БД пачками такого размера
+FLUSH_SIZE = 50
+# Сколько раз повторять отправку одному пользователю после `retry_after`
+MAX_RETRY_AFTER_ATTEMPTS = 5
+
+# Получатель: (ID пользователя, ID бота, через которого он обращался последним)
+Recipient = Tuple[int, int]
+
+# Выполняемые рассылки: ID -> событие запроса остановки
+_running: Dict[int, asyncio.Event] = {}
+
+
+@dataclass
+class BroadcastResult:
+    """
+    Итог запуска рассылки.
+
+    `deferred` — пользователи, которым не удалось отправить сообщение из-за
+    временной ошибки; они получат рассылку при ее продолжении.
+    """
+    broadcast_id: int
+    total: int = 0
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    deferred: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.deferred == 0
+
+    def summary(self) -> str:
+        return (
+            f"отправлено {self.sent} из {self.total}, заблокировали бота {self.blocked}, "
+            f"ошибок {self.failed}, отложено {self.deferred}"
+        )
+
+
+def create_broadcast(session: Session, text: str) -> Broadcast:
+    """Создает рассылку."""
+    broadcast = Broadcast(text=text)
+    session.add(broadcast)
+    session.commit()
+    session.refresh(broadcast)
+    logging.info("Broadcast %s created.", broadcast.id)
+    return broadcast
+
+
+def get_unfinished_broadcasts(session: Session) -> List[Broadcast]:
+    """Возвращает рассылки, которые были прерваны и могут быть продолжены."""
+    return list(session.exec(select(Broadcast).where(Broadcast.finished_at == None)).all())
+
+
+def _pending_recipients_statement(broadcast_id: int):
+    """Пользователи без окончательного итога доставки, с ботом их последней сессии."""
+    delivered = exists().where(
+        BroadcastDelivery.broadcast_id == broadcast_id,
+        BroadcastDelivery.user_telegram_id == SupportSession.user_telegram_id,
+    )
+    # В SQLite bot_id при max(id) берется из последней сессии пользователя
+    return (
+        select(SupportSession.user_telegram_id, SupportSession.bot_id, func.max(SupportSession.id))
+        .where(~delivered)
+        .group_by(SupportSession.user_telegram_id)
+    )
+
+
+def count_pending_recipients(session: Session, broadcast_id: int) -> int:
+    """Количество пользователей, которым рассылка еще не доставлена."""
+    subquery = _pending_recipients_statement(broadcast_id).subquery()
+    return session.exec(select(func.count()).select_from(subquery)).one()
+
+
+def iter_pending_recipients(
+    session: Session, broadcast_id: int, page_size: int = PAGE_SIZE
+) -> Iterator[Recipient]:
+    """
+    Перебирает получателей рассылки страницами по `page_size`.
+
+    Каждая страница — короткий запрос по индексу `user_telegram_id`: курсор
+    не держится открытым между страницами и не блокирует запись в SQLite.
+    """
+    statement = _pending_recipients_statement(broadcast_id).order_by(SupportSession.user_telegram_id)
+    after: Optional[int] = None
+    while True:
+        page_statement = statement
+        if after is not None:
+            page_statement = page_statement.where(SupportSession.user_telegram_id > after)
+        rows = session.exec(page_statement.limit(page_size)).all()
+        for user_telegram_id, bot_id, _ in rows:
+            yield user_telegram_id, bot_id
+        if len(rows) < page_size:
+            return
+        after = rows[-1][0]
+
+
+async def _deliver(bot: Bot, limiter: AsyncRateLimiter, user_telegram_id: int, text: str) -> Optional[str]:
+    """
+    Отправляет рассылку одному пользователю.
+
+    :return: Окончательный итог или None, если ошибка временная.
+    """
+    for _ in range(MAX_RETRY_AFTER_ATTEMPTS):
+        await limiter.acquire()
+        try:
+            await bot.send_message(chat_id=user_telegram_id, text=text)
+            return SENT
+        except TelegramRetryAfter as e:
+            logging.warning("Broadcast hit flood control, pausing for %ss.", e.retry_after)
+            limiter.pause(e.retry_after)
+        except TelegramForbiddenError:
+            return BLOCKED
+        except TelegramBadRequest as e:
+            logging.warning("Broadcast to user %s failed: %s", user_telegram_id, e)
+            return FAILED
+        except Exception as e:
+            logging.warning("Broadcast to user %s deferred: %s", user_telegram_id, e)
+            return None
+    return None
+
+
+async def run_broadcast(
+    session: Session,
+    bot: Bot,
+    broadcast_id: int,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Optional[BroadcastResult]:
+    """
+    Отправляет рассылку всем пользователям, которым она еще не доставлена.
+
+    Повторный вызов для прерванной рассылки продолжает ее: пользователи
+    с записанным итогом пропускаются.
+
+    :param session: Сессия базы данных.
+    :param bot: Основной бот; пользователям пишет бот их последней сессии.
+    :param broadcast_id: ID рассылки.
+    :param on_progress: Необязательный колбэк прогресса.
+    :return: Итог или None, если рассылка не найдена, уже завершена или выполняется.
+    """
+    broadcast = session.get(Broadcast, broadcast_id)
+    if broadcast is None or broadcast.finished_at is not None or broadcast_id in _running:
+        return None
+    stop = _running[broadcast_id] = asyncio.Event()
+    try:
+        return await _run(session, bot, broadcast, stop, on_progress)
+    finally:
+        _running.pop(broadcast_id, None)
+
+
+def stop_broadcasts() -> None:
+    """
+    Просит выполняемые рассылки остановиться.
+
+    Рассылка перестает брать новых получателей, воркеры досылают уже взятых
+    из очереди, итоги записываются в БД. Оставшиеся пользователи получат
+    рассылку при ее продолжении.
+    """
+    for stop in _running.values():
+        stop.set()
+
+
+async def _run(
+    session: Session,
+    bot: Bot,
+    broadcast: Broadcast,
+    stop: asyncio.Event,
+    on_progress: Optional[ProgressCallback],
+) -> BroadcastResult:
+    broadcast_id = broadcast.id
+    text = broadcast.text
+    result = BroadcastResult(broadcast_id=broadcast_id, total=count_pending_recipients(session, broadcast_id))
+    logging.info("Broadcast %s started for %s users.", broadcast_id, result.total)
+
+    # Лимиты Telegram действуют для каждого бота отдельно
+    limiters: Dict[int, AsyncRateLimiter] = {}
+    concurrency = max(1, settings.BROADCAST_CONCURRENCY)
+    queue: "asyncio.Queue[Optional[Recipient]]" = asyncio.Queue(maxsize=concurrency * 2)
+    outcomes: List[BroadcastDelivery] = []
+    done = 0
+
+    def flush() -> None:
+        if outcomes:
+            session.add_all(outcomes)
+            session.commit()
+            outcomes.clear()
+
+    async def worker() -> None:
+        nonlocal done
+        while (recipient := await queue.get()) is not None:
+            user_telegram_id, bot_id = recipient
+            limiter = limiters.get(bot_id)
+            if limiter is None:
+                limiter = limiters[bot_id] = AsyncRateLimiter(settings.BROADCAST_RATE_LIMIT)
+            status = await _deliver(get_bot(bot_id, bot), limiter, user_telegram_id, text)
+            if status is None:
+                result.deferred += 1
+            else:
+                setattr(result, status, getattr(result, status) + 1)
+                outcomes.append(
+                    BroadcastDelivery(broadcast_id=broadcast_id, user_telegram_id=user_telegram_id, status=status)
+                )
+                if len(outcomes) >= FLUSH_SIZE:
+                    flush()
+            done += 1
+            if on_progress:
+                await on_progress(done, result.total)
+
+    async def produce() -> None:
+        for recipient in iter_pending_recipients(session, broadcast_id):
+            if stop.is_set():
+                break
+            await queue.put(recipient)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    tasks.append(asyncio.create_task(produce()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Итоги уже отправленных сообщений сохраняются и при прерывании
+        flush()
+
+    if stop.is_set():
+        # Получатели, до которых рассылка не дошла, получат ее при продолжении
+        result.deferred += result.total - done
+
+    if result.finished:
+        broadcast.finished_at = datetime.datetime.now()
+        session.add(broadcast)
+        session.commit()
+    logging.info("Broadcast %s: %s.", broadcast_id, result.summary())
+    return result
@@ -0,0 +1,259 @@
+"""
+Сервис для массовых административных операций над сессиями поддержки.
+
+В отличие от `session_service.close_session`, который закрывает одну сессию,
+функции этого модуля обновляют БД пакетными SQL-запросами, а вызовы Bot API
+(удаление тем, уведомления) выполняют конкурентно через ограничитель частоты.
+"""
+import asyncio
+import datetime
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Sequence, TypeVar
+
+from aiogram import Bot
+from sqlmodel import Session, col, select, update
+
+from app.core.bots import get_bot
+from app.core.config import settings
+from app.core.rate_limiter import AsyncRateLimiter
+from app.models.models import SupportAgent, SupportSession
+from app.services import agent_service, session_service, stats_service
+from app.services.affinity_service import LastSession, last_sessions
+from app.services.idle_service import idle_tracker
+from app.services.profile_service import agent_profiles
+from app.services.routing_service import agent_index
+
+T = TypeVar("T")
+
+# Колбэк прогресса: (обработано, всего)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+# Максимальное количество ID в одном выражении `IN (...)`
+SQL_CHUNK_SIZE = 500
+
+SESSION_CLOSED_TEXT = "✅ Ваша сессия поддержки была завершена оператором. Спасибо за обращение!"
+
+
+@dataclass
+class BulkOperationResult:
+    """
+    Итог массовой операции.
+    """
+    total: int = 0
+    succeeded: int = 0
+    failed_session_ids: List[int] = field(default_factory=list)
+
+    @property
+    def failed(self) -> int:
+        return len(self.failed_session_ids)
+
+
+def chunked(items: Sequence[T], size: int = SQL_CHUNK_SIZE) -> Iterable[Sequence[T]]:
+    """Разбивает последовательность на части для пакетных SQL-запросов."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def fan_out(
+    items: Sequence[T],
+    worker: Callable[[T], Awaitable[Any]],
+    on_progress: Optional[ProgressCallback] = None,
+) -> List[bool]:
+    """
+    Выполняет `worker` для каждого элемента конкурентно.
+
+    Количество одновременных вызовов ограничено `BULK_CONCURRENCY`,
+    а их частота — `BULK_API_RATE_LIMIT`. Ошибка одного вызова не прерывает остальные.
+
+    :param items: Элементы для обработки.
+    :param worker: Асинхронная функция, выполняющая вызов Bot API.
+    :param on_progress: Необязательный колбэк прогресса.
+    :return: Список флагов успеха в порядке элементов.
+    """
+    limiter = AsyncRateLimiter(settings.BULK_API_RATE_LIMIT, burst=settings.BULK_CONCURRENCY)
+    semaphore = asyncio.Semaphore(settings.BULK_CONCURRENCY)
+    total = len(items)
+    done = 0
+
+    async def run(item: T) -> bool:
+        nonlocal done
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                await worker(item)
+                ok = True
+            except Exception as e:
+                logging.error("Bulk operation failed for %r: %s", item, e)
+                ok = False
+        done += 1
+        if on_progress:
+            await on_progress(done, total)
+        return ok
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
+
+
+def _release_agents_without_sessions(session: Session, agent_ids: Iterable[int]) -> None:
+    """
+    Делает доступными агентов, у которых не осталось активных сессий.
+
+    Выполняется одним UPDATE на пакет агентов.
+    """
+    for chunk in chunked(sorted(set(agent_ids))):
+        session.exec(
+            update(SupportAgent)
+            .where(col(SupportAgent.telegram_id).in_(chunk), ~agent_service.AGENT_HAS_ACTIVE_SESSION)
+            .values(is_available=True)
+        )
+    agent_index.invalidate()
+
+
+async def close_sessions_bulk(
+    session: Session,
+    bot: Bot,
+    agent_telegram_id: Optional[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> BulkOperationResult:
+    """
+    Массово закрывает активные сессии.
+
+    1. Выбирает активные сессии (всех или одного агента).
+    2. Конкурентно удаляет (или закрывает при `TOPIC_REUSE`) их темы.
+    3. Пакетно помечает закрытыми сессии, темы которых убраны и которые еще активны.
+    4. Освобождает агентов, у которых не осталось активных сессий.
+    5. Конкурентно уведомляет пользователей.
+
+    :param session: Сессия базы данных.
+    :param bot: Экземпляр aiogram Bot.
+    :param agent_telegram_id: ID агента; если не задан, закрываются все сессии.
+    :param on_progress: Необязательный колбэк прогресса удаления тем.
+    :return: Итог операции.
+    """
+    statement = select(
+        SupportSession.id,
+        SupportSession.user_telegram_id,
+        SupportSession.agent_telegram_id,
+        SupportSession.chat_id,
+        SupportSession.topic_id,
+        SupportSession.bot_id,
+        SupportSession.created_at,
+    ).where(SupportSession.status == "active")
+    if agent_telegram_id is not None:
+        statement = statement.where(SupportSession.agent_telegram_id == agent_telegram_id)
+    rows = session.exec(statement).all()
+    result = BulkOperationResult(total=len(rows))
+    logging.info("Bulk close requested for %s sessions (agent=%s).", len(rows), agent_telegram_id)
+    if not rows:
+        return result
+
+    async def delete_topic(row) -> None:
+        await session_service.retire_topic(bot, row.chat_id, row.topic_id)
+
+    outcomes = await fan_out(rows, delete_topic, on_progress)
+    retired_rows = [row for row, ok in zip(rows, outcomes) if ok]
+    result.failed_session_ids = [row.id for row, ok in zip(rows, outcomes) if not ok]
+    result.succeeded = len(retired_rows)
+
+    if retired_rows:
+        now = datetime.datetime.now()
+        closed_ids = set()
+        for chunk in chunked([row.id for row in retired_rows]):
+            # Пока удалялись темы, часть сессий могла быть закрыта /close_chat или по неактивности:
+            # они не закрываются повторно и не учитываются второй раз
+            closed_ids.update(
+                session.exec(
+                    update(SupportSession)
+                    .where(col(SupportSession.id).in_(chunk), SupportSession.status == "active")
+                    .values(status="closed", closed_at=now)
+                    .returning(SupportSession.id)
+                ).scalars()
+            )
+        closed_rows = [row for row in retired_rows if row.id in closed_ids]
+        _release_agents_without_sessions(session, (row.agent_telegram_id for row in closed_rows))
+        stats_service.record_sessions_closed(
+            session, ((row.agent_telegram_id, row.created_at) for row in closed_rows), now
+        )
+        session.commit()
+        logging.info("Bulk close: %s sessions closed and saved to DB.", len(closed_rows))
+        for row in closed_rows:
+            idle_tracker.forget((row.chat_id, row.topic_id))
+            last_sessions.remember(
+                row.user_telegram_id,
+                LastSession(row.agent_telegram_id, row.chat_id, row.topic_id, now),
+            )
+
+        async def notify_user(row) -> None:
+            # Пользователю может писать только бот, с которым он ведет диалог
+            await get_bot(row.bot_id, bot).send_message(
+                chat_id=row.user_telegram_id, text=SESSION_CLOSED_TEXT
+            )
+
+        await fan_out(closed_rows, notify_user)
+
+    if result.failed_session_ids:
+        logging.warning("Bulk close: failed to delete topics for sessions %s", result.failed_session_ids)
+    return result
+
+
+async def reassign_sessions_bulk(
+    session: Session,
+    bot: Bot,
+    from_agent_id: int,
+    to_agent_id: int,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Optional[BulkOperationResult]:
+    """
+    Массово передает активные сессии одного агента другому.
+
+    1. Одним UPDATE переназначает сессии на нового агента.
+    2. Помечает нового агента занятым, а прежнего — свободным.
+    3. Конкурентно отправляет уведомление о передаче в каждую тему.
+
+    :param session: Сессия базы данных.
+    :param bot: Экземпляр aiogram Bot.
+    :param from_agent_id: ID агента, с которого снимаются сессии.
+    :param to_agent_id: ID агента, на которого переводятся сессии.
+    :param on_progress: Необязательный колбэк прогресса отправки уведомлений.
+    :return: Итог операции или None, если целевой агент не найден или неактивен.
+    """
+    target_agent = session.get(SupportAgent, to_agent_id)
+    if not target_agent or not target_agent.is_active or from_agent_id == to_agent_id:
+        logging.warning("Cannot reassign sessions from %s to %s.", from_agent_id, to_agent_id)
+        return None
+
+    topics = session.exec(
+        select(SupportSession.chat_id, SupportSession.topic_id, SupportSession.bot_id).where(
+            SupportSession.agent_telegram_id == from_agent_id,
+            SupportSession.status == "active",
+        )
+    ).all()
+    result = BulkOperationResult(total=len(topics))
+    if not topics:
+        return result
+
+    session.exec(
+        update(SupportSession)
+        .where(
+            SupportSession.agent_telegram_id == from_agent_id,
+            SupportSession.status == "active",
+        )
+        .values(agent_telegram_id=to_agent_id)
+    )
+    target_agent.is_available = False
+    session.add(target_agent)
+    agent_index.discard(to_agent_id)
+    _release_agents_without_sessions(session, [from_agent_id])
+    session.commit()
+    logging.info("Reassigned %s sessions from agent %s to %s.", len(topics), from_agent_id, to_agent_id)
+
+    notice = f"🔄 Сессия передана агенту {agent_profiles.mention(to_agent_id)}."
+
+    async def notify_topic(topic) -> None:
+        await get_bot(topic.bot_id, bot).send_message(
+            chat_id=topic.chat_id, message_thread_id=topic.topic_id, text=notice
+        )
+
+    outcomes = await fan_out(topics, notify_topic, on_progress)
+    result.succeeded = sum(outcomes)
+    return result
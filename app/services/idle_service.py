@@ -0,0 +1,244 @@
+"""
+Сервис автоматического закрытия неактивных сессий.
+
+Время последней активности каждой сессии хранится в памяти и обновляется
+хэндлерами пересылки. Дедлайны хранятся в куче (heap) с ленивой
+перепроверкой: обновление активности — O(1) без операций с кучей,
+а при извлечении дедлайна сессия заново планируется, если за это время
+была активность. Это позволяет отслеживать десятки тысяч сессий
+без опроса БД.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from sqlmodel import Session, select
+
+from app.core.background import start_background_task, start_service_task
+from app.core.bots import get_bot
+from app.core.config import settings
+from app.db.session import get_session
+from app.models.models import SupportSession
+
+# Максимальное время сна планировщика между проверками (в секундах)
+MAX_SLEEP_SECONDS = 30.0
+
+WARNING = "warning"
+TIMEOUT = "timeout"
+
+# Ключ темы: (ID супергруппы, ID темы)
+TopicKey = Tuple[int, int]
+
+
+@dataclass
+class _IdleEntry:
+    user_telegram_id: int
+    last_activity: float
+    warned_at: Optional[float] = None
+
+
+class IdleTracker:
+    """
+    Отслеживает активность сессий и определяет, какие из них пора
+    предупредить или закрыть.
+
+    Сессии идентифицируются ключом темы (ID супергруппы, ID темы).
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        warning: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.timeout = timeout
+        # Предупреждение не может наступать раньше начала сессии
+        self.warning = min(warning, timeout)
+        self.clock = clock
+        self._entries: Dict[TopicKey, _IdleEntry] = {}
+        self._users: Dict[int, TopicKey] = {}
+        self._heap: List[Tuple[float, TopicKey]] = []
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        """Включено ли автоматическое закрытие (иначе только учет активности)."""
+        return self.timeout > 0
+
+    def _next_deadline(self, entry: _IdleEntry) -> float:
+        if entry.warned_at is not None:
+            # После предупреждения у сессии всегда есть полный интервал `warning`
+            return max(entry.last_activity + self.timeout, entry.warned_at + self.warning)
+        return entry.last_activity + self.timeout - self.warning
+
+    def register(self, topic: TopicKey, user_telegram_id: int) -> None:
+        """Начинает отслеживание новой сессии."""
+        entry = _IdleEntry(user_telegram_id=user_telegram_id, last_activity=self.clock())
+        self._entries[topic] = entry
+        self._users[user_telegram_id] = topic
+        if self.enabled:
+            heapq.heappush(self._heap, (self._next_deadline(entry), topic))
+            self._wakeup.set()
+
+    def load(self, sessions: Iterable[Tuple[int, int, int]]) -> None:
+        """Регистрирует пакет сессий из троек (ID супергруппы, ID темы, ID пользователя)."""
+        for chat_id, topic_id, user_telegram_id in sessions:
+            self.register((chat_id, topic_id), user_telegram_id)
+
+    def touch(self, topic: TopicKey) -> None:
+        """Отмечает активность в сессии. Выполняется за O(1)."""
+        entry = self._entries.get(topic)
+        if entry:
+            entry.last_activity = self.clock()
+            entry.warned_at = None
+
+    def forget(self, topic: TopicKey) -> None:
+        """Прекращает отслеживание сессии (устаревшая запись в куче будет пропущена)."""
+        entry = self._entries.pop(topic, None)
+        if entry and self._users.get(entry.user_telegram_id) == topic:
+            del self._users[entry.user_telegram_id]
+
+    def topic_for_user(self, user_telegram_id: int) -> Optional[TopicKey]:
+        """Возвращает ключ темы активной сессии пользователя, если она отслеживается."""
+        return self._users.get(user_telegram_id)
+
+    def process_due(self) -> List[Tuple[str, TopicKey, int]]:
+        """
+        Извлекает наступившие дедлайны.
+
+        :return: Список действий (WARNING или TIMEOUT, ключ темы, ID пользователя).
+        """
+        now = self.clock()
+        actions = []
+        while self._heap and self._heap[0][0] <= now:
+            _, topic = heapq.heappop(self._heap)
+            entry = self._entries.get(topic)
+            if entry is None:
+                continue  # сессия уже закрыта
+            deadline = self._next_deadline(entry)
+            if deadline <= now:
+                if entry.warned_at is None:
+                    entry.warned_at = now
+                    actions.append((WARNING, topic, entry.user_telegram_id))
+                else:
+                    actions.append((TIMEOUT, topic, entry.user_telegram_id))
+                    self.forget(topic)
+                    continue
+            heapq.heappush(self._heap, (self._next_deadline(entry), topic))
+        return actions
+
+    def seconds_until_next(self) -> float:
+        """Возвращает время до ближайшего дедлайна (не более MAX_SLEEP_SECONDS)."""
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        return min(MAX_SLEEP_SECONDS, max(0.0, self._heap[0][0] - self.clock()))
+
+    async def wait_for_next(self) -> None:
+        """Спит до ближайшего дедлайна или до регистрации новой сессии."""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.seconds_until_next())
+        except asyncio.TimeoutError:
+            pass
+
+
+# Единственный экземпляр трекера для всего приложения
+idle_tracker = IdleTracker(
+    timeout=settings.IDLE_TIMEOUT_SECONDS, warning=settings.IDLE_WARNING_SECONDS
+)
+
+
+def _find_active_session(session: Session, topic: TopicKey) -> Optional[SupportSession]:
+    chat_id, topic_id = topic
+    return session.exec(
+        select(SupportSession).where(
+            SupportSession.chat_id == chat_id,
+            SupportSession.topic_id == topic_id,
+            SupportSession.status == "active",
+        )
+    ).first()
+
+
+async def warn_idle_session(bot: Bot, topic: TopicKey, user_telegram_id: int) -> None:
+    """Предупреждает пользователя и агента о скором автоматическом закрытии."""
+    with next(get_session()) as session:
+        active_session = _find_active_session(session, topic)
+    if not active_session:
+        return
+    session_bot = get_bot(active_session.bot_id, bot)
+    minutes = max(1, round(idle_tracker.warning / 60))
+    text = f"⌛ Сессия будет автоматически закрыта через {minutes} мин. без активности."
+    await session_bot.send_message(chat_id=user_telegram_id, text=text)
+    await session_bot.send_message(
+        chat_id=active_session.chat_id, message_thread_id=active_session.topic_id, text=text
+    )
+
+
+async def close_idle_session(bot: Bot, topic: TopicKey, user_telegram_id: int) -> None:
+    """Закрывает неактивную сессию через `session_service.close_session`."""
+    # Импорт внутри функции: session_service сам обращается к idle_tracker
+    from app.services import session_service
+
+    with next(get_session()) as session:
+        active_session = _find_active_session(session, topic)
+        if not active_session:
+            return
+        logging.info("Closing idle session %s (topic %s).", active_session.id, topic)
+        session_bot = get_bot(active_session.bot_id, bot)
+        success = await session_service.close_session(
+            session=session, bot=session_bot, active_session=active_session
+        )
+    if success:
+        await session_bot.send_message(
+            chat_id=user_telegram_id,
+            text="✅ Ваша сессия поддержки была автоматически завершена из-за неактивности.",
+        )
+    else:
+        # Вернем сессию под наблюдение, чтобы повторить попытку позже
+        idle_tracker.register(topic, user_telegram_id)
+
+
+async def _run_action(bot: Bot, kind: str, topic: TopicKey, user_telegram_id: int) -> None:
+    try:
+        if kind == WARNING:
+            await warn_idle_session(bot, topic, user_telegram_id)
+        else:
+            await close_idle_session(bot, topic, user_telegram_id)
+    except Exception as e:
+        logging.error("Idle %s failed for topic %s: %s", kind, topic, e)
+
+
+async def run_idle_scheduler(bot: Bot) -> None:
+    """Основной цикл планировщика автоматического закрытия."""
+    while True:
+        for kind, topic, user_telegram_id in idle_tracker.process_due():
+            start_background_task(
+                _run_action(bot, kind, topic, user_telegram_id), name=f"idle-{kind}"
+            )
+        await idle_tracker.wait_for_next()
+
+
+def start_idle_scheduler(bot: Bot) -> None:
+    """
+    Загружает активные сессии из БД (однократно) и запускает планировщик.
+
+    Если `IDLE_TIMEOUT_SECONDS` равен 0, автоматическое закрытие отключено,
+    но активность сессий по-прежнему отслеживается.
+    """
+    with next(get_session()) as session:
+        rows = session.exec(
+            select(
+                SupportSession.chat_id, SupportSession.topic_id, SupportSession.user_telegram_id
+            ).where(SupportSession.status == "active")
+        ).all()
+    idle_tracker.load(rows)
+    logging.info("Idle tracker loaded %s active sessions.", len(rows))
+    if idle_tracker.enabled:
+        start_service_task(run_idle_scheduler(bot), name="idle-scheduler")
@@ -0,0 +1,189 @@
+"""
+Сервис связей исходных и пересланных сообщений.
+
+При пересылке сообщения между личным чатом пользователя и темой агента
+запоминается пара (исходное сообщение, копия) в обе стороны. По связи
+хэндлеры находят копию отредактированного сообщения и сообщение, на которое
+нужно ответить в другом чате. ID сообщений личного чата у каждого бота свои,
+поэтому связи хранятся отдельно для каждого бота.
+
+Недавние связи хранятся в ограниченном LRU-кэше, остальные — в таблице
+`MessageLink` с поиском по первичному ключу. Новые связи записываются в БД
+пакетами: раз в `FLUSH_INTERVAL_SECONDS`, при накоплении `FLUSH_BATCH_SIZE`
+связей и при остановке бота; до записи они находятся в кэше. Записи старше
+`MESSAGE_LINK_TTL_DAYS` удаляются периодической очисткой.
+"""
+import datetime
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from aiogram.types import Message
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.models.models import MessageLink
+
+# Как часто удалять устаревшие связи (в секундах)
+CLEANUP_INTERVAL_SECONDS = 3600
+# Как часто записывать новые связи в БД (в секундах)
+FLUSH_INTERVAL_SECONDS = 5
+# Сколько новых связей записывается сразу, не дожидаясь периодической записи
+FLUSH_BATCH_SIZE = 500
+
+# Сообщение в чате: (ID чата, ID сообщения)
+MessageRef = Tuple[int, int]
+# Сообщение в чате с точки зрения бота: (ID бота, ID чата, ID сообщения)
+LinkKey = Tuple[int, int, int]
+
+_link_insert = insert(MessageLink)
+# Повторная пересылка (например, уведомление о правке) заменяет прежнюю связь
+LINK_UPSERT = _link_insert.on_conflict_do_update(
+    index_elements=["bot_id", "chat_id", "message_id"],
+    set_={
+        "peer_chat_id": _link_insert.excluded.peer_chat_id,
+        "peer_message_id": _link_insert.excluded.peer_message_id,
+        "created_at": _link_insert.excluded.created_at,
+    },
+)
+
+
+class MessageLinkCache:
+    """
+    LRU-кэш связей сообщений: сообщение -> его копия в другом чате.
+
+    Связи, еще не записанные в БД, хранятся отдельно от LRU и не вытесняются до записи.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._links: "OrderedDict[LinkKey, MessageRef]" = OrderedDict()
+        self._unsaved: Dict[LinkKey, Tuple[MessageRef, datetime.datetime]] = {}
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    @property
+    def unsaved(self) -> int:
+        """Количество связей, ожидающих записи в БД."""
+        return len(self._unsaved)
+
+    def get(self, key: LinkKey) -> Optional[MessageRef]:
+        peer = self._links.get(key)
+        if peer is not None:
+            self._links.move_to_end(key)
+            return peer
+        unsaved = self._unsaved.get(key)
+        return unsaved[0] if unsaved is not None else None
+
+    def put(self, key: LinkKey, peer: MessageRef) -> None:
+        self._links[key] = peer
+        self._links.move_to_end(key)
+        if len(self._links) > self.maxsize:
+            self._links.popitem(last=False)
+
+    def add_unsaved(self, key: LinkKey, peer: MessageRef, created_at: datetime.datetime) -> None:
+        self.put(key, peer)
+        self._unsaved[key] = (peer, created_at)
+
+    def drain_unsaved(self) -> Dict[LinkKey, Tuple[MessageRef, datetime.datetime]]:
+        """Возвращает связи, ожидающие записи, и очищает их список."""
+        unsaved, self._unsaved = self._unsaved, {}
+        return unsaved
+
+    def clear(self) -> None:
+        self._links.clear()
+        self._unsaved.clear()
+
+
+def link_messages(session: Session, bot_id: int, source: MessageRef, copy: MessageRef) -> None:
+    """
+    Запоминает, что `copy` — пересланная копия сообщения `source`.
+
+    Связь сразу доступна через кэш, а в БД записывается пакетом
+    (см. `flush_message_links`).
+
+    :param session: Сессия базы данных.
+    :param bot_id: ID бота, переславшего сообщение.
+    :param source: Исходное сообщение (ID чата, ID сообщения).
+    :param copy: Копия в другом чате.
+    """
+    now = datetime.datetime.now()
+    message_links.add_unsaved((bot_id, *source), copy, now)
+    message_links.add_unsaved((bot_id, *copy), source, now)
+    if message_links.unsaved >= FLUSH_BATCH_SIZE:
+        flush_message_links(session)
+
+
+def flush_message_links(session: Session) -> int:
+    """
+    Записывает накопленные связи в БД одним пакетным запросом.
+
+    :return: Количество записанных связей.
+    """
+    unsaved = message_links.drain_unsaved()
+    if not unsaved:
+        return 0
+    session.connection().execute(
+        LINK_UPSERT,
+        [
+            dict(
+                bot_id=key[0],
+                chat_id=key[1],
+                message_id=key[2],
+                peer_chat_id=peer[0],
+                peer_message_id=peer[1],
+                created_at=created_at,
+            )
+            for key, (peer, created_at) in unsaved.items()
+        ],
+    )
+    session.commit()
+    return len(unsaved)
+
+
+def find_peer(session: Session, bot_id: int, chat_id: int, message_id: int) -> Optional[MessageRef]:
+    """
+    Возвращает копию сообщения в другом чате (или исходное сообщение для копии).
+
+    :return: (ID чата, ID сообщения) или None, если связь неизвестна или устарела.
+    """
+    key = (bot_id, chat_id, message_id)
+    peer = message_links.get(key)
+    if peer is not None:
+        return peer
+    row = session.exec(
+        select(MessageLink.peer_chat_id, MessageLink.peer_message_id).where(
+            MessageLink.bot_id == bot_id, MessageLink.chat_id == chat_id, MessageLink.message_id == message_id
+        )
+    ).first()
+    if row is None:
+        return None
+    peer = (row[0], row[1])
+    message_links.put(key, peer)
+    return peer
+
+
+def find_reply_target(session: Session, bot_id: int, message: Message) -> Optional[MessageRef]:
+    """
+    Возвращает копию сообщения, на которое отвечает `message`, в другом чате.
+
+    В темах форума каждое сообщение формально отвечает на корневое сообщение
+    темы; такие ответы не учитываются.
+    """
+    reply = message.reply_to_message
+    if reply is None or (message.is_topic_message and reply.message_id == message.message_thread_id):
+        return None
+    return find_peer(session, bot_id, message.chat.id, reply.message_id)
+
+
+def cleanup_message_links(session: Session) -> int:
+    """Удаляет связи старше `MESSAGE_LINK_TTL_DAYS`."""
+    threshold = datetime.datetime.now() - datetime.timedelta(days=settings.MESSAGE_LINK_TTL_DAYS)
+    result = session.exec(delete(MessageLink).where(MessageLink.created_at < threshold))
+    session.commit()
+    return result.rowcount
+
+
+# Единственный экземпляр для всего приложения
+message_links = MessageLinkCache(maxsize=settings.MESSAGE_LINK_CACHE_SIZE)
@@ -0,0 +1,45 @@
+"""
+Сервис выбора супергруппы для новой сессии.
+
+Сессии распределяются между всеми супергруппами поддержки, чтобы
+пропускная способность росла с их количеством: лимиты Telegram на частоту
+сообщений и количество тем действуют для каждого чата отдельно.
+"""
+from typing import Dict
+
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.models.models import SupportSession
+
+
+def count_active_sessions_by_chat(session: Session) -> Dict[int, int]:
+    """Возвращает количество активных сессий в каждой супергруппе."""
+    rows = session.exec(
+        select(SupportSession.chat_id, func.count())
+        .where(SupportSession.status == "active")
+        .group_by(SupportSession.chat_id)
+    ).all()
+    return dict(rows)
+
+
+def choose_supergroup(session: Session, user_telegram_id: int) -> int:
+    """
+    Выбирает супергруппу для новой сессии согласно `SESSION_PLACEMENT`.
+
+    - least_loaded: группа с наименьшим числом активных сессий
+      (при равенстве — первая по порядку в настройках).
+    - hash: группа определяется ID пользователя, поэтому его сессии
+      всегда попадают в одну и ту же группу.
+
+    :param session: Сессия базы данных.
+    :param user_telegram_id: ID пользователя, для которого создается сессия.
+    :return: ID выбранной супергруппы.
+    """
+    chat_ids = settings.supergroup_ids
+    if len(chat_ids) == 1:
+        return chat_ids[0]
+    if settings.SESSION_PLACEMENT == "hash":
+        return chat_ids[user_telegram_id % len(chat_ids)]
+    load = count_active_sessions_by_chat(session)
+    return min(chat_ids, key=lambda chat_id: load.get(chat_id, 0))
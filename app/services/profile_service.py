@@ -0,0 +1,163 @@
+"""
+Сервис профилей агентов (username и имя) для приветствий и названий тем.
+
+Профили запрашиваются у Telegram (`get_chat`) конкурентно и с ограничением
+частоты: при старте и затем в фоне для профилей старше `AGENT_PROFILE_TTL_SECONDS`.
+Результат сохраняется в `SupportAgent` и в кэше в памяти; создание сессии
+берет имя агента только из кэша и никогда не обращается к Telegram.
+"""
+import datetime
+import html
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from aiogram import Bot
+from sqlmodel import Session, or_, select, update
+
+from app.core.config import settings
+from app.db.session import get_session
+from app.models.models import SupportAgent
+
+# Как часто проверять, не устарели ли профили (в секундах)
+PROFILE_CHECK_INTERVAL_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class AgentProfile:
+    """Профиль агента в Telegram."""
+    username: Optional[str]
+    full_name: Optional[str]
+
+
+class AgentProfileCache:
+    """Кэш профилей агентов в памяти."""
+
+    def __init__(self):
+        self._profiles: Dict[int, AgentProfile] = {}
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def get(self, agent_id: int) -> Optional[AgentProfile]:
+        return self._profiles.get(agent_id)
+
+    def put(self, agent_id: int, profile: AgentProfile) -> None:
+        self._profiles[agent_id] = profile
+
+    def mention(self, agent_id: int) -> str:
+        """
+        Имя агента для сообщений: @username, иначе имя, иначе ID.
+
+        Имя экранируется для HTML-разметки сообщений.
+        """
+        profile = self._profiles.get(agent_id)
+        if profile is not None and profile.username:
+            return f"@{profile.username}"
+        if profile is not None and profile.full_name:
+            return html.escape(profile.full_name)
+        return str(agent_id)
+
+    def clear(self) -> None:
+        self._profiles.clear()
+
+
+def load_profiles(session: Session) -> int:
+    """
+    Заполняет кэш сохраненными в БД профилями.
+
+    :return: Количество загруженных профилей.
+    """
+    rows = session.exec(
+        select(SupportAgent.telegram_id, SupportAgent.username, SupportAgent.full_name).where(
+            or_(SupportAgent.username != None, SupportAgent.full_name != None)
+        )
+    ).all()
+    for agent_id, username, full_name in rows:
+        agent_profiles.put(agent_id, AgentProfile(username, full_name))
+    return len(rows)
+
+
+def _stale_agent_ids(session: Session, max_age: float, now: datetime.datetime) -> List[int]:
+    """Активные агенты, профиль которых не запрашивался или устарел."""
+    threshold = now - datetime.timedelta(seconds=max_age)
+    return list(
+        session.exec(
+            select(SupportAgent.telegram_id).where(
+                SupportAgent.is_active == True,
+                or_(SupportAgent.profile_updated_at == None, SupportAgent.profile_updated_at < threshold),
+            )
+        ).all()
+    )
+
+
+async def refresh_profiles(
+    session: Session,
+    bot: Bot,
+    agent_ids: Optional[Iterable[int]] = None,
+    max_age: Optional[float] = None,
+) -> int:
+    """
+    Запрашивает у Telegram профили агентов и сохраняет их в БД и кэше.
+
+    Запросы выполняются конкурентно с ограничением частоты массовых операций.
+    Ошибка для одного агента не прерывает обновление остальных. Время неудачной
+    попытки тоже сохраняется, поэтому профиль запрашивается повторно только
+    после `max_age`, а не при каждой проверке.
+
+    :param session: Сессия базы данных.
+    :param bot: Экземпляр aiogram Bot.
+    :param agent_ids: ID агентов; по умолчанию — все активные агенты с устаревшим профилем.
+    :param max_age: Возраст профиля, после которого он устаревает (по умолчанию из настроек).
+    :return: Количество обновленных профилей.
+    """
+    now = datetime.datetime.now()
+    if agent_ids is None:
+        max_age = settings.AGENT_PROFILE_TTL_SECONDS if max_age is None else max_age
+        agent_ids = _stale_agent_ids(session, max_age, now)
+    agent_ids = list(agent_ids)
+    if not agent_ids:
+        return 0
+
+    # Импорт внутри функции: bulk_service сам обращается к кэшу профилей
+    from app.services.bulk_service import fan_out
+
+    resolved: Dict[int, AgentProfile] = {}
+    failed: List[int] = []
+
+    async def resolve(agent_id: int) -> None:
+        try:
+            chat = await bot.get_chat(agent_id)
+        except Exception as e:
+            # Обычно агент еще не писал боту; это не ошибка приложения
+            logging.warning("Could not fetch profile of agent %s: %s", agent_id, e)
+            failed.append(agent_id)
+            return
+        full_name = " ".join(part for part in (chat.first_name, chat.last_name) if part) or None
+        resolved[agent_id] = AgentProfile(chat.username, full_name)
+
+    await fan_out(agent_ids, resolve)
+    for agent_id, profile in resolved.items():
+        session.exec(
+            update(SupportAgent)
+            .where(SupportAgent.telegram_id == agent_id)
+            .values(username=profile.username, full_name=profile.full_name, profile_updated_at=now)
+        )
+        agent_profiles.put(agent_id, profile)
+    if failed:
+        session.exec(
+            update(SupportAgent).where(SupportAgent.telegram_id.in_(failed)).values(profile_updated_at=now)
+        )
+    session.commit()
+    logging.info("Agent profiles refreshed: %s of %s resolved.", len(resolved), len(agent_ids))
+    return len(resolved)
+
+
+async def refresh_stale_profiles(bot: Bot) -> int:
+    """Обновляет устаревшие профили в собственной сессии БД; для фоновых задач."""
+    with next(get_session()) as session:
+        return await refresh_profiles(session, bot)
+
+
+# Единственный экземпляр для всего приложения
+agent_profiles = AgentProfileCache()
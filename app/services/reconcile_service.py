@@ -0,0 +1,213 @@
+"""
+Сервис сверки состояния сессий, тем и доступности агентов.
+
+После аварийного перезапуска в БД могут остаться агенты с `is_available=False`
+без активных сессий, а также "активные" сессии, темы которых уже удалены.
+Сверка находит и исправляет такие расхождения.
+
+Полная проверка тем отправляет запрос в каждую тему и видна агентам, поэтому
+выполняется только при старте и по команде /reconcile. Периодическая сверка
+закрывает лишь сессии тем, которые Bot API уже назвал несуществующими
+(см. `app.core.missing_topics`).
+"""
+import datetime
+import logging
+from dataclasses import dataclass, field
+from typing import Collection, List
+
+from aiogram import Bot
+from sqlalchemy import tuple_
+from sqlmodel import Session, col, exists, select, update
+
+from app.core.bots import get_bot
+from app.core.missing_topics import TopicKey, is_missing_topic_error, missing_topics
+from app.models.models import SupportAgent, SupportSession
+from app.services import bulk_service, session_service, stats_service
+from app.services.affinity_service import LastSession, last_sessions
+from app.services.idle_service import idle_tracker
+from app.services.routing_service import agent_index
+
+SESSION_LOST_TEXT = (
+    "ℹ️ Ваша сессия поддержки была завершена. "
+    "Если вопрос остался, просто напишите нам снова."
+)
+
+
+@dataclass
+class ReconcileReport:
+    """
+    Итог сверки.
+    """
+    agents_fixed: int = 0
+    sessions_checked: int = 0
+    orphaned_session_ids: List[int] = field(default_factory=list)
+    topic_check_errors: int = 0
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.agents_fixed or self.orphaned_session_ids)
+
+    def summary(self) -> str:
+        return (
+            f"агентов исправлено: {self.agents_fixed}, "
+            f"сессий проверено: {self.sessions_checked}, "
+            f"закрыто сессий без темы: {len(self.orphaned_session_ids)}, "
+            f"ошибок проверки: {self.topic_check_errors}"
+        )
+
+
+def recompute_agent_availability(session: Session) -> int:
+    """
+    Пересчитывает `is_available` всех агентов по наличию активных сессий.
+
+    Выполняется одним UPDATE: агент свободен тогда и только тогда, когда у него
+    нет активной сессии. Агенты, занятые незавершенным `create_new_session`,
+    не затрагиваются.
+
+    :param session: Сессия базы данных.
+    :return: Количество исправленных агентов.
+    """
+    has_active_session = exists().where(
+        SupportSession.agent_telegram_id == SupportAgent.telegram_id,
+        SupportSession.status == "active",
+    )
+    statement = (
+        update(SupportAgent)
+        .where(SupportAgent.is_available == has_active_session)
+        .values(is_available=~has_active_session)
+    )
+    if session_service.pending_agent_claims:
+        statement = statement.where(
+            col(SupportAgent.telegram_id).not_in(list(session_service.pending_agent_claims))
+        )
+    result = session.exec(statement)
+    session.commit()
+    if result.rowcount:
+        agent_index.invalidate()
+    return result.rowcount
+
+
+def _active_sessions():
+    return select(
+        SupportSession.id,
+        SupportSession.user_telegram_id,
+        SupportSession.agent_telegram_id,
+        SupportSession.chat_id,
+        SupportSession.topic_id,
+        SupportSession.bot_id,
+        SupportSession.created_at,
+    ).where(SupportSession.status == "active")
+
+
+async def find_orphaned_sessions(session: Session, bot: Bot, report: ReconcileReport) -> list:
+    """
+    Находит активные сессии, темы которых больше не существуют.
+
+    Существование темы проверяется конкурентно и с ограничением частоты
+    через `send_chat_action` в тему: для удаленной темы Bot API возвращает ошибку.
+    """
+    rows = session.exec(_active_sessions()).all()
+    report.sessions_checked = len(rows)
+    orphaned = []
+
+    async def check_topic(row) -> None:
+        try:
+            await bot.send_chat_action(
+                chat_id=row.chat_id,
+                action="typing",
+                message_thread_id=row.topic_id,
+            )
+        except Exception as e:
+            if not is_missing_topic_error(e):
+                raise
+            orphaned.append(row)
+
+    outcomes = await bulk_service.fan_out(rows, check_topic)
+    report.topic_check_errors = outcomes.count(False)
+    return orphaned
+
+
+def find_sessions_in_topics(session: Session, topics: Collection[TopicKey]) -> list:
+    """Находит активные сессии заданных тем без запросов к Bot API."""
+    rows = []
+    for chunk in bulk_service.chunked(sorted(topics)):
+        rows.extend(
+            session.exec(
+                _active_sessions().where(tuple_(SupportSession.chat_id, SupportSession.topic_id).in_(chunk))
+            ).all()
+        )
+    return rows
+
+
+def close_orphaned_sessions(session: Session, orphaned: list) -> list:
+    """
+    Пакетно закрывает сессии, темы которых не существуют.
+
+    Пока темы проверялись, часть сессий могла быть закрыта другим путем
+    (/close_chat, автозакрытие, массовое закрытие); они не учитываются повторно.
+
+    :return: Строки сессий, закрытых этим вызовом.
+    """
+    now = datetime.datetime.now()
+    closed_ids = set()
+    for chunk in bulk_service.chunked([row.id for row in orphaned]):
+        closed_ids.update(
+            session.exec(
+                update(SupportSession)
+                .where(col(SupportSession.id).in_(chunk), SupportSession.status == "active")
+                .values(status="closed", closed_at=now)
+                .returning(SupportSession.id)
+            ).scalars()
+        )
+    closed_rows = [row for row in orphaned if row.id in closed_ids]
+    stats_service.record_sessions_closed(
+        session, ((row.agent_telegram_id, row.created_at) for row in closed_rows), now
+    )
+    session.commit()
+    for row in closed_rows:
+        idle_tracker.forget((row.chat_id, row.topic_id))
+        last_sessions.remember(
+            row.user_telegram_id,
+            LastSession(row.agent_telegram_id, row.chat_id, row.topic_id, now),
+        )
+    return closed_rows
+
+
+async def reconcile(session: Session, bot: Bot, check_topics: bool = True) -> ReconcileReport:
+    """
+    Выполняет сверку состояния.
+
+    1. Проверяет существование тем всех активных сессий (если `check_topics`),
+       иначе берет только темы, которые Bot API назвал несуществующими.
+    2. Пакетно закрывает сессии без темы и уведомляет их пользователей.
+    3. Пересчитывает доступность агентов одним UPDATE.
+
+    :param session: Сессия базы данных.
+    :param bot: Экземпляр aiogram Bot.
+    :param check_topics: Проверять ли существование всех тем через Bot API.
+    :return: Отчет о найденных и исправленных расхождениях.
+    """
+    logging.info("Starting state reconciliation...")
+    report = ReconcileReport()
+
+    # Полная проверка охватывает и уже известные удаленные темы
+    reported_topics = missing_topics.drain()
+    if check_topics:
+        orphaned = await find_orphaned_sessions(session, bot, report)
+    else:
+        orphaned = find_sessions_in_topics(session, reported_topics)
+        report.sessions_checked = len(orphaned)
+    if orphaned:
+        orphaned = close_orphaned_sessions(session, orphaned)
+        report.orphaned_session_ids = [row.id for row in orphaned]
+
+        async def notify_user(row) -> None:
+            await get_bot(row.bot_id, bot).send_message(
+                chat_id=row.user_telegram_id, text=SESSION_LOST_TEXT
+            )
+
+        await bulk_service.fan_out(orphaned, notify_user)
+
+    report.agents_fixed = recompute_agent_availability(session)
+    logging.info("Reconciliation finished: %s", report.summary())
+    return report
@@ -0,0 +1,159 @@
+"""
+Сервис маршрутизации новых сессий по навыкам агентов.
+
+У агента есть набор навыков: языки (`ru`, `en`) и темы обращений
+(`billing`, `tech`). Маршрут сессии — навыки, которые нужны пользователю,
+в порядке важности: язык из `language_code` и тема из стартового меню.
+
+Свободные агенты хранятся в памяти в корзинах: для каждого набора
+из не более чем `MAX_ROUTE_TAGS` навыков агента — своя корзина. Поэтому
+выбор агента — O(1) обращение к корзине, а не фильтрация всех агентов.
+Если подходящая корзина пуста, маршрут ослабляется (см. `fallback_keys`).
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+# Максимальное количество навыков в маршруте (язык и тема)
+MAX_ROUTE_TAGS = 2
+
+SkillKey = FrozenSet[str]
+
+
+def parse_skills(raw: Optional[str]) -> FrozenSet[str]:
+    """Преобразует строку навыков через запятую в множество тегов."""
+    if not raw:
+        return frozenset()
+    return frozenset(tag.strip().lower() for tag in raw.split(",") if tag.strip())
+
+
+def format_skills(skills: Iterable[str]) -> str:
+    """Преобразует навыки в строку для хранения в БД."""
+    return ",".join(sorted({tag.strip().lower() for tag in skills if tag.strip()}))
+
+
+def normalize_language(language_code: Optional[str]) -> Optional[str]:
+    """Возвращает основной язык из IETF-тега Telegram (`pt-br` -> `pt`)."""
+    if not language_code:
+        return None
+    return language_code.split("-")[0].lower()
+
+
+def build_route(language_code: Optional[str] = None, topic: Optional[str] = None) -> Tuple[str, ...]:
+    """
+    Составляет маршрут сессии: язык пользователя и выбранная тема.
+
+    Язык важнее темы: оператор, говорящий на языке пользователя,
+    полезнее специалиста по теме, с которым нельзя объясниться.
+    """
+    language = normalize_language(language_code)
+    return tuple(tag for tag in (language, topic and topic.lower()) if tag)
+
+
+@lru_cache(maxsize=1024)
+def fallback_keys(route: Tuple[str, ...], fallback_to_any: bool = True) -> Tuple[SkillKey, ...]:
+    """
+    Возвращает корзины, проверяемые для маршрута, в порядке предпочтения.
+
+    Сначала все навыки маршрута вместе, затем каждый навык по отдельности
+    в порядке важности, и наконец (если разрешено) любой свободный агент.
+    """
+    route = route[:MAX_ROUTE_TAGS]
+    keys = [frozenset(route)]
+    if len(route) > 1:
+        keys.extend(frozenset((tag,)) for tag in route)
+    if fallback_to_any and route:
+        keys.append(frozenset())
+    return tuple(keys)
+
+
+def _skill_keys(skills: FrozenSet[str]) -> Tuple[SkillKey, ...]:
+    """Все наборы из не более чем `MAX_ROUTE_TAGS` навыков, включая пустой."""
+    ordered = sorted(skills)
+    return tuple(
+        frozenset(subset)
+        for size in range(min(MAX_ROUTE_TAGS, len(ordered)) + 1)
+        for subset in combinations(ordered, size)
+    )
+
+
+class AgentIndex:
+    """
+    Индекс свободных агентов по навыкам.
+
+    Внутри корзины агенты упорядочены по времени освобождения, поэтому
+    первым получает сессию агент, дольше всех ожидающий работы.
+    Индекс — кэш поля `SupportAgent.is_available`: занимает агента
+    всегда условный UPDATE в БД, а устаревшие записи просто пропускаются.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[SkillKey, "OrderedDict[int, None]"] = {}
+        self._skills: Dict[int, FrozenSet[str]] = {}
+        # Корзины для каждого набора навыков вычисляются один раз
+        self._keys: Dict[FrozenSet[str], Tuple[SkillKey, ...]] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._skills)
+
+    def __contains__(self, agent_id: int) -> bool:
+        return agent_id in self._skills
+
+    def add(self, agent_id: int, skills: FrozenSet[str]) -> None:
+        """Добавляет свободного агента в конец его корзин."""
+        if agent_id in self._skills:
+            self.discard(agent_id)
+        self._skills[agent_id] = skills
+        keys = self._keys.get(skills)
+        if keys is None:
+            keys = self._keys[skills] = _skill_keys(skills)
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = OrderedDict()
+            bucket[agent_id] = None
+
+    def discard(self, agent_id: int) -> None:
+        """Убирает агента из индекса, если он там есть."""
+        skills = self._skills.pop(agent_id, None)
+        if skills is None:
+            return
+        for key in self._keys[skills]:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            bucket.pop(agent_id, None)
+            if not bucket:
+                del self._buckets[key]
+
+    def candidate(self, route: Tuple[str, ...], fallback_to_any: bool = True) -> Optional[int]:
+        """
+        Возвращает ID наиболее подходящего свободного агента, не убирая его из индекса.
+
+        :param route: Требуемые навыки в порядке важности.
+        :param fallback_to_any: Можно ли выбрать агента без нужных навыков.
+        """
+        for key in fallback_keys(route, fallback_to_any):
+            bucket = self._buckets.get(key)
+            if bucket:
+                return next(iter(bucket))
+        return None
+
+    def load(self, agents: Iterable[Tuple[int, Optional[str]]]) -> None:
+        """Заполняет индекс заново парами (ID агента, навыки)."""
+        self.invalidate()
+        for agent_id, skills in agents:
+            self.add(agent_id, parse_skills(skills))
+        self.loaded = True
+
+    def invalidate(self) -> None:
+        """Помечает индекс устаревшим: он будет перестроен из БД при следующем выборе."""
+        self._buckets.clear()
+        self._skills.clear()
+        self._keys.clear()
+        self.loaded = False
+
+
+agent_index = AgentIndex()
@@ -1,26 +1,93 @@
 """
 Сервис для управления жизненным циклом сессий поддержки.
 """
+import asyncio
 import datetime
 import logging
-from typing import Optional
+from typing import Optional, Sequence, Set, Tuple
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
 from sqlmodel import Session, select
 
+from app.core.circuit_breaker import CircuitOpenError, circuit_breakers
 from app.core.config import settings
 from app.models.models import SupportAgent, SupportSession
-from app.services import agent_service
+from app.services import agent_service, placement_service, stats_service
+from app.services.affinity_service import LastSession, last_sessions, preferred_agent, wait_for_agent
+from app.services.idle_service import idle_tracker
+from app.services.profile_service import agent_profiles
+
+# ID агентов, уже занятых `create_new_session`, сессия которых еще не сохранена в БД.
+# Сверка состояния (reconcile_service) не должна освобождать таких агентов.
+pending_agent_claims: Set[int] = set()
+
+# Ответ Bot API на попытку открыть уже открытую (или закрыть закрытую) тему
+TOPIC_NOT_MODIFIED = "TOPIC_NOT_MODIFIED"
+
+
+def find_reusable_topic(session: Session, user_telegram_id: int) -> Optional[Tuple[int, int]]:
+    """
+    Возвращает тему последней закрытой сессии пользователя для повторного открытия.
+
+    Тема берется из кэша последних сессий (при промахе — запрос по индексу
+    `user_telegram_id`). Темы супергрупп, исключенных из настроек, не используются.
+
+    :return: Ключ темы (ID супергруппы, ID темы) или None.
+    """
+    last = last_sessions.get(session, user_telegram_id)
+    if last is None or last.chat_id not in settings.supergroup_ids:
+        return None
+    return last.chat_id, last.topic_id
+
+
+async def reopen_topic(bot: Bot, chat_id: int, topic_id: int) -> bool:
+    """
+    Открывает ранее закрытую тему.
+
+    :return: False, если тему открыть нельзя (например, ее удалили вручную).
+    """
+    try:
+        await bot.reopen_forum_topic(chat_id=chat_id, message_thread_id=topic_id)
+    except TelegramBadRequest as e:
+        if TOPIC_NOT_MODIFIED in e.message:
+            return True
+        logging.info("Cannot reopen topic %s in chat %s: %s", topic_id, chat_id, e.message)
+        return False
+    return True
+
+
+async def retire_topic(bot: Bot, chat_id: int, topic_id: int) -> None:
+    """
+    Убирает тему завершенной сессии.
+
+    При `TOPIC_REUSE` тема закрывается и сохраняет историю для следующего
+    обращения пользователя, иначе удаляется вместе с перепиской.
+    """
+    if not settings.TOPIC_REUSE:
+        await bot.delete_forum_topic(chat_id=chat_id, message_thread_id=topic_id)
+        return
+    try:
+        await bot.close_forum_topic(chat_id=chat_id, message_thread_id=topic_id)
+    except TelegramBadRequest as e:
+        if TOPIC_NOT_MODIFIED not in e.message:
+            raise
 
 
 async def create_new_session(
-    session: Session, bot: Bot, user_telegram_id: int, user_username: Optional[str]
+    session: Session,
+    bot: Bot,
+    user_telegram_id: int,
+    user_username: Optional[str],
+    route: Sequence[str] = (),
 ) -> Optional[SupportSession]:
     """
     Создает новую сессию поддержки.
 
-    1. Находит свободного агента.
-    2. Создает новую тему в супергруппе.
+    1. Находит свободного агента: прежнего агента вернувшегося пользователя
+       или агента с подходящими навыками.
+    2. Открывает заново тему предыдущей сессии пользователя (при `TOPIC_REUSE`)
+       или выбирает супергруппу и создает в ней новую тему.
     3. Отправляет стартовое сообщение в тему.
     4. Сохраняет сессию в БД.
 
@@ -28,35 +95,63 @@ async def create_new_session(
     :param bot: Экземпляр aiogram Bot.
     :param user_telegram_id: ID пользователя, инициировавшего сессию.
     :param user_username: Username пользователя.
+    :param route: Требуемые навыки агента в порядке важности (язык, тема обращения).
     :return: Созданный объект сессии или None, если не найден свободный агент или произошла ошибка.
+    :raises CircuitOpenError: Если Telegram недоступен (выключатель нужного метода разомкнут).
     """
-    logging.info(f"Attempting to create a new session for user {user_telegram_id}")
+    logging.info("Attempting to create a new session for user %s", user_telegram_id)
+    # Пока Telegram недоступен, агент не занимается: создание темы все равно не удастся
+    circuit_breakers.ensure_closed("createForumTopic", "sendMessage")
 
     # 1. Атомарно находим и блокируем свободного агента
-    available_agent = agent_service.find_available_agent(session)
+    preferred = preferred_agent(last_sessions.get(session, user_telegram_id))
+    if (
+        preferred is not None
+        and settings.AFFINITY_WAIT_SECONDS > 0
+        and not agent_service.is_agent_free(session, preferred)
+    ):
+        # Прежний агент занят — даем ему время освободиться, прежде чем назначить другого
+        await wait_for_agent(preferred, settings.AFFINITY_WAIT_SECONDS)
+    available_agent = agent_service.find_available_agent(session, route, preferred)
     if not available_agent:
-        logging.warning(f"No available agents for new session request from user {user_telegram_id}")
+        logging.warning("No available agents for new session request from user %s", user_telegram_id)
+        stats_service.record_rejection(session)
+        session.commit()
         return None
 
+    pending_agent_claims.add(available_agent.telegram_id)
+    topic_id = None
+    reused = False
+    previous_topic = find_reusable_topic(session, user_telegram_id) if settings.TOPIC_REUSE else None
+    chat_id = previous_topic[0] if previous_topic else None
     try:
-        # 2. Создаем новую тему в супергруппе
-        topic_name = f"Сессия с @{user_username or user_telegram_id}"
-        topic = await bot.create_forum_topic(
-            chat_id=settings.SUPERGROUP_ID,
-            name=topic_name
-        )
-        logging.info(f"Created new topic {topic.message_thread_id} for user {user_telegram_id}")
+        # 2. Повторное обращение продолжается в прежней теме: история переписки сохраняется,
+        # а вместо создания и удаления темы выполняются более дешевые открытие и закрытие
+        if previous_topic and await reopen_topic(bot, *previous_topic):
+            topic_id = previous_topic[1]
+            reused = True
+            logging.info("Reopened topic %s for returning user %s", topic_id, user_telegram_id)
+        else:
+            chat_id = placement_service.choose_supergroup(session, user_telegram_id)
+            topic_name = f"Сессия с @{user_username or user_telegram_id}"
+            topic = await bot.create_forum_topic(
+                chat_id=chat_id,
+                name=topic_name
+            )
+            topic_id = topic.message_thread_id
+            logging.info("Created new topic %s for user %s", topic_id, user_telegram_id)
 
         # 3. Отправляем системное сообщение в тему
         start_message = (
-            f"✅ Новая сессия поддержки.\n\n"
+            f"{'🔁 Повторное обращение' if reused else '✅ Новая сессия поддержки'}.\n\n"
             f"👤 **Пользователь:** <a href='tg://user?id={user_telegram_id}'>{user_username or user_telegram_id}</a>\n"
-            f"🆔 **User ID:** `{user_telegram_id}`\n\n"
-            f"🧑‍💻 **Назначенный агент:** @{available_agent.username or available_agent.telegram_id}"
+            f"🆔 **User ID:** `{user_telegram_id}`\n"
+            f"🏷 **Запрос:** {', '.join(route) or '—'}\n\n"
+            f"🧑‍💻 **Назначенный агент:** {agent_profiles.mention(available_agent.telegram_id)}"
         )
         await bot.send_message(
-            chat_id=settings.SUPERGROUP_ID,
-            message_thread_id=topic.message_thread_id,
+            chat_id=chat_id,
+            message_thread_id=topic_id,
             text=start_message
         )
 
@@ -64,18 +159,24 @@ async def create_new_session(
         new_session = SupportSession(
             user_telegram_id=user_telegram_id,
             agent_telegram_id=available_agent.telegram_id,
-            topic_id=topic.message_thread_id,
+            chat_id=chat_id,
+            topic_id=topic_id,
+            bot_id=bot.id,
             status="active",
         )
         session.add(new_session)
+        stats_service.record_session_created(session, available_agent.telegram_id)
         session.commit()
         session.refresh(new_session)
-        logging.info(f"New session {new_session.id} created and saved to DB.")
+        logging.info("New session %s created and saved to DB.", new_session.id)
+        idle_tracker.register(new_session.topic_key, user_telegram_id)
 
         return new_session
 
-    except Exception as e:
-        logging.error(f"Failed to create topic or session for user {user_telegram_id}: {e}")
+    except (Exception, asyncio.CancelledError) as e:
+        # CancelledError обрабатывается здесь же: при остановке бота незавершенные
+        # хэндлеры отменяются, и агент не должен остаться заблокированным.
+        logging.error("Failed to create topic or session for user %s: %r", user_telegram_id, e)
         # Если произошла ошибка (например, с API Telegram),
         # откатываем транзакцию, чтобы освободить агента.
         session.rollback()
@@ -85,51 +186,79 @@ async def create_new_session(
             agent_to_release.is_available = True
             session.add(agent_to_release)
             session.commit()
-            logging.info(f"Agent {agent_to_release.telegram_id} was released due to an error.")
+            agent_service.return_agent_to_index(agent_to_release)
+            logging.info("Agent %s was released due to an error.", agent_to_release.telegram_id)
+        # Тема уже создана, но сессия не сохранена — удаляем тему, чтобы она не осталась "сиротой".
+        # Открытая заново тема хранит историю прежних сессий, поэтому ее только закрываем.
+        if topic_id is not None:
+            try:
+                if reused:
+                    await retire_topic(bot, chat_id, topic_id)
+                else:
+                    await bot.delete_forum_topic(chat_id=chat_id, message_thread_id=topic_id)
+            except Exception as delete_error:
+                logging.error("Failed to remove orphaned topic %s: %s", topic_id, delete_error)
+        if isinstance(e, (asyncio.CancelledError, CircuitOpenError)):
+            raise
         return None
 
+    finally:
+        pending_agent_claims.discard(available_agent.telegram_id)
+
 
 async def close_session(session: Session, bot: Bot, active_session: SupportSession) -> bool:
     """
     Закрывает активную сессию поддержки.
 
-    1. Удаляет тему из супергруппы.
+    1. Удаляет тему из супергруппы (или закрывает ее при `TOPIC_REUSE`).
     2. Обновляет статус сессии в БД на 'closed'.
-    3. Освобождает агента, делая его доступным.
+    3. Освобождает агента, если у него не осталось других активных сессий.
 
     :param session: Сессия базы данных.
     :param bot: Экземпляр aiogram Bot.
     :param active_session: Объект сессии, которую нужно закрыть.
     :return: True, если сессия успешно закрыта, иначе False.
     """
-    logging.info(f"Attempting to close session {active_session.id} (topic {active_session.topic_id})")
+    logging.info("Attempting to close session %s (topic %s)", active_session.id, active_session.topic_id)
     try:
-        # 1. Удаляем тему из Telegram
-        await bot.delete_forum_topic(
-            chat_id=settings.SUPERGROUP_ID,
-            message_thread_id=active_session.topic_id
-        )
-        logging.info(f"Topic {active_session.topic_id} deleted successfully.")
+        # 1. Удаляем или закрываем тему в Telegram
+        await retire_topic(bot, active_session.chat_id, active_session.topic_id)
+        logging.info("Topic %s retired successfully.", active_session.topic_id)
 
         # 2. Обновляем статус сессии в БД
         active_session.status = "closed"
         active_session.closed_at = datetime.datetime.now()
         session.add(active_session)
+        stats_service.record_session_closed(session, active_session)
 
-        # 3. Освобождаем агента
+        # 3. Освобождаем агента; после /reassign у него могут остаться другие сессии
         agent = session.get(SupportAgent, active_session.agent_telegram_id)
+        released = False
         if agent:
-            agent.is_available = True
-            session.add(agent)
-            logging.info(f"Agent {agent.telegram_id} is now available.")
+            released = agent_service.release_agent(session, agent)
+            if released:
+                logging.info("Agent %s is now available.", agent.telegram_id)
+            else:
+                logging.info("Agent %s still has active sessions.", agent.telegram_id)
         else:
-            logging.warning(f"Could not find agent {active_session.agent_telegram_id} to make available.")
+            logging.warning("Could not find agent %s to make available.", active_session.agent_telegram_id)
+
+        last = LastSession(
+            active_session.agent_telegram_id,
+            active_session.chat_id,
+            active_session.topic_id,
+            active_session.closed_at,
+        )
 
         session.commit()
-        logging.info(f"Session {active_session.id} has been closed and saved to DB.")
+        last_sessions.remember(active_session.user_telegram_id, last)
+        if released:
+            agent_service.return_agent_to_index(agent)
+        logging.info("Session %s has been closed and saved to DB.", active_session.id)
+        idle_tracker.forget(active_session.topic_key)
         return True
 
     except Exception as e:
-        logging.error(f"Failed to close session {active_session.id}: {e}")
+        logging.error("Failed to close session %s: %s", active_session.id, e)
         session.rollback()
         return False
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Сервис инкрементальной SLA-статистики.
+
+Счетчики обновляются в момент событий (создание, отказ, первый ответ, закрытие)
+в той же транзакции, что и сами изменения сессий, поэтому чтение статистики
+не требует сканирования таблицы `SupportSession`.
+
+Функции записи не вызывают `commit` — это делает вызывающий код.
+"""
+import datetime
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from app.models.models import AgentStats, StatsBucket, SupportSession
+
+# Начало периода для строки с накопленными за все время значениями
+TOTAL_BUCKET_START = datetime.datetime(1970, 1, 1)
+
+
+def _bucket_starts(moment: datetime.datetime) -> List[Tuple[str, datetime.datetime]]:
+    """Возвращает ключи всех периодов, в которые попадает момент времени."""
+    hour = moment.replace(minute=0, second=0, microsecond=0)
+    return [
+        ("hour", hour),
+        ("day", hour.replace(hour=0)),
+        ("total", TOTAL_BUCKET_START),
+    ]
+
+
+def _increment_buckets(session: Session, moment: datetime.datetime, **deltas) -> None:
+    """Атомарно увеличивает счетчики часа, дня и общего итога одним UPSERT."""
+    table = StatsBucket.__table__
+    statement = insert(table).values(
+        [
+            {"period": period, "bucket_start": start, **deltas}
+            for period, start in _bucket_starts(moment)
+        ]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.period, table.c.bucket_start],
+        set_={name: table.c[name] + statement.excluded[name] for name in deltas},
+    )
+    session.exec(statement)
+
+
+def _increment_agents(session: Session, deltas_by_agent: Dict[int, Dict[str, float]]) -> None:
+    """Атомарно увеличивает счетчики агентов одним UPSERT."""
+    if not deltas_by_agent:
+        return
+    table = AgentStats.__table__
+    names = sorted({name for deltas in deltas_by_agent.values() for name in deltas})
+    statement = insert(table).values(
+        [
+            {"agent_telegram_id": agent_id, **{name: deltas.get(name, 0) for name in names}}
+            for agent_id, deltas in deltas_by_agent.items()
+        ]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.agent_telegram_id],
+        set_={name: table.c[name] + statement.excluded[name] for name in names},
+    )
+    session.exec(statement)
+
+
+def record_session_created(
+    session: Session, agent_telegram_id: int, moment: Optional[datetime.datetime] = None
+) -> None:
+    """Учитывает создание новой сессии."""
+    _increment_buckets(session, moment or datetime.datetime.now(), sessions_created=1)
+    _increment_agents(session, {agent_telegram_id: {"sessions_assigned": 1}})
+
+
+def record_rejection(session: Session, moment: Optional[datetime.datetime] = None) -> None:
+    """Учитывает отказ в создании сессии из-за отсутствия свободных агентов."""
+    _increment_buckets(session, moment or datetime.datetime.now(), sessions_rejected=1)
+
+
+def record_first_response(
+    session: Session, active_session: SupportSession, moment: Optional[datetime.datetime] = None
+) -> None:
+    """
+    Фиксирует первый ответ агента в сессии.
+
+    Повторные вызовы для той же сессии ничего не меняют.
+    """
+    if active_session.first_response_at is not None:
+        return
+    moment = moment or datetime.datetime.now()
+    active_session.first_response_at = moment
+    session.add(active_session)
+    seconds = max(0.0, (moment - active_session.created_at).total_seconds())
+    _increment_buckets(
+        session, moment, first_responses=1, first_response_seconds_total=seconds
+    )
+    _increment_agents(
+        session,
+        {
+            active_session.agent_telegram_id: {
+                "first_responses": 1,
+                "first_response_seconds_total": seconds,
+            }
+        },
+    )
+
+
+def record_sessions_closed(
+    session: Session,
+    closed: Iterable[Tuple[int, datetime.datetime]],
+    closed_at: datetime.datetime,
+) -> None:
+    """
+    Учитывает закрытие пакета сессий.
+
+    :param session: Сессия базы данных.
+    :param closed: Пары (ID агента, время создания сессии).
+    :param closed_at: Время закрытия.
+    """
+    count = 0
+    duration_total = 0.0
+    deltas_by_agent: Dict[int, Dict[str, float]] = {}
+    for agent_telegram_id, created_at in closed:
+        duration = max(0.0, (closed_at - created_at).total_seconds())
+        count += 1
+        duration_total += duration
+        deltas = deltas_by_agent.setdefault(
+            agent_telegram_id, {"sessions_closed": 0, "duration_seconds_total": 0.0}
+        )
+        deltas["sessions_closed"] += 1
+        deltas["duration_seconds_total"] += duration
+    if not count:
+        return
+    _increment_buckets(
+        session, closed_at, sessions_closed=count, duration_seconds_total=duration_total
+    )
+    _increment_agents(session, deltas_by_agent)
+
+
+def record_session_closed(session: Session, closed_session: SupportSession) -> None:
+    """Учитывает закрытие одной сессии."""
+    record_sessions_closed(
+        session,
+        [(closed_session.agent_telegram_id, closed_session.created_at)],
+        closed_session.closed_at or datetime.datetime.now(),
+    )
+
+
+@dataclass
+class StatsSnapshot:
+    """
+    Снимок статистики для отображения.
+    """
+    total: Optional[StatsBucket]
+    today: Optional[StatsBucket]
+    current_hour: Optional[StatsBucket]
+    agents: List[AgentStats]
+
+
+def get_stats_snapshot(
+    session: Session, moment: Optional[datetime.datetime] = None
+) -> StatsSnapshot:
+    """
+    Читает текущие агрегаты по первичным ключам, без сканирования сессий.
+    """
+    buckets = {
+        period: session.get(StatsBucket, (period, start))
+        for period, start in _bucket_starts(moment or datetime.datetime.now())
+    }
+    agents = session.exec(select(AgentStats).order_by(AgentStats.agent_telegram_id)).all()
+    return StatsSnapshot(
+        total=buckets["total"],
+        today=buckets["day"],
+        current_hour=buckets["hour"],
+        agents=list(agents),
+    )
@@ -0,0 +1,84 @@
+"""
+Бенчмарк догоняющей обработки накопившихся обновлений.
+
+Эмулирует 10 000 обновлений от 500 пользователей, обработка каждого из которых
+занимает ~5 мс ввода-вывода (как вызов Bot API), и измеряет время разбора
+очереди при разном параллелизме.
+
+Запуск (нужны переменные окружения из .env):
+    python -m benchmarks.bench_backlog [--updates 10000] [--users 500] [--latency-ms 5]
+"""
+import argparse
+import asyncio
+import datetime
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Chat, Message, Update, User
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.services.backlog_service import drain_backlog
+
+
+class FakeBot(Bot):
+    """Бот, отдающий заранее сгенерированные обновления как Bot API."""
+
+    def __init__(self, updates):
+        super().__init__(token="42:BENCHMARK")
+        self._updates = updates
+
+    async def get_updates(self, offset=None, limit=100, timeout=0, allowed_updates=None, **kwargs):
+        start = 0 if offset is None else offset - self._updates[0].update_id
+        return self._updates[start:start + limit]
+
+
+def make_updates(count: int, users: int):
+    now = datetime.datetime.now()
+    return [
+        Update(
+            update_id=i,
+            message=Message(
+                message_id=i,
+                chat=Chat(id=i % users, type="private"),
+                from_user=User(id=i % users, is_bot=False, first_name="User"),
+                text=str(i),
+                date=now,
+            ),
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+async def run(count: int, users: int, latency: float, concurrency: int) -> None:
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        await asyncio.sleep(latency)
+
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    bot = FakeBot(make_updates(count, users))
+
+    with Session(engine) as session:
+        report = await drain_backlog(dispatcher, bot, session, concurrency=concurrency)
+    print(f"concurrency={concurrency:>3}: {report.summary()}")
+    engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"Draining {args.updates} updates from {args.users} users, {args.latency_ms} ms per update")
+    for concurrency in (1, 10, 20, 50):
+        asyncio.run(run(args.updates, args.users, args.latency_ms / 1000, concurrency))
+
+
+if __name__ == "__main__":
+    main()
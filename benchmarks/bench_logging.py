@@ -0,0 +1,103 @@
+"""
+Бенчмарк накладных расходов логирования на одно пересылаемое сообщение.
+
+Сравнивает время, которое вызывающий код (event loop) тратит на логи
+при пересылке сообщения:
+- прежняя схема: f-строки и синхронная запись в поток из event loop;
+- новая схема: ленивое форматирование, очередь, фоновый поток и прореживание.
+
+Медленный stdout (pipe в сборщик логов, терминал) эмулируется задержкой записи.
+
+Запуск (нужны переменные окружения из .env):
+    python -m benchmarks.bench_logging [--messages 20000] [--write-latency-us 20]
+"""
+import argparse
+import logging
+import os
+import time
+
+from app.core.logging_config import RELAY, TEXT_FORMAT, configure_logging, stop_logging
+
+
+class SlowStream:
+    """Поток вывода с фиксированной задержкой каждой записи."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._devnull = open(os.devnull, "w")
+
+    def write(self, text: str) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._devnull.write(text)
+
+    def flush(self) -> None:
+        self._devnull.flush()
+
+
+def log_message_eager(user_id: int, topic_id: int) -> None:
+    logging.info(f"Forwarding message from user {user_id} to topic {topic_id}")
+    logging.getLogger("aiogram.event").info(
+        f"Update id={user_id} is handled. Duration 5 ms by bot id=42"
+    )
+
+
+def log_message_lazy(user_id: int, topic_id: int) -> None:
+    logging.info(
+        "Forwarding message from user %s to topic %s",
+        user_id,
+        topic_id,
+        extra={"category": RELAY, "user_id": user_id, "topic_id": topic_id},
+    )
+    logging.getLogger("aiogram.event").info(
+        "Update id=%s is handled. Duration %d ms by bot id=%d", user_id, 5, 42
+    )
+
+
+def measure(log_message, messages: int) -> float:
+    """Возвращает среднее время логирования одного сообщения в микросекундах."""
+    started = time.perf_counter()
+    for i in range(messages):
+        log_message(i, i % 500)
+    return (time.perf_counter() - started) / messages * 1_000_000
+
+
+def run(messages: int, latency: float) -> None:
+    root = logging.getLogger()
+
+    # Прежняя схема: basicConfig + синхронная запись
+    handler = logging.StreamHandler(SlowStream(latency))
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+    eager = measure(log_message_eager, messages)
+
+    # Очередь без прореживания и с сохранением каждой десятой записи частых категорий
+    configure_logging(stream=SlowStream(latency))
+    queued = measure(log_message_lazy, messages)
+    configure_logging(
+        stream=SlowStream(latency), sample_rates={RELAY: 0.1, "aiogram.event": 0.1}
+    )
+    sampled = measure(log_message_lazy, messages)
+
+    drain_started = time.perf_counter()
+    stop_logging()
+    drain = time.perf_counter() - drain_started
+
+    print(f"messages={messages}, write latency={latency * 1_000_000:.0f}us")
+    print(f"  sync f-string logging:        {eager:8.1f} us/message in event loop")
+    print(f"  queued lazy logging:          {queued:8.1f} us/message in event loop")
+    print(f"  queued lazy logging, sampled: {sampled:8.1f} us/message in event loop")
+    print(f"  background writer drained the rest in {drain:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--write-latency-us", type=float, default=20.0)
+    args = parser.parse_args()
+    run(args.messages, args.write_latency_us / 1_000_000)
+
+
+if __name__ == "__main__":
+    main()
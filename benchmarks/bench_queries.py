@@ -0,0 +1,99 @@
+"""
+Бенчмарк поиска активной сессии на горячем пути пересылки сообщений.
+
+Сравнивает стоимость одного поиска активной сессии пользователя и темы:
+- текущим ORM-путем: `select(SupportSession).where(...)` строится при каждом
+  вызове, результат превращается в объект `SupportSession`;
+- заранее построенными Core-запросами `app.db.queries`, возвращающими кортежи.
+
+Запуск (нужны переменные окружения из .env):
+    python -m benchmarks.bench_queries [--sessions 10000] [--lookups 20000]
+"""
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.db.queries import active_session_for_user, active_session_in_topic
+from app.models.models import SupportAgent, SupportSession
+
+
+def orm_session_for_user(session: Session, user_telegram_id: int):
+    statement = select(SupportSession).where(
+        SupportSession.user_telegram_id == user_telegram_id,
+        SupportSession.status == "active",
+    )
+    return session.exec(statement).first()
+
+
+def orm_session_in_topic(session: Session, chat_id: int, topic_id: int):
+    statement = select(SupportSession).where(
+        SupportSession.chat_id == chat_id,
+        SupportSession.topic_id == topic_id,
+        SupportSession.status == "active",
+    )
+    return session.exec(statement).first()
+
+
+def fill(session: Session, sessions: int) -> None:
+    session.add(SupportAgent(telegram_id=1))
+    # Половина сессий закрыта, как в рабочей БД с историей обращений
+    session.add_all(
+        SupportSession(
+            user_telegram_id=i,
+            agent_telegram_id=1,
+            chat_id=-100,
+            topic_id=i,
+            status="active" if i % 2 else "closed",
+        )
+        for i in range(1, sessions + 1)
+    )
+    session.commit()
+
+
+def measure(name: str, lookups: List[int], lookup: Callable[[int], object]) -> float:
+    started = time.perf_counter()
+    for key in lookups:
+        lookup(key)
+    per_call = (time.perf_counter() - started) / len(lookups) * 1e6
+    print(f"{name:<28} {per_call:8.1f} us/lookup")
+    return per_call
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(42)
+    lookups = [rng.randint(1, args.sessions) for _ in range(args.lookups)]
+
+    with Session(engine) as session:
+        fill(session, args.sessions)
+        print(f"{args.lookups} lookups among {args.sessions} sessions")
+        # Каждое сообщение обрабатывается в новой сессии БД: identity map не накапливается
+        for title, orm_lookup, row_lookup in (
+            (
+                "by user",
+                lambda key: orm_session_for_user(session, key),
+                lambda key: active_session_for_user(session, key),
+            ),
+            (
+                "by topic",
+                lambda key: orm_session_in_topic(session, -100, key),
+                lambda key: active_session_in_topic(session, -100, key),
+            ),
+        ):
+            orm = measure(f"{title}: ORM", lookups, lambda key: (orm_lookup(key), session.expunge_all()))
+            rows = measure(f"{title}: precompiled rows", lookups, row_lookup)
+            print(f"{title}: {orm / rows:.1f}x faster")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Бенчмарк выбора агента по навыкам.
+
+Сравнивает поиск подходящего свободного агента:
+- фильтрацией списка свободных агентов (с той же цепочкой ослабления маршрута);
+- через индекс корзин `AgentIndex`;
+- целиком `find_available_agent` с БД против выборки свободных агентов из БД и фильтрации.
+
+Каждая итерация — назначение агента на маршрут (язык, тема) и освобождение
+случайного занятого агента, так что около половины агентов всегда занято.
+Для памяти отдельно выводится время выбора (то, что ждет пользователь)
+и полное время с поддержкой индекса при занятии и освобождении агента.
+
+Запуск (нужны переменные окружения из .env):
+    python -m benchmarks.bench_routing [--agents 100 500 2000] [--languages 20] [--topics 10]
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from sqlmodel import Session, SQLModel, create_engine, select, update
+
+from app.models.models import SupportAgent
+from app.services import agent_service
+from app.services.routing_service import AgentIndex, fallback_keys, format_skills, parse_skills
+
+
+def make_agents(agents: int, languages: int, topics: int, rng: random.Random) -> Dict[int, str]:
+    language_tags = [f"lang{i}" for i in range(languages)]
+    topic_tags = [f"topic{i}" for i in range(topics)]
+    return {
+        agent_id: format_skills(
+            rng.sample(language_tags, rng.randint(1, 3)) + rng.sample(topic_tags, rng.randint(1, 3))
+        )
+        for agent_id in range(1, agents + 1)
+    }
+
+
+def make_routes(count: int, languages: int, topics: int, rng: random.Random) -> List[Tuple[str, str]]:
+    return [(f"lang{rng.randrange(languages)}", f"topic{rng.randrange(topics)}") for _ in range(count)]
+
+
+def scan(available: Dict[int, FrozenSet[str]], route: Sequence[str]) -> Optional[int]:
+    """Прежний подход: перебор свободных агентов для каждой ступени маршрута."""
+    for key in fallback_keys(route):
+        for agent_id, skills in available.items():
+            if key <= skills:
+                return agent_id
+    return None
+
+
+Timings = Tuple[float, float]
+
+
+def run_memory(skills: Dict[int, str], routes: List[Tuple[str, str]], rng: random.Random) -> Tuple[Timings, Timings]:
+    parsed = {agent_id: parse_skills(raw) for agent_id, raw in skills.items()}
+    releases = [rng.random() for _ in routes]
+
+    def cycle(
+        pick: Callable[[Tuple[str, str]], Optional[int]],
+        claim: Callable[[int], object],
+        release: Callable[[int], object],
+    ) -> Timings:
+        """Возвращает (время выбора, полное время итерации) в микросекундах."""
+        busy: List[int] = []
+        picking = 0.0
+        started = time.perf_counter()
+        for route, share in zip(routes, releases):
+            pick_started = time.perf_counter()
+            agent_id = pick(route)
+            picking += time.perf_counter() - pick_started
+            if agent_id is not None:
+                claim(agent_id)
+                busy.append(agent_id)
+            if len(busy) > len(skills) // 2:
+                release(busy.pop(int(share * len(busy))))
+        total = time.perf_counter() - started
+        return picking / len(routes) * 1_000_000, total / len(routes) * 1_000_000
+
+    available = dict(parsed)
+    scanned = cycle(
+        lambda route: scan(available, route),
+        lambda agent_id: available.pop(agent_id),
+        lambda agent_id: available.__setitem__(agent_id, parsed[agent_id]),
+    )
+
+    index = AgentIndex()
+    index.load(skills.items())
+    indexed = cycle(
+        index.candidate,
+        index.discard,
+        lambda agent_id: index.add(agent_id, parsed[agent_id]),
+    )
+    return scanned, indexed
+
+
+def run_db(skills: Dict[int, str], routes: List[Tuple[str, str]], rng: random.Random) -> Tuple[float, float]:
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(SupportAgent(telegram_id=agent_id, skills=raw) for agent_id, raw in skills.items())
+        session.commit()
+
+        def release(agent_id: int) -> SupportAgent:
+            session.exec(
+                update(SupportAgent).where(SupportAgent.telegram_id == agent_id).values(is_available=True)
+            )
+            session.commit()
+            return session.get(SupportAgent, agent_id)
+
+        def scan_db(route) -> Optional[int]:
+            rows = session.exec(
+                select(SupportAgent.telegram_id, SupportAgent.skills).where(
+                    SupportAgent.is_available == True, SupportAgent.is_active == True
+                )
+            ).all()
+            agent_id = scan({agent_id: parse_skills(raw) for agent_id, raw in rows}, route)
+            if agent_id is not None:
+                session.exec(
+                    update(SupportAgent).where(SupportAgent.telegram_id == agent_id).values(is_available=False)
+                )
+                session.commit()
+            return agent_id
+
+        def index_db(route) -> Optional[int]:
+            agent = agent_service.find_available_agent(session, route)
+            return agent.telegram_id if agent else None
+
+        def cycle(pick, on_release) -> float:
+            busy: List[int] = []
+            started = time.perf_counter()
+            for route in routes:
+                agent_id = pick(route)
+                if agent_id is not None:
+                    busy.append(agent_id)
+                if len(busy) > len(skills) // 2:
+                    on_release(release(busy.pop(rng.randrange(len(busy)))))
+            result = (time.perf_counter() - started) / len(routes) * 1_000_000
+            for agent_id in busy:
+                release(agent_id)
+            return result
+
+        scanned = cycle(scan_db, lambda agent: None)
+        agent_service.load_agent_index(session)
+        indexed = cycle(index_db, agent_service.return_agent_to_index)
+    return scanned, indexed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--agents", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--languages", type=int, default=20)
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20_000)
+    parser.add_argument("--db-rounds", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"languages={args.languages}, topics={args.topics}, us/assignment (pick / total)")
+    for agents in args.agents:
+        rng = random.Random(args.seed)
+        skills = make_agents(agents, args.languages, args.topics, rng)
+        routes = make_routes(args.rounds, args.languages, args.topics, rng)
+
+        (scan_pick, scan_total), (index_pick, index_total) = run_memory(
+            skills, routes, random.Random(args.seed)
+        )
+        db_scan, db_index = run_db(skills, routes[: args.db_rounds], random.Random(args.seed))
+
+        print(f"agents={agents}")
+        print(f"  in-memory filtered scan:       {scan_pick:8.1f} / {scan_total:8.1f}")
+        print(f"  in-memory skill index:         {index_pick:8.1f} / {index_total:8.1f}")
+        print(f"  DB scan + filter:                         {db_scan:8.1f}")
+        print(f"  find_available_agent (index):             {db_index:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
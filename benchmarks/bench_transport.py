@@ -0,0 +1,120 @@
+"""
+Бенчмарк HTTP-транспорта Bot API.
+
+Поднимает в отдельном процессе локальный сервер, отвечающий на sendMessage
+как Bot API с фиксированной задержкой, и измеряет пропускную способность
+(запросов в секунду) при конкурентной отправке сообщений для разных
+настроек пула соединений, keep-alive и кэша DNS. Адрес сервера задается
+через `localhost`, поэтому без кэша DNS имя разрешается на каждом соединении.
+
+Запуск (нужны переменные окружения из .env):
+    python -m benchmarks.bench_transport [--requests 5000] [--concurrency 200] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+from typing import Dict, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+from app.core.bot_session import TunedAiohttpSession
+
+MESSAGE = {
+    "message_id": 1,
+    "date": 0,
+    "chat": {"id": 1, "type": "private"},
+    "text": "ok",
+}
+
+CONFIGURATIONS: Dict[str, dict] = {
+    "pool=100, keep-alive, DNS cache (default)": {},
+    "pool=10": {"limit": 10},
+    "pool=500": {"limit": 500},
+    "pool=500, no keep-alive": {"limit": 500, "keepalive_timeout": 0},
+    "pool=500, no keep-alive, no DNS cache": {"limit": 500, "keepalive_timeout": 0, "dns_cache_ttl": 0},
+}
+
+
+def serve(port: int, latency: float) -> None:
+    """Сервер-заглушка Bot API."""
+
+    async def handle(request: web.Request) -> web.Response:
+        await request.read()
+        await asyncio.sleep(latency)
+        return web.json_response({"ok": True, "result": MESSAGE})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, handle_signals=False, backlog=1024)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(port: int) -> None:
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("Stand-in Bot API server did not start")
+
+
+async def measure(session: AiohttpSession, requests: int, concurrency: int) -> Tuple[float, float]:
+    """Возвращает (запросов в секунду, время первого запроса в мс)."""
+    bot = Bot("42:BENCHMARK", session=session)
+    first_started = time.perf_counter()
+    await bot.send_message(chat_id=1, text="warm-up")
+    first = (time.perf_counter() - first_started) * 1000
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i: int) -> None:
+        async with semaphore:
+            await bot.send_message(chat_id=1, text=str(i))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    await session.close()
+    return requests / elapsed, first
+
+
+async def run(requests: int, concurrency: int, port: int) -> None:
+    await wait_for_server(port)
+    api = TelegramAPIServer.from_base(f"http://localhost:{port}")
+    print(f"requests={requests}, concurrency={concurrency}")
+    for name, options in CONFIGURATIONS.items():
+        session = TunedAiohttpSession(api=api, **options)
+        rps, first = await measure(session, requests, concurrency)
+        print(f"  {name:<42} {rps:8.0f} req/s   first request {first:6.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port, args.latency_ms / 1000), daemon=True)
+    server.start()
+    try:
+        asyncio.run(run(args.requests, args.concurrency, port))
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
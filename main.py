@@ -1,28 +1,226 @@
 import asyncio
 import logging
-import sys
+import signal
+from typing import List
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.types.error_event import ErrorEvent
 
+from app.core.background import start_background_task, start_periodic_task, start_service_task
+from app.core.bot_session import create_bot_session
+from app.core.bots import register_bots
+from app.core.circuit_breaker import CircuitOpenError
 from app.core.config import settings
-from app.db.session import create_db_and_tables, get_session
-from app.handlers import agent_handlers, user_handlers
+from app.core.logging_config import ErrorDeduplicator, configure_logging
+from app.core.metrics import serve_metrics
+from app.core.scheduler import update_scheduler
+from app.core.shutdown import graceful_shutdown, register_flush_callback, register_stop_callback
+from app.core.watchdog import loop_watchdog
+from app.db.maintenance import MAINTENANCE_CHECK_SECONDS, db_maintenance, enable_incremental_vacuum
+from app.db.session import create_db_and_tables, engine, get_session
+from app.handlers import admin_handlers, agent_handlers, user_handlers
 from app.middlewares.db_middleware import DbSessionMiddleware
+from app.middlewares.inflight_middleware import InFlightMiddleware
+from app.middlewares.scheduler_middleware import SchedulerMiddleware
+from app.middlewares.throttling_middleware import throttling
+from app.services import (
+    agent_service,
+    backlog_service,
+    broadcast_service,
+    idle_service,
+    message_link_service,
+    profile_service,
+    reconcile_service,
+)
+from app.services.affinity_service import last_sessions
 from app.services.agent_service import sync_agents_from_env
 
 
-def on_startup():
-    """Выполняется при старте бота."""
+async def run_reconciliation(bot: Bot, check_topics: bool = True):
+    """
+    Сверяет состояние сессий, тем и агентов и сообщает администратору об исправлениях.
+    """
+    with next(get_session()) as session:
+        report = await reconcile_service.reconcile(session, bot, check_topics)
+    if report.has_changes:
+        try:
+            await bot.send_message(
+                settings.ADMIN_ID, f"🛠 Сверка состояния: {report.summary()}"
+            )
+        except Exception as e:
+            logging.error("Failed to send reconciliation report to admin: %s", e)
+
+
+async def report_unfinished_broadcasts(bot: Bot):
+    """
+    Напоминает администратору о рассылках, прерванных остановкой бота.
+    """
+    with next(get_session()) as session:
+        broadcast_ids = [broadcast.id for broadcast in broadcast_service.get_unfinished_broadcasts(session)]
+    if not broadcast_ids:
+        return
+    numbers = ", ".join(f"#{broadcast_id}" for broadcast_id in broadcast_ids)
+    try:
+        await bot.send_message(
+            settings.ADMIN_ID,
+            f"📣 Незавершенные рассылки: {numbers}. Продолжить: /broadcast_resume <id>",
+        )
+    except Exception as e:
+        logging.error("Failed to send unfinished broadcasts notice to admin: %s", e)
+
+
+async def flush_message_links():
+    """Записывает в БД накопленные связи пересланных сообщений."""
+    with next(get_session()) as session:
+        message_link_service.flush_message_links(session)
+
+
+async def cleanup_message_links():
+    """Удаляет устаревшие связи пересланных сообщений."""
+    with next(get_session()) as session:
+        removed = message_link_service.cleanup_message_links(session)
+    if removed:
+        logging.info("Removed %s expired message links.", removed)
+
+
+async def reload_agent_roster(bot: Bot):
+    """
+    Перечитывает состав агентов из .env и сообщает администратору о результате.
+    """
+    with next(get_session()) as session:
+        try:
+            diff = agent_service.reload_agents(session, bot)
+        except ValueError as e:
+            logging.error("Agent roster reload failed: %s", e)
+            text = f"🔴 Не удалось обновить состав агентов: {e}"
+        else:
+            if not diff.has_changes:
+                return
+            text = f"👥 Состав агентов обновлен: {diff.summary()}"
+    try:
+        await bot.send_message(settings.ADMIN_ID, text)
+    except Exception as e:
+        logging.error("Failed to send roster reload report to admin: %s", e)
+
+
+async def reload_agent_roster_if_changed(bot: Bot):
+    """Перечитывает состав агентов, если .env был изменен."""
+    if agent_service.env_file_changed():
+        await reload_agent_roster(bot)
+
+
+def install_sighup_handler(bot: Bot):
+    """Перечитывает состав агентов по сигналу SIGHUP (`kill -HUP <pid>`)."""
+    if not hasattr(signal, "SIGHUP"):
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGHUP,
+            lambda: start_background_task(reload_agent_roster(bot), name="roster-reload"),
+        )
+    except NotImplementedError:
+        logging.warning("SIGHUP handler is not supported on this platform.")
+
+
+async def on_startup(bots: List[Bot], dispatcher: Dispatcher):
+    """
+    Выполняется при старте бота.
+
+    Служебные задачи выполняет основной бот (первый токен); накопившиеся
+    обновления разбираются для каждого бота отдельно.
+    """
+    bot = bots[0]
+    if settings.LOOP_WATCHDOG_ENABLED:
+        # Сторож запускается первым, чтобы заметить и блокировки при инициализации
+        start_service_task(loop_watchdog.monitor(), name="loop-watchdog")
+        loop_watchdog.start()
+        register_flush_callback(loop_watchdog.stop)
+
     logging.info("Initializing database and tables...")
     create_db_and_tables()
     logging.info("Database initialized successfully.")
+    if settings.DB_MAINTENANCE_INTERVAL_SECONDS > 0:
+        if settings.DB_INCREMENTAL_VACUUM:
+            # Единственный полный VACUUM выполняется до начала обработки обновлений
+            await asyncio.to_thread(enable_incremental_vacuum, engine)
+        start_periodic_task(db_maintenance.tick, interval=MAINTENANCE_CHECK_SECONDS, name="db-maintenance")
 
     # Синхронизация агентов при старте
     with next(get_session()) as session:
         sync_agents_from_env(session)
+        # Последние сессии вернувшихся пользователей: закрепление за агентом без запросов к БД
+        loaded = last_sessions.warm(session)
+        logging.info("Loaded last sessions of %s users.", loaded)
+        # Сохраненные имена агентов доступны сразу, свежие запрашиваются в фоне
+        logging.info("Loaded %s agent profiles.", profile_service.load_profiles(session))
+    start_periodic_task(
+        lambda: profile_service.refresh_stale_profiles(bot),
+        interval=profile_service.PROFILE_CHECK_INTERVAL_SECONDS,
+        name="agent-profiles",
+        initial_delay=0,
+    )
+
+    # Состав агентов можно обновить без перезапуска: командой, сигналом или правкой .env
+    install_sighup_handler(bot)
+    if settings.ROSTER_WATCH_INTERVAL_SECONDS > 0:
+        start_periodic_task(
+            lambda: reload_agent_roster_if_changed(bot),
+            interval=settings.ROSTER_WATCH_INTERVAL_SECONDS,
+            name="roster-watch",
+        )
+
+    # Восстанавливаем согласованность состояния после возможного сбоя
+    await run_reconciliation(bot)
+    if settings.RECONCILE_INTERVAL_SECONDS > 0:
+        start_periodic_task(
+            # Периодически темы не опрашиваются: закрываются сессии тем, удаление которых уже обнаружено
+            lambda: run_reconciliation(bot, check_topics=False),
+            interval=settings.RECONCILE_INTERVAL_SECONDS,
+            name="reconciliation",
+        )
+
+    start_periodic_task(
+        flush_message_links, interval=message_link_service.FLUSH_INTERVAL_SECONDS, name="message-links-flush"
+    )
+    # Связи, пересланные перед остановкой, записываются после завершения хэндлеров
+    register_flush_callback(flush_message_links)
+    start_periodic_task(
+        cleanup_message_links,
+        interval=message_link_service.CLEANUP_INTERVAL_SECONDS,
+        name="message-links-cleanup",
+        initial_delay=0,
+    )
+
+    if settings.METRICS_PORT > 0:
+        start_service_task(serve_metrics(settings.METRICS_HOST, settings.METRICS_PORT), name="metrics")
+
+    await report_unfinished_broadcasts(bot)
+
+    # Загружаем активные сессии в трекер неактивности и запускаем автозакрытие
+    idle_service.start_idle_scheduler(bot)
+
+    # Обрабатываем сообщения, накопившиеся за время простоя, до начала polling
+    if not settings.DROP_PENDING_UPDATES:
+        for backlog_bot in bots:
+            with next(get_session()) as session:
+                await backlog_service.drain_backlog(
+                    dispatcher, backlog_bot, session, concurrency=settings.BACKLOG_CONCURRENCY
+                )
+
+
+async def on_shutdown(inflight: InFlightMiddleware):
+    """
+    Выполняется при остановке бота (в том числе по SIGTERM).
+
+    Polling к этому моменту уже остановлен; дожидаемся начатых хэндлеров
+    и фоновых задач, после чего aiogram закрывает сессию бота.
+    """
+    await graceful_shutdown(inflight, timeout=settings.SHUTDOWN_TIMEOUT_SECONDS)
+
+
+error_deduplicator = ErrorDeduplicator(window=settings.LOG_ERROR_DEDUP_SECONDS)
 
 
 async def error_handler(event: ErrorEvent, bot: Bot):
@@ -30,50 +228,96 @@ async def error_handler(event: ErrorEvent, bot: Bot):
     Глобальный обработчик ошибок.
     Ловит все исключения, которые не были обработаны в хэндлерах.
     """
-    logging.error(f"Unhandled exception: {event.exception}", exc_info=True)
+    unavailable = isinstance(event.exception, CircuitOpenError)
+    # Одна и та же ошибка (например, недоступность Telegram API) может
+    # повторяться на каждом обновлении — полный traceback пишем раз в окно
+    suppressed = error_deduplicator.check(event.exception)
+    if unavailable:
+        # Разомкнутый выключатель — ожидаемый отказ, traceback ничего не добавит
+        logging.warning("Update %s not processed: %s", event.update.update_id, event.exception)
+    elif suppressed is not None:
+        logging.error(
+            "Unhandled exception: %s (%s similar errors suppressed)",
+            event.exception,
+            suppressed,
+            exc_info=event.exception,
+        )
 
     # Отправляем сообщение пользователю, если это возможно
     if event.update.message:
         user_id = event.update.message.from_user.id
         try:
-            await bot.send_message(
-                user_id,
-                "Произошла непредвиденная ошибка. Мы уже работаем над решением. "
-                "Пожалуйста, попробуйте позже.",
+            text = (
+                user_handlers.TELEGRAM_UNAVAILABLE_TEXT
+                if unavailable
+                else "Произошла непредвиденная ошибка. Мы уже работаем над решением. "
+                "Пожалуйста, попробуйте позже."
             )
+            await bot.send_message(user_id, text)
         except Exception as e:
-            logging.error(f"Failed to send error message to user {user_id}: {e}")
+            logging.error("Failed to send error message to user %s: %s", user_id, e)
 
 
 async def main() -> None:
     """Главная функция для запуска бота."""
-    bot = Bot(
-        token=settings.BOT_TOKEN.get_secret_value(),
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-    )
-    dp = Dispatcher()
+    # Каждый токен опрашивается отдельно; пользователь закрепляется
+    # за ботом, которому написал первым
+    # Все боты используют общий пул соединений с сервером Bot API
+    bot_session = create_bot_session()
+    bots = [
+        Bot(
+            token=token,
+            session=bot_session,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+        for token in settings.bot_tokens
+    ]
+    register_bots(bots)
+    inflight = InFlightMiddleware()
+    # Передаем middleware в workflow_data, чтобы on_shutdown получил его как зависимость
+    dp = Dispatcher(inflight=inflight)
+    # Сторож блокировок event loop указывает в логе обновление, при обработке которого цикл завис
+    loop_watchdog.resolve_event = inflight.event_for_task
+    # Обслуживание БД откладывается, пока бот обрабатывает много обновлений
+    db_maintenance.is_busy = lambda: inflight.in_flight > settings.DB_MAINTENANCE_MAX_IN_FLIGHT
+    # При остановке рассылки досылают взятых получателей и сохраняют итоги, а не ждут всей рассылки
+    register_stop_callback(broadcast_service.stop_broadcasts)
 
+    dp.update.outer_middleware(inflight)
+    if settings.UPDATE_CONCURRENCY > 0:
+        # Ответы агентов не ждут за созданием новых сессий; лишние обновления отбрасываются
+        dp.update.outer_middleware(SchedulerMiddleware(update_scheduler))
     dp.update.middleware(DbSessionMiddleware())
+    # Лимит частоты срабатывает после фильтров роутера (только личные сообщения),
+    # но до первого запроса к БД в хэндлере
+    user_handlers.router.message.middleware(throttling)
+    user_handlers.router.edited_message.middleware(throttling)
+    # Выбор темы в стартовом меню тоже создает сессию
+    user_handlers.router.callback_query.middleware(throttling)
 
-    # ПРАВИЛЬНЫЙ СПОСОБ РЕГИСТРАЦИИ:
-    # Используем lambda, чтобы передать объект bot в on_startup.
+    # aiogram сам внедрит список bots в on_startup.
     dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
     # Просто регистрируем хэндлер, aiogram сам внедрит зависимость bot.
     dp.errors.register(error_handler)
 
+    # Роутер администратора подключается первым, иначе его команды
+    # в личном чате перехватит роутер пользователей.
+    dp.include_router(admin_handlers.router)
     dp.include_router(user_handlers.router)
     dp.include_router(agent_handlers.router)
 
-    logging.info("Starting bot...")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    logging.info("Starting %s bot(s)...", len(bots))
+    for bot in bots:
+        await bot.delete_webhook(drop_pending_updates=settings.DROP_PENDING_UPDATES)
+    await dp.start_polling(*bots)
 
 
 if __name__ == "__main__":
-    logging.basicConfig(
-        level=logging.INFO,
-        stream=sys.stdout,
-        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+    configure_logging(
+        level=settings.LOG_LEVEL,
+        json_format=settings.LOG_FORMAT == "json",
+        sample_rates=settings.LOG_SAMPLE_RATES,
     )
     try:
         asyncio.run(main())
@@ -0,0 +1,149 @@
+"""
+Инструменты бенчмарков сервисов.
+
+Бенчмарк выполняет операцию заданное число раз и сохраняет медиану времени
+одного вызова. Результаты всего прогона записываются в JSON (`--benchmark-json`);
+медиана сравнивается с сохраненной в файле базовых результатов (`--benchmark-baseline`),
+и замедление больше допустимого (`--benchmark-tolerance`) проваливает тест.
+Измерение без базового результата не сравнивается, о чем выдается предупреждение.
+Флаг `--benchmark-save-baseline` сохраняет результаты прогона как базовые.
+"""
+import json
+import platform
+import statistics
+import time
+import warnings
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+BENCHMARK_RESULTS = pytest.StashKey[Dict[str, dict]]()
+
+
+class MissingBaselineWarning(UserWarning):
+    """Измерение не сравнивалось: нет базового результата."""
+
+
+class Measurement:
+    """Время отдельных вызовов одной операции; каждый `with` — один вызов."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: List[float] = []
+        self._started = 0.0
+
+    def __enter__(self) -> "Measurement":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.samples.append(time.perf_counter() - self._started)
+
+    @property
+    def median_us(self) -> float:
+        return statistics.median(self.samples) * 1e6
+
+    def as_dict(self) -> dict:
+        return {
+            "median_us": round(self.median_us, 2),
+            "min_us": round(min(self.samples) * 1e6, 2),
+            "rounds": len(self.samples),
+        }
+
+
+class BenchmarkRecorder:
+    """
+    Собирает результаты бенчмарков и сравнивает их с базовыми.
+
+    :param results: Результаты прогона, общие для всех тестов.
+    :param baseline: Базовые результаты по именам измерений; None — результаты сохраняются
+                     как базовые и не сравниваются.
+    :param tolerance: Допустимое замедление относительно базовой медианы (0.5 — на 50%).
+    """
+
+    def __init__(self, results: Dict[str, dict], baseline: Optional[Dict[str, dict]], tolerance: float):
+        self.results = results
+        self.baseline = baseline
+        self.tolerance = tolerance
+
+    def measurement(self, operation: str, **params: object) -> Measurement:
+        """Создает измерение с именем вида `operation[param=value,...]`."""
+        suffix = ",".join(f"{key}={value}" for key, value in params.items())
+        return Measurement(f"{operation}[{suffix}]" if suffix else operation)
+
+    def compare(self, *measurements: Measurement) -> None:
+        """Сохраняет результаты измерений и проваливает тест при замедлении относительно базовых."""
+        regressions = []
+        for measurement in measurements:
+            self.results[measurement.name] = measurement.as_dict()
+            if self.baseline is None:
+                continue
+            expected = self.baseline.get(measurement.name)
+            if expected is None:
+                warnings.warn(
+                    f"{measurement.name}: no baseline result, comparison skipped "
+                    "(save one with --benchmark-save-baseline)",
+                    MissingBaselineWarning,
+                )
+                continue
+            limit = expected["median_us"] * (1 + self.tolerance)
+            if measurement.median_us > limit:
+                regressions.append(
+                    f"{measurement.name}: {measurement.median_us:.1f} us, "
+                    f"baseline {expected['median_us']:.1f} us, limit {limit:.1f} us"
+                )
+        if regressions:
+            pytest.fail("Performance regression:\n" + "\n".join(regressions), pytrace=False)
+
+
+@pytest.fixture(scope="session")
+def benchmark_baseline(pytestconfig) -> Optional[Dict[str, dict]]:
+    if pytestconfig.getoption("--benchmark-save-baseline"):
+        return None
+    path = Path(pytestconfig.getoption("--benchmark-baseline"))
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())["results"]
+
+
+@pytest.fixture
+def bench(pytestconfig, benchmark_baseline) -> BenchmarkRecorder:
+    return BenchmarkRecorder(
+        pytestconfig.stash.setdefault(BENCHMARK_RESULTS, {}),
+        benchmark_baseline,
+        pytestconfig.getoption("--benchmark-tolerance"),
+    )
+
+
+def pytest_sessionfinish(session):
+    results = session.config.stash.get(BENCHMARK_RESULTS, None)
+    if not results:
+        return
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    paths = [Path(session.config.getoption("--benchmark-json"))]
+    if session.config.getoption("--benchmark-save-baseline"):
+        paths.append(Path(session.config.getoption("--benchmark-baseline")))
+    for path in paths:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2, sort_keys=True))
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(BENCHMARK_RESULTS, None)
+    if not results:
+        return
+    terminalreporter.section("service benchmarks")
+    for name, result in sorted(results.items()):
+        terminalreporter.write_line(f"{name:<64} {result['median_us']:10.1f} us")
+    terminalreporter.write_line(f"Results saved to {config.getoption('--benchmark-json')}")
+    baseline = config.getoption("--benchmark-baseline")
+    if config.getoption("--benchmark-save-baseline"):
+        terminalreporter.write_line(f"Baseline saved to {baseline}")
+    elif not Path(baseline).exists():
+        terminalreporter.write_line(
+            f"Baseline {baseline} not found: results were not compared. "
+            "Save one with --benchmark-save-baseline",
+            yellow=True,
+            bold=True,
+        )
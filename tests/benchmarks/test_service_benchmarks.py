@@ -0,0 +1,159 @@
+"""
+Бенчмарки сервисов на in-memory SQLite (фикстура `session` из tests/conftest.py).
+
+Запуск (базовые результаты сохраняются первой командой, вторая сравнивает с ними):
+    poetry run pytest tests/benchmarks --benchmarks --benchmark-save-baseline
+    poetry run pytest tests/benchmarks --benchmarks [--benchmark-baseline benchmarks/baseline.json]
+"""
+import datetime
+import itertools
+import random
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.types import ForumTopic
+from sqlmodel import Session, delete
+
+from app.core.config import settings
+from app.db.queries import active_session_for_user, active_session_in_topic
+from app.models.models import SupportAgent, SupportSession
+from app.services.agent_service import find_available_agent, return_agent_to_index, sync_agents_from_env
+from app.services.session_service import close_session, create_new_session
+
+pytestmark = pytest.mark.benchmark
+
+# Размеры таблиц агентов и сессий
+TABLE_SIZES = (100, 1_000, 10_000)
+ROSTER_SIZE = 10_000
+# Агентов при замере жизненного цикла сессии
+LIFECYCLE_AGENTS = 100
+
+CLAIM_ROUNDS = 500
+LIFECYCLE_ROUNDS = 200
+LOOKUP_ROUNDS = 2_000
+SYNC_ROUNDS = 5
+
+BOT_ID = 42
+
+
+def add_agents(session: Session, count: int) -> None:
+    session.execute(
+        SupportAgent.__table__.insert(),
+        [{"telegram_id": agent_id, "is_available": True, "is_active": True, "skills": ""}
+         for agent_id in range(1, count + 1)],
+    )
+    session.commit()
+
+
+def add_sessions(session: Session, count: int, active: bool) -> None:
+    """Добавляет `count` сессий пользователей 1..count; при `active` активна каждая вторая."""
+    now = datetime.datetime.now()
+    session.execute(
+        SupportSession.__table__.insert(),
+        [
+            {
+                "user_telegram_id": user_id,
+                "agent_telegram_id": 1,
+                "chat_id": settings.SUPERGROUP_ID,
+                "topic_id": user_id,
+                "bot_id": BOT_ID,
+                "status": "active" if active and user_id % 2 else "closed",
+                "created_at": now,
+            }
+            for user_id in range(1, count + 1)
+        ],
+    )
+    session.commit()
+
+
+def make_bot() -> AsyncMock:
+    bot = AsyncMock(id=BOT_ID)
+    topic_ids = itertools.count(1)
+    bot.create_forum_topic.side_effect = lambda **kwargs: ForumTopic(
+        message_thread_id=next(topic_ids), name=kwargs["name"], icon_color=1
+    )
+    return bot
+
+
+# --- Агенты ---
+
+
+@pytest.mark.parametrize("agents", TABLE_SIZES)
+def test_find_available_agent(session: Session, bench, agents: int):
+    """Бенчмарк: выбор и блокировка свободного агента."""
+    add_agents(session, agents)
+    measurement = bench.measurement("find_available_agent", agents=agents)
+
+    for _ in range(CLAIM_ROUNDS):
+        with measurement:
+            agent = find_available_agent(session)
+        agent.is_available = True
+        session.add(agent)
+        session.commit()
+        return_agent_to_index(agent)
+
+    bench.compare(measurement)
+
+
+def test_sync_agents_from_env(session: Session, bench, mocker):
+    """Бенчмарк: синхронизация состава из 10 000 агентов — первая и без изменений."""
+    mocker.patch("app.services.agent_service.settings.AGENT_IDS", list(range(1, ROSTER_SIZE + 1)))
+    initial = bench.measurement("sync_agents_from_env", agents=ROSTER_SIZE, change="all")
+    unchanged = bench.measurement("sync_agents_from_env", agents=ROSTER_SIZE, change="none")
+
+    for _ in range(SYNC_ROUNDS):
+        session.exec(delete(SupportAgent))
+        session.commit()
+        with initial:
+            added = sync_agents_from_env(session).added
+        with unchanged:
+            diff = sync_agents_from_env(session)
+        assert len(added) == ROSTER_SIZE
+        assert not diff.has_changes
+
+    bench.compare(initial, unchanged)
+
+
+# --- Сессии ---
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sessions", TABLE_SIZES)
+async def test_session_lifecycle(session: Session, bench, sessions: int):
+    """Бенчмарк: создание и закрытие сессии при истории из `sessions` закрытых сессий."""
+    add_agents(session, LIFECYCLE_AGENTS)
+    add_sessions(session, sessions, active=False)
+    bot = make_bot()
+    create = bench.measurement("create_new_session", sessions=sessions)
+    close = bench.measurement("close_session", sessions=sessions)
+
+    for user_id in range(sessions + 1, sessions + LIFECYCLE_ROUNDS + 1):
+        with create:
+            new_session = await create_new_session(session, bot, user_id, None)
+        with close:
+            closed = await close_session(session, bot, new_session)
+        assert closed
+
+    bench.compare(create, close)
+
+
+# --- Поиск сессии в хэндлерах ---
+
+
+@pytest.mark.parametrize("sessions", TABLE_SIZES)
+def test_active_session_lookups(session: Session, bench, sessions: int):
+    """Бенчмарк: поиск активной сессии по пользователю и по теме; активна половина сессий."""
+    add_agents(session, 1)
+    add_sessions(session, sessions, active=True)
+    rng = random.Random(42)
+    keys = [rng.randint(1, sessions) for _ in range(LOOKUP_ROUNDS)]
+    by_user = bench.measurement("active_session_for_user", sessions=sessions)
+    by_topic = bench.measurement("active_session_in_topic", sessions=sessions)
+
+    for key in keys:
+        with by_user:
+            active_session_for_user(session, key)
+        with by_topic:
+            active_session_in_topic(session, settings.SUPERGROUP_ID, key)
+
+    bench.compare(by_user, by_topic)
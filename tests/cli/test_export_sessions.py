@@ -0,0 +1,41 @@
+import csv
+import datetime
+import io
+
+from sqlmodel import Session
+
+from app.cli.export_sessions import CSV_HEADER, export_sessions_csv
+from app.core.config import settings
+from app.models.models import SupportSession
+
+
+def test_export_sessions_csv(session: Session):
+    """
+    Тест: сессии выгружаются в CSV с вычисленными интервалами и фильтром по статусу.
+    """
+    # Arrange
+    created = datetime.datetime(2025, 5, 20, 10, 0)
+    session.add(
+        SupportSession(
+            user_telegram_id=123,
+            agent_telegram_id=456,
+            topic_id=101,
+            status="closed",
+            created_at=created,
+            first_response_at=created + datetime.timedelta(seconds=30),
+            closed_at=created + datetime.timedelta(minutes=10),
+        )
+    )
+    session.add(SupportSession(user_telegram_id=124, agent_telegram_id=456, topic_id=102))
+    session.commit()
+    output = io.StringIO()
+
+    # Act
+    count = export_sessions_csv(session, output, status="closed")
+
+    # Assert
+    assert count == 1
+    rows = list(csv.reader(io.StringIO(output.getvalue())))
+    assert rows[0] == CSV_HEADER
+    assert rows[1][0:6] == ["1", "123", "456", str(settings.SUPERGROUP_ID), "101", "closed"]
+    assert rows[1][-2:] == ["30", "600"]
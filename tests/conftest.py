@@ -1,6 +1,49 @@
 import pytest
 from sqlmodel import Session, SQLModel, create_engine
 
+from app.core.circuit_breaker import circuit_breakers
+from app.core.missing_topics import missing_topics
+from app.services.affinity_service import last_sessions
+from app.services.message_link_service import message_links
+from app.services.profile_service import agent_profiles
+from app.services.routing_service import agent_index
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks", "service benchmarks (tests/benchmarks)")
+    group.addoption("--benchmarks", action="store_true", help="run service benchmarks")
+    group.addoption("--benchmark-json", default="bench_results.json", help="where to save benchmark results")
+    group.addoption(
+        "--benchmark-baseline",
+        default="benchmarks/baseline.json",
+        help="results to compare with; without the file the comparison is skipped with a warning",
+    )
+    group.addoption(
+        "--benchmark-save-baseline",
+        action="store_true",
+        help="save the results as the new baseline instead of comparing with it",
+    )
+    group.addoption(
+        "--benchmark-tolerance",
+        type=float,
+        default=0.5,
+        help="allowed slowdown relative to the baseline (0.5 = 50%%)",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: service benchmark, runs only with --benchmarks")
+
+
+def pytest_collection_modifyitems(config, items):
+    # Бенчмарки долгие и зависят от машины, поэтому в обычный прогон тестов не входят
+    if config.getoption("--benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run only with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
 
 @pytest.fixture(name="session")
 def session_fixture():
@@ -12,6 +55,14 @@ def session_fixture():
         "sqlite:///:memory:", connect_args={"check_same_thread": False}
     )
     SQLModel.metadata.create_all(engine)
+    # Индекс свободных агентов, кэши последних сессий, профилей и связей сообщений — кэши БД,
+    # для новой БД они строятся заново
+    agent_index.invalidate()
+    last_sessions.clear()
+    agent_profiles.clear()
+    message_links.clear()
+    circuit_breakers.reset()
+    missing_topics.clear()
     with Session(engine) as session:
         yield session
 
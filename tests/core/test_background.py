@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from app.core.background import start_periodic_task, stop_background_tasks
+
+
+@pytest.mark.asyncio
+async def test_periodic_task_survives_errors_and_stops():
+    """
+    Тест: ошибка в периодической задаче не прерывает расписание, а остановка отменяет задачу.
+    """
+    # Arrange
+    calls = []
+
+    async def job():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    # Act
+    task = start_periodic_task(job, interval=0.01, name="test", initial_delay=0)
+    await asyncio.sleep(0.05)
+    await stop_background_tasks()
+
+    # Assert
+    assert len(calls) >= 2
+    assert task.cancelled()
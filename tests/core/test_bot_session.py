@@ -0,0 +1,75 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import GetMe, SendMessage
+
+from app.core.bot_session import TunedAiohttpSession, create_bot_session
+
+
+def test_connector_settings():
+    """Тест: параметры пула соединений передаются в TCPConnector."""
+    # Act
+    session = TunedAiohttpSession(limit=10, limit_per_host=5, keepalive_timeout=0, dns_cache_ttl=0)
+
+    # Assert
+    assert session._connector_init["limit"] == 10
+    assert session._connector_init["limit_per_host"] == 5
+    assert session._connector_init["force_close"] is True
+    assert session._connector_init["use_dns_cache"] is False
+    assert "ttl_dns_cache" not in session._connector_init
+
+
+@pytest.mark.asyncio
+async def test_connector_created_from_settings():
+    """
+    Тест: aiogram создает TCPConnector из `_connector_init`.
+
+    Проверяет приватный формат AiohttpSession, на который опирается TunedAiohttpSession.
+    """
+    # Arrange
+    session = TunedAiohttpSession(limit=10, limit_per_host=5, keepalive_timeout=0, dns_cache_ttl=0)
+
+    # Act
+    client = await session.create_session()
+
+    # Assert
+    assert client.connector.limit == 10
+    assert client.connector.limit_per_host == 5
+    assert client.connector.force_close is True
+    assert client.connector.use_dns_cache is False
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_method_timeouts(mocker):
+    """
+    Тест: таймаут метода берется из настроек, явный таймаут запроса имеет приоритет.
+    """
+    # Arrange
+    request = mocker.patch.object(AiohttpSession, "make_request", new_callable=AsyncMock)
+    session = TunedAiohttpSession(method_timeouts={"sendMessage": 5})
+    bot = Bot("42:TOKEN", session=session)
+
+    # Act
+    await session.make_request(bot, SendMessage(chat_id=1, text="hi"))
+    await session.make_request(bot, SendMessage(chat_id=1, text="hi"), timeout=70)
+    await session.make_request(bot, GetMe())
+
+    # Assert
+    assert [call.kwargs["timeout"] for call in request.await_args_list] == [5, 70, None]
+
+
+def test_custom_api_server(mocker):
+    """Тест: при заданном TELEGRAM_API_URL запросы идут на собственный сервер Bot API."""
+    # Arrange
+    mocker.patch("app.core.config.settings.TELEGRAM_API_URL", "http://localhost:8081/")
+    mocker.patch("app.core.config.settings.TELEGRAM_API_LOCAL", True)
+
+    # Act
+    session = create_bot_session()
+
+    # Assert
+    assert session.api.api_url("42:TOKEN", "getMe") == "http://localhost:8081/bot42:TOKEN/getMe"
+    assert session.api.is_local is True
@@ -0,0 +1,125 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError
+from aiogram.methods import GetUpdates, SendMessage
+
+from app.core.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerMiddleware,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(error_rate=0.5, min_requests=4, window=10, open_seconds=5, clock=clock)
+
+
+def test_opens_on_error_rate_and_recovers_after_trial():
+    """Тест: closed -> open при доле ошибок, затем half-open и один пробный вызов."""
+    # Arrange
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+
+    # Act
+    for failed in (False, True, False):
+        breaker.record(failed)
+    state_before_minimum = breaker.state
+    breaker.record(failed=True)
+
+    # Assert
+    assert state_before_minimum == CLOSED
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+
+    clock.now = 5
+    assert breaker.allow() is True
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is False  # пробный вызов только один
+    breaker.record(failed=False)
+    assert breaker.state == CLOSED
+    assert breaker.allow() is True
+
+
+def test_failed_trial_reopens_and_old_errors_expire():
+    """Тест: неудачный пробный вызов снова размыкает выключатель; ошибки вне окна не учитываются."""
+    # Arrange
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record(failed=True)
+
+    # Act
+    clock.now = 11
+    breaker.record(failed=True)
+
+    # Assert
+    assert breaker.state == CLOSED
+
+    for _ in range(3):
+        breaker.record(failed=True)
+    assert breaker.state == OPEN
+    clock.now = 16
+    assert breaker.allow() is True
+    breaker.record(failed=True)
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 5
+
+
+@pytest.mark.asyncio
+async def test_middleware_fails_fast_when_open():
+    """Тест: после сетевых ошибок вызовы метода отклоняются без запроса к Telegram."""
+    # Arrange
+    breakers = CircuitBreakerRegistry(error_rate=0.5, min_requests=2, window=30, open_seconds=15)
+    middleware = CircuitBreakerMiddleware(breakers)
+    method = SendMessage(chat_id=1, text="hi")
+    make_request = AsyncMock(side_effect=TelegramNetworkError(method, "timeout"))
+    bot = AsyncMock()
+
+    # Act
+    for _ in range(2):
+        with pytest.raises(TelegramNetworkError):
+            await middleware(make_request, bot, method)
+    with pytest.raises(CircuitOpenError) as error:
+        await middleware(make_request, bot, method)
+
+    # Assert
+    assert make_request.await_count == 2
+    assert error.value.method == "sendMessage"
+    with pytest.raises(CircuitOpenError):
+        breakers.ensure_closed("createForumTopic", "sendMessage")
+    breakers.ensure_closed("createForumTopic")
+
+
+@pytest.mark.asyncio
+async def test_middleware_ignores_request_errors_and_polling():
+    """Тест: ошибки запроса не считаются отказом Telegram, getUpdates не проходит через выключатель."""
+    # Arrange
+    breakers = CircuitBreakerRegistry(error_rate=0.5, min_requests=2, window=30, open_seconds=15)
+    middleware = CircuitBreakerMiddleware(breakers)
+    method = SendMessage(chat_id=1, text="hi")
+    bad_request = AsyncMock(side_effect=TelegramBadRequest(method, "chat not found"))
+    polling = AsyncMock(side_effect=TelegramNetworkError(GetUpdates(), "timeout"))
+
+    # Act
+    for _ in range(3):
+        with pytest.raises(TelegramBadRequest):
+            await middleware(bad_request, AsyncMock(), method)
+        with pytest.raises(TelegramNetworkError):
+            await middleware(polling, AsyncMock(), GetUpdates())
+
+    # Assert
+    assert breakers["sendMessage"].state == CLOSED
+    assert "getUpdates" not in dict(breakers.items())
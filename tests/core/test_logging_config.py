@@ -0,0 +1,134 @@
+import io
+import json
+import logging
+
+import pytest
+
+from app.core.logging_config import (
+    RELAY,
+    ErrorDeduplicator,
+    SamplingFilter,
+    configure_logging,
+    stop_logging,
+)
+
+
+def make_record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.makeLogRecord({"levelno": level, "msg": "message %s", "args": (1,)})
+    record.__dict__.update(extra)
+    return record
+
+
+def test_sampling_filter_keeps_share_of_category():
+    """
+    Тест: из записей категории сохраняется заданная доля, прочие записи не затрагиваются.
+    """
+    # Arrange
+    sampling = SamplingFilter({RELAY: 0.1})
+
+    # Act
+    relay_kept = sum(sampling.filter(make_record(category=RELAY)) for _ in range(100))
+    other_kept = sum(sampling.filter(make_record()) for _ in range(100))
+    warnings_kept = sum(
+        sampling.filter(make_record(logging.WARNING, category=RELAY)) for _ in range(100)
+    )
+
+    # Assert
+    assert relay_kept == 10
+    assert other_kept == 100
+    assert warnings_kept == 100
+
+
+def test_error_deduplicator_suppresses_repeats_within_window():
+    """
+    Тест: повторы ошибки из того же места подавляются до конца окна.
+    """
+    # Arrange
+    now = [0.0]
+    deduplicator = ErrorDeduplicator(window=60, clock=lambda: now[0])
+
+    def fail():
+        raise RuntimeError("Telegram is down")
+
+    errors = []
+    for _ in range(4):
+        try:
+            fail()
+        except RuntimeError as e:
+            errors.append(e)
+
+    # Act
+    first = deduplicator.check(errors[0])
+    repeats = [deduplicator.check(errors[1]), deduplicator.check(errors[2])]
+    now[0] = 61
+    after_window = deduplicator.check(errors[3])
+
+    # Assert
+    assert first == 0
+    assert repeats == [None, None]
+    assert after_window == 2
+
+
+def test_configure_logging_writes_json_in_background():
+    """
+    Тест: записи форматируются в JSON с полями из extra после сброса очереди.
+    """
+    # Arrange
+    stream = io.StringIO()
+    root = logging.getLogger()
+    previous_handlers, previous_level = root.handlers[:], root.level
+    configure_logging(level="INFO", json_format=True, stream=stream)
+
+    # Act
+    try:
+        logging.info("Forwarding message from user %s", 123, extra={"user_id": 123})
+    finally:
+        stop_logging()
+        root.handlers[:] = previous_handlers
+        root.setLevel(previous_level)
+
+    # Assert
+    payload = json.loads(stream.getvalue())
+    assert payload["message"] == "Forwarding message from user 123"
+    assert payload["level"] == "INFO"
+    assert payload["user_id"] == 123
+
+
+def test_queued_record_keeps_message_and_traceback_from_call_time():
+    """
+    Тест: сообщение и traceback строятся в момент вызова, а не в потоке записи,
+    поэтому последующее изменение аргументов не попадает в лог.
+    """
+    # Arrange
+    stream = io.StringIO()
+    root = logging.getLogger()
+    previous_handlers, previous_level = root.handlers[:], root.level
+    configure_logging(level="INFO", json_format=True, stream=stream)
+    pending = [1, 2]
+
+    # Act
+    try:
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logging.exception("Pending updates: %s", pending)
+        pending.append(3)
+    finally:
+        stop_logging()
+        root.handlers[:] = previous_handlers
+        root.setLevel(previous_level)
+
+    # Assert
+    payload = json.loads(stream.getvalue())
+    assert payload["message"] == "Pending updates: [1, 2]"
+    assert "RuntimeError: boom" in payload["exc_info"]
+
+
+@pytest.mark.parametrize("window", [0, -1])
+def test_error_deduplicator_disabled(window):
+    """Тест: при нулевом окне дедупликация отключена."""
+    deduplicator = ErrorDeduplicator(window=window)
+    error = RuntimeError("boom")
+
+    assert deduplicator.check(error) == 0
+    assert deduplicator.check(error) == 0
@@ -0,0 +1,38 @@
+import pytest
+
+from app.core.metrics import MetricsRegistry
+
+
+def test_registry_renders_prometheus_text():
+    """
+    Тест: метрики выдаются в текстовом формате Prometheus, сборщики вызываются перед выдачей.
+    """
+    # Arrange
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Handled requests", ("kind",))
+    depth = registry.gauge("queue_depth", "Queue depth")
+    registry.register_collector(lambda: depth.set(7))
+
+    # Act
+    requests.inc(kind="relay")
+    requests.inc(2, kind="relay")
+    text = registry.render()
+
+    # Assert
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{kind="relay"} 3' in text
+    assert "queue_depth 7" in text
+
+
+def test_registry_returns_existing_metric_and_validates_labels():
+    """
+    Тест: повторная регистрация возвращает ту же метрику, неверные метки отклоняются.
+    """
+    registry = MetricsRegistry()
+    gauge = registry.gauge("lag_seconds", "Loop lag", ("quantile",))
+
+    assert registry.gauge("lag_seconds", "Loop lag", ("quantile",)) is gauge
+    with pytest.raises(ValueError):
+        registry.counter("lag_seconds", "Loop lag", ("quantile",))
+    with pytest.raises(ValueError):
+        gauge.set(1.0, method="sendMessage")
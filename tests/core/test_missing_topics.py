@@ -0,0 +1,32 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import ForwardMessage, SendMessage
+
+from app.core.missing_topics import MissingTopicMiddleware, MissingTopicTracker
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_only_missing_topics():
+    """Тест: запоминаются темы с ошибкой «тема не найдена»; прочие ошибки и вызовы вне тем не учитываются."""
+    # Arrange
+    tracker = MissingTopicTracker()
+    middleware = MissingTopicMiddleware(tracker)
+    bot = AsyncMock()
+    to_missing_topic = ForwardMessage(chat_id=-100, message_thread_id=7, from_chat_id=1, message_id=1)
+    to_other_topic = SendMessage(chat_id=-100, message_thread_id=8, text="hi")
+    to_private_chat = SendMessage(chat_id=1, text="hi")
+
+    # Act
+    for method, message in (
+        (to_missing_topic, "Bad Request: message thread not found"),
+        (to_other_topic, "Bad Request: message is too long"),
+        (to_private_chat, "Bad Request: message thread not found"),
+    ):
+        with pytest.raises(TelegramBadRequest):
+            await middleware(AsyncMock(side_effect=TelegramBadRequest(method, message)), bot, method)
+
+    # Assert
+    assert tracker.drain() == {(-100, 7)}
+    assert len(tracker) == 0
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from app.core.rate_limiter import AsyncRateLimiter
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spreads_calls():
+    """
+    Тест: после исчерпания "ведра" вызовы распределяются с заданной частотой.
+    """
+    # Arrange
+    limiter = AsyncRateLimiter(rate=50, burst=5)
+
+    # Act
+    started = time.monotonic()
+    for _ in range(15):
+        await limiter.acquire()
+    elapsed = time.monotonic() - started
+
+    # Assert: 5 токенов сразу, еще 10 со скоростью 50/с -> не менее 0.2 с
+    assert elapsed >= 0.18
+
+
+def test_rate_limiter_rejects_invalid_rate():
+    """Тест: нулевая частота недопустима."""
+    with pytest.raises(ValueError):
+        AsyncRateLimiter(rate=0)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_pause_delays_next_call():
+    """
+    Тест: после `pause` следующий вызов ждет окончания паузы, даже если токены были.
+    """
+    # Arrange
+    limiter = AsyncRateLimiter(rate=1000, burst=10)
+
+    # Act
+    limiter.pause(0.2)
+    started = time.monotonic()
+    await limiter.acquire()
+    elapsed = time.monotonic() - started
+
+    # Assert
+    assert elapsed >= 0.18
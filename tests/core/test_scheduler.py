@@ -0,0 +1,103 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from app.core.scheduler import Priority, QueueOverflow, UpdateScheduler
+
+
+async def hold(scheduler: UpdateScheduler, priority: Priority, order: List[str], name: str, gate: asyncio.Event):
+    async with scheduler.slot(priority):
+        order.append(name)
+        await gate.wait()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_serves_higher_priority_first():
+    """
+    Тест: освободившийся слот получает ожидающий с наивысшим приоритетом,
+    внутри приоритета — в порядке прихода.
+    """
+    # Arrange
+    scheduler = UpdateScheduler(concurrency=1, queue_limit=10)
+    order: List[str] = []
+    gate = asyncio.Event()
+    tasks = [asyncio.create_task(hold(scheduler, Priority.NEW_SESSION, order, "busy", gate))]
+    await asyncio.sleep(0)
+    for name, priority in [
+        ("new-1", Priority.NEW_SESSION),
+        ("relay", Priority.RELAY),
+        ("new-2", Priority.NEW_SESSION),
+        ("agent", Priority.AGENT),
+    ]:
+        tasks.append(asyncio.create_task(hold(scheduler, priority, order, name, gate)))
+    await asyncio.sleep(0)
+    assert scheduler.queued == 4
+
+    # Act
+    gate.set()
+    await asyncio.gather(*tasks)
+
+    # Assert
+    assert order == ["busy", "agent", "relay", "new-1", "new-2"]
+    assert scheduler.running == 0
+    assert scheduler.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_sheds_lowest_priority_when_full():
+    """
+    Тест: при переполнении очереди вытесняется самое новое обновление с низшим приоритетом,
+    а обновления агентов принимаются всегда.
+    """
+    # Arrange
+    scheduler = UpdateScheduler(concurrency=1, queue_limit=2)
+    order: List[str] = []
+    gate = asyncio.Event()
+    busy = asyncio.create_task(hold(scheduler, Priority.AGENT, order, "busy", gate))
+    await asyncio.sleep(0)
+    new_1 = asyncio.create_task(hold(scheduler, Priority.NEW_SESSION, order, "new-1", gate))
+    new_2 = asyncio.create_task(hold(scheduler, Priority.NEW_SESSION, order, "new-2", gate))
+    await asyncio.sleep(0)
+
+    # Act
+    relay = asyncio.create_task(hold(scheduler, Priority.RELAY, order, "relay", gate))
+    await asyncio.sleep(0)
+    with pytest.raises(QueueOverflow):
+        await scheduler.acquire(Priority.NEW_SESSION)
+    agent = asyncio.create_task(hold(scheduler, Priority.AGENT, order, "agent", gate))
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(busy, new_1, new_2, relay, agent, return_exceptions=True)
+
+    # Assert
+    assert isinstance(results[2], QueueOverflow)
+    assert order == ["busy", "agent", "relay", "new-1"]
+    assert scheduler.running == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_cancelled_waiter_does_not_leak_slot():
+    """
+    Тест: отмена ожидающей задачи не занимает и не теряет слот.
+    """
+    # Arrange
+    scheduler = UpdateScheduler(concurrency=1, queue_limit=10)
+    order: List[str] = []
+    gate = asyncio.Event()
+    busy = asyncio.create_task(hold(scheduler, Priority.RELAY, order, "busy", gate))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(hold(scheduler, Priority.RELAY, order, "cancelled", gate))
+    await asyncio.sleep(0)
+
+    # Act
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    gate.set()
+    await busy
+    await hold(scheduler, Priority.RELAY, order, "next", gate)
+
+    # Assert
+    assert order == ["busy", "next"]
+    assert scheduler.running == 0
+    assert scheduler.queued == 0
@@ -0,0 +1,127 @@
+import asyncio
+import datetime
+import itertools
+import random
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import CreateForumTopic, DeleteForumTopic
+from aiogram.types import Chat, ForumTopic, Message, User
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.core import shutdown
+from app.core.background import start_background_task
+from app.core.shutdown import graceful_shutdown
+from app.handlers.user_handlers import handle_user_message
+from app.middlewares.inflight_middleware import InFlightMiddleware
+from app.models.models import SupportAgent, SupportSession
+
+
+class FakeBot(Bot):
+    """Бот со случайными задержками Bot API, отслеживающий существующие темы."""
+
+    def __init__(self):
+        super().__init__(token="42:TEST")
+        self.live_topics = set()
+        self._topic_ids = itertools.count(1000)
+
+    async def __call__(self, method, request_timeout=None):
+        await asyncio.sleep(random.uniform(0.05, 0.3))
+        if isinstance(method, CreateForumTopic):
+            topic_id = next(self._topic_ids)
+            self.live_topics.add(topic_id)
+            return ForumTopic(message_thread_id=topic_id, name=method.name, icon_color=1)
+        if isinstance(method, DeleteForumTopic):
+            self.live_topics.discard(method.message_thread_id)
+        return True
+
+
+def _user_message(user_id: int, bot: Bot) -> Message:
+    return Message(
+        message_id=user_id,
+        chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="User"),
+        text="Help!",
+        date=datetime.datetime.now(),
+        bot=bot,
+    )
+
+
+@pytest.mark.asyncio
+async def test_shutdown_during_load_leaves_consistent_state(tmp_path, mocker):
+    """
+    Тест: остановка посреди потока новых сессий не оставляет заблокированных
+    агентов без сессий и тем без сессий, а новые обновления не принимаются.
+    """
+    # Arrange
+    random.seed(7)
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'shutdown.db'}",
+        connect_args={"check_same_thread": False},
+        max_overflow=-1,  # как у движка приложения
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([SupportAgent(telegram_id=agent_id) for agent_id in range(1, 21)])
+        session.commit()
+    mocker.patch("app.core.shutdown.engine")
+    mocker.patch("app.services.session_service.idle_tracker")
+    bot = FakeBot()
+    inflight = InFlightMiddleware()
+
+    async def handler(event, data):
+        with Session(engine) as session:
+            await handle_user_message(event, bot=bot, session=session)
+
+    # Act: 40 пользователей одновременно пишут, посреди обработки приходит SIGTERM
+    load = [
+        asyncio.create_task(inflight(handler, _user_message(user_id, bot), {}))
+        for user_id in range(100, 140)
+    ]
+    await asyncio.sleep(0.1)
+    cancelled = await graceful_shutdown(inflight, timeout=0.15)
+    late_result = await inflight(handler, _user_message(999, bot), {})
+    await asyncio.gather(*load, return_exceptions=True)
+
+    # Assert
+    assert cancelled > 0  # часть хэндлеров прервана посреди create_new_session
+    assert late_result is None
+    assert inflight.in_flight == 0
+    with Session(engine) as session:
+        agents = session.exec(select(SupportAgent)).all()
+        active = session.exec(
+            select(SupportSession).where(SupportSession.status == "active")
+        ).all()
+    busy_agents = {agent.telegram_id for agent in agents if not agent.is_available}
+    assert busy_agents == {s.agent_telegram_id for s in active}
+    assert bot.live_topics == {s.topic_id for s in active}
+    assert 999 not in {s.user_telegram_id for s in active}
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_stop_callbacks_run_before_waiting_for_jobs(mocker):
+    """
+    Тест: колбэки остановки вызываются до ожидания фоновых задач, поэтому долгая
+    работа завершается сама и успевает сохранить результат, а колбэки сброса — после.
+    """
+    # Arrange
+    mocker.patch("app.core.shutdown.engine")
+    mocker.patch.object(shutdown, "_stop_callbacks", [])
+    mocker.patch.object(shutdown, "_flush_callbacks", [])
+    stop = asyncio.Event()
+    saved = []
+
+    async def long_job():
+        await stop.wait()
+        saved.append("job")
+
+    start_background_task(long_job(), name="long-job")
+    shutdown.register_stop_callback(stop.set)
+    shutdown.register_flush_callback(lambda: saved.append("flush"))
+
+    # Act
+    await graceful_shutdown(InFlightMiddleware(), timeout=5)
+
+    # Assert
+    assert saved == ["job", "flush"]
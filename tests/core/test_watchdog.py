@@ -0,0 +1,63 @@
+import asyncio
+import datetime
+import logging
+import time
+
+import pytest
+from aiogram.types import Chat, Message, Update, User
+
+from app.core.watchdog import LoopWatchdog, describe_event
+
+
+def blocking_db_call(seconds: float) -> None:
+    """Имитация синхронного запроса к БД, блокирующего event loop."""
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_reports_blocking_stack_and_update(caplog):
+    """
+    Тест: при блокировке event loop в лог попадают стек блокирующего кода и обрабатываемое обновление.
+    """
+    # Arrange
+    update = Update(
+        update_id=77,
+        message=Message(
+            message_id=1,
+            chat=Chat(id=555, type="private"),
+            from_user=User(id=555, is_bot=False, first_name="John"),
+            text="hello",
+            date=datetime.datetime.now(),
+        ),
+    )
+    tasks = {}
+    watchdog = LoopWatchdog(threshold=0.15, interval=0.02, resolve_event=tasks.get)
+    monitor = asyncio.create_task(watchdog.monitor())
+    watchdog.start()
+
+    async def handler() -> None:
+        tasks[asyncio.current_task()] = update
+        blocking_db_call(0.4)
+
+    # Act
+    with caplog.at_level(logging.WARNING):
+        await asyncio.sleep(0.05)
+        await asyncio.create_task(handler(), name="handler-77")
+        await asyncio.sleep(0.05)
+    watchdog.stop()
+    monitor.cancel()
+    await asyncio.gather(monitor, return_exceptions=True)
+
+    # Assert
+    reports = [r.getMessage() for r in caplog.records if "Stack:" in r.getMessage()]
+    assert len(reports) == 1
+    assert "blocking_db_call" in reports[0]
+    assert "handler-77" in reports[0]
+    assert "update 77 (message, chat 555, user 555)" in reports[0]
+    assert watchdog.stalls == 1
+    assert watchdog.percentiles()[1.0] >= 0.3
+
+
+def test_describe_event_without_update():
+    """Тест: блокировка вне обработки обновления описывается явно."""
+    assert describe_event(None) == "no update"
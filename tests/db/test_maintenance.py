@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import text
+from sqlmodel import SQLModel, create_engine
+
+from app.db.maintenance import MaintenanceScheduler, enable_incremental_vacuum, run_maintenance
+
+
+@pytest.fixture(name="file_engine")
+def file_engine_fixture(tmp_path):
+    """БД в файле: VACUUM и WAL для in-memory БД не работают."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'maintenance.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def fragment(engine) -> None:
+    """Заполняет таблицу и удаляет строки, оставляя в файле свободные страницы."""
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE junk (payload TEXT)"))
+        connection.execute(
+            text("INSERT INTO junk VALUES (:payload)"), [{"payload": "x" * 1000} for _ in range(500)]
+        )
+        connection.execute(text("DELETE FROM junk"))
+
+
+def test_incremental_vacuum_frees_pages_and_collects_statistics(file_engine):
+    """
+    Тест: после перевода БД в режим incremental обслуживание возвращает
+    свободные страницы ОС и собирает статистику, а затем только оптимизирует ее.
+    """
+    # Arrange
+    assert enable_incremental_vacuum(file_engine) is True
+    assert enable_incremental_vacuum(file_engine) is False
+    fragment(file_engine)
+
+    # Act
+    first = run_maintenance(file_engine, vacuum_pages=10_000)
+    second = run_maintenance(file_engine, vacuum_pages=10_000)
+
+    # Assert
+    assert first.vacuumed_pages > 100
+    assert first.stats.freelist_count == 0
+    assert first.analyzed is True
+    assert first.checkpoint_seconds is None
+    assert second.analyzed is False
+    assert second.vacuumed_pages == 0
+
+
+def test_maintenance_without_incremental_mode_does_not_vacuum(file_engine):
+    """Тест: без перевода БД в режим incremental (DB_INCREMENTAL_VACUUM) страницы не освобождаются."""
+    # Arrange
+    fragment(file_engine)
+
+    # Act
+    report = run_maintenance(file_engine, vacuum_pages=10_000)
+
+    # Assert
+    assert report.vacuumed_pages == 0
+    assert report.stats.freelist_count > 0
+
+
+def test_vacuum_is_limited_per_run_and_checkpoint_runs_in_wal_mode(file_engine):
+    """Тест: за один запуск освобождается не больше заданного числа страниц; в WAL выполняется checkpoint."""
+    # Arrange
+    enable_incremental_vacuum(file_engine)
+    with file_engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA journal_mode = WAL")
+    fragment(file_engine)
+
+    # Act
+    report = run_maintenance(file_engine, vacuum_pages=10)
+
+    # Assert
+    assert report.vacuumed_pages == 10
+    assert report.stats.fragmentation > 0
+    assert report.checkpoint_seconds is not None
+
+
+@pytest.mark.asyncio
+async def test_scheduler_waits_for_interval_and_idle_bot(file_engine):
+    """Тест: обслуживание откладывается под нагрузкой и выполняется не чаще интервала."""
+    # Arrange
+    now = [0.0]
+    busy = [True]
+    scheduler = MaintenanceScheduler(
+        file_engine, interval=100, vacuum_pages=10, is_busy=lambda: busy[0], clock=lambda: now[0]
+    )
+
+    # Act
+    postponed = await scheduler.tick()
+    busy[0] = False
+    first = await scheduler.tick()
+    now[0] = 50
+    too_early = await scheduler.tick()
+    now[0] = 100
+    second = await scheduler.tick()
+
+    # Assert
+    assert postponed is None
+    assert first is not None
+    assert too_early is None
+    assert second is not None
+    assert scheduler.last_report is second
@@ -0,0 +1,133 @@
+from pydantic import SecretStr
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.db import session as db_session
+from app.models.models import MessageLink, SupportSession
+
+
+def test_migrate_tables_moves_old_sessions_to_main_group_and_bot(tmp_path, mocker):
+    """
+    Тест: старая таблица без chat_id пересоздается, данные сохраняются.
+    """
+    # Arrange: схема до поддержки нескольких супергрупп
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE supportsession ("
+            "id INTEGER PRIMARY KEY, user_telegram_id INTEGER NOT NULL, "
+            "agent_telegram_id INTEGER NOT NULL, topic_id INTEGER NOT NULL UNIQUE, "
+            "status VARCHAR NOT NULL, created_at DATETIME NOT NULL, closed_at DATETIME)"
+        ))
+        connection.execute(text("CREATE INDEX ix_supportsession_status ON supportsession (status)"))
+        connection.execute(text(
+            "INSERT INTO supportsession VALUES (1, 123, 456, 101, 'active', '2024-01-01 10:00:00', NULL)"
+        ))
+    mocker.patch.object(db_session, "engine", engine)
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -100500)
+    mocker.patch("app.core.config.settings.BOT_TOKEN", SecretStr("777:TOKEN"))
+
+    # Act
+    SQLModel.metadata.create_all(engine)
+    db_session.migrate_tables()
+    db_session.add_missing_columns()
+
+    # Assert
+    with Session(engine) as session:
+        migrated = session.get(SupportSession, 1)
+        assert migrated.topic_key == (-100500, 101)
+        assert migrated.bot_id == 777
+        assert migrated.first_response_at is None
+        # Одинаковый ID темы в другой группе теперь допустим
+        session.add(SupportSession(user_telegram_id=124, agent_telegram_id=456, chat_id=-1, topic_id=101))
+        session.commit()
+    engine.dispose()
+
+
+def test_migrate_tables_replaces_topic_constraint_with_partial_index(tmp_path, mocker):
+    """
+    Тест: уникальность пары (chat_id, topic_id) действует только для активных сессий.
+    """
+    # Arrange: схема с уникальным ограничением на тему
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE supportsession ("
+            "id INTEGER PRIMARY KEY, user_telegram_id INTEGER NOT NULL, "
+            "agent_telegram_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, topic_id INTEGER NOT NULL, "
+            "bot_id INTEGER NOT NULL, status VARCHAR NOT NULL, created_at DATETIME NOT NULL, "
+            "first_response_at DATETIME, closed_at DATETIME, "
+            "CONSTRAINT uq_supportsession_chat_topic UNIQUE (chat_id, topic_id))"
+        ))
+        connection.execute(text(
+            "INSERT INTO supportsession VALUES "
+            "(1, 123, 456, -100, 101, 777, 'closed', '2024-01-01 10:00:00', NULL, NULL)"
+        ))
+    mocker.patch.object(db_session, "engine", engine)
+
+    # Act
+    SQLModel.metadata.create_all(engine)
+    db_session.migrate_tables()
+
+    # Assert
+    with Session(engine) as session:
+        session.add(SupportSession(user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=101))
+        session.commit()
+        session.add(SupportSession(user_telegram_id=124, agent_telegram_id=456, chat_id=-100, topic_id=101))
+        with pytest.raises(IntegrityError):
+            session.commit()
+    engine.dispose()
+
+
+def test_migrate_tables_adds_bot_to_message_link_key(tmp_path, mocker):
+    """
+    Тест: связи сообщений получают bot_id в первичном ключе, старые связи относятся к основному боту.
+    """
+    # Arrange: схема с ключом (chat_id, message_id)
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE messagelink ("
+            "chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, "
+            "peer_chat_id INTEGER NOT NULL, peer_message_id INTEGER NOT NULL, created_at DATETIME NOT NULL, "
+            "PRIMARY KEY (chat_id, message_id))"
+        ))
+        connection.execute(text("CREATE INDEX ix_messagelink_created_at ON messagelink (created_at)"))
+        connection.execute(text("INSERT INTO messagelink VALUES (123, 1, -100, 50, '2024-01-01 10:00:00')"))
+    mocker.patch.object(db_session, "engine", engine)
+    mocker.patch("app.core.config.settings.BOT_TOKEN", SecretStr("777:TOKEN"))
+
+    # Act
+    SQLModel.metadata.create_all(engine)
+    db_session.migrate_tables()
+
+    # Assert
+    with Session(engine) as session:
+        assert session.get(MessageLink, (777, 123, 1)).peer_message_id == 50
+        # То же сообщение личного чата у другого бота — отдельная связь
+        session.add(MessageLink(bot_id=778, chat_id=123, message_id=1, peer_chat_id=-100, peer_message_id=70))
+        session.commit()
+    engine.dispose()
+
+
+def test_create_missing_indexes_adds_new_index_to_existing_table(tmp_path, mocker):
+    """
+    Тест: индекс, добавленный в модель позже, создается в существующей таблице.
+    """
+    # Arrange: таблица создана до появления индекса активных сессий пользователя
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_supportsession_active_user"))
+    mocker.patch.object(db_session, "engine", engine)
+
+    # Act
+    db_session.create_missing_indexes()
+    db_session.create_missing_indexes()
+
+    # Assert
+    indexes = {index["name"] for index in inspect(engine).get_indexes("supportsession")}
+    assert "ix_supportsession_active_user" in indexes
+    engine.dispose()
@@ -0,0 +1,33 @@
+from sqlmodel import Session
+
+from app.db.queries import ActiveSessionRow, active_session_for_user, active_session_in_topic
+from app.models.models import SupportAgent, SupportSession
+
+
+def test_active_session_lookups_return_rows_of_active_sessions_only(session: Session):
+    """
+    Тест: запросы горячего пути находят только активную сессию и не создают ORM-объектов.
+    """
+    # Arrange
+    session.add(SupportAgent(telegram_id=456))
+    session.add_all(
+        [
+            SupportSession(user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=7, status="closed"),
+            SupportSession(user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=8, bot_id=42),
+            SupportSession(user_telegram_id=124, agent_telegram_id=456, chat_id=-200, topic_id=7),
+        ]
+    )
+    session.commit()
+    session.expunge_all()
+
+    # Act
+    by_user = active_session_for_user(session, 123)
+    by_topic = active_session_in_topic(session, -200, 7)
+
+    # Assert
+    assert isinstance(by_user, ActiveSessionRow)
+    assert (by_user.topic_key, by_user.agent_telegram_id, by_user.bot_id) == ((-100, 8), 456, 42)
+    assert by_topic.user_telegram_id == 124
+    assert active_session_in_topic(session, -100, 7) is None
+    assert active_session_for_user(session, 999) is None
+    assert len(session.identity_map) == 0
@@ -0,0 +1,70 @@
+import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.filters import CommandObject
+from aiogram.types import Chat, Message, User
+from sqlmodel import Session
+
+from app.handlers.admin_handlers import (
+    handle_close_agent_command,
+    handle_reassign_command,
+)
+from app.services import bulk_service
+
+
+def _admin_message(text: str, bot) -> Message:
+    return Message(
+        message_id=1,
+        chat=Chat(id=1, type="private"),
+        from_user=User(id=1, is_bot=False, first_name="Admin"),
+        text=text,
+        date=datetime.datetime.now(),
+        bot=bot,
+    )
+
+
+@pytest.mark.asyncio
+async def test_close_agent_command_reports_result(session: Session, mocker):
+    """
+    Тест: /close_agent вызывает массовое закрытие и присылает отчет.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    mocker.patch.object(
+        bulk_service,
+        "close_sessions_bulk",
+        return_value=bulk_service.BulkOperationResult(total=3, succeeded=3),
+    )
+    answer_mock = mocker.patch("aiogram.types.Message.answer", new_callable=AsyncMock)
+    message = _admin_message("/close_agent 456", mock_bot)
+
+    # Act
+    await handle_close_agent_command(
+        message, CommandObject(command="close_agent", args="456"), bot=mock_bot, session=session
+    )
+
+    # Assert
+    assert bulk_service.close_sessions_bulk.await_args.kwargs["agent_telegram_id"] == 456
+    answer_mock.assert_awaited_with("✅ Закрытие сессий агента: успешно 3 из 3.")
+
+
+@pytest.mark.asyncio
+async def test_reassign_command_invalid_args(session: Session, mocker):
+    """
+    Тест: /reassign с некорректными аргументами выводит подсказку.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    mocker.patch.object(bulk_service, "reassign_sessions_bulk")
+    answer_mock = mocker.patch("aiogram.types.Message.answer", new_callable=AsyncMock)
+    message = _admin_message("/reassign abc", mock_bot)
+
+    # Act
+    await handle_reassign_command(
+        message, CommandObject(command="reassign", args="abc"), bot=mock_bot, session=session
+    )
+
+    # Assert
+    bulk_service.reassign_sessions_bulk.assert_not_awaited()
+    answer_mock.assert_awaited_once_with("Использование: /reassign <from_agent_id> <to_agent_id>")
@@ -2,12 +2,13 @@ import datetime
 from unittest.mock import AsyncMock
 
 import pytest
-from aiogram.types import User, Chat, Message
+from aiogram.types import User, Chat, Message, MessageId
 from sqlmodel import Session
 
-from app.handlers.agent_handlers import handle_close_chat_command, handle_agent_message
+from app.core.config import settings
+from app.handlers.agent_handlers import handle_agent_edit, handle_agent_message, handle_close_chat_command
 from app.models.models import SupportSession, SupportAgent
-from app.services import session_service
+from app.services import message_link_service, session_service
 
 
 @pytest.mark.asyncio
@@ -16,13 +17,14 @@ async def test_close_chat_success(session: Session, mocker):
     Тест: Агент успешно закрывает назначенную на него сессию.
     """
     # Arrange
-    mock_bot = AsyncMock()
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
     mocker.patch.object(session_service, "close_session", return_value=True)
 
     agent = SupportAgent(telegram_id=456, is_active=True, is_available=False)
     active_session = SupportSession(
         user_telegram_id=123,
         agent_telegram_id=agent.telegram_id,
+        chat_id=-100,
         topic_id=101,
         status="active",
     )
@@ -52,19 +54,52 @@ async def test_close_chat_success(session: Session, mocker):
     )
 
 
+@pytest.mark.asyncio
+async def test_close_chat_without_session_answered_by_primary_bot_only(session: Session, mocker):
+    """
+    Тест: если в теме нет активной сессии, на /close_chat отвечает только основной бот,
+    остальные боты группы молчат.
+    """
+    # Arrange
+    primary_bot = AsyncMock(id=settings.primary_bot_id)
+    other_bot = AsyncMock(id=settings.primary_bot_id + 1)
+    reply_mock = mocker.patch("aiogram.types.Message.reply", new_callable=AsyncMock)
+
+    def close_chat(bot) -> Message:
+        return Message(
+            message_id=1,
+            chat=Chat(id=-100, type="supergroup"),
+            from_user=User(id=456, is_bot=False, first_name="Agent"),
+            message_thread_id=100,
+            text="/close_chat",
+            date=datetime.datetime.now(),
+            bot=bot,
+        )
+
+    # Act
+    await handle_close_chat_command(close_chat(other_bot), bot=other_bot, session=session)
+    await handle_close_chat_command(close_chat(primary_bot), bot=primary_bot, session=session)
+
+    # Assert
+    reply_mock.assert_awaited_once_with("⚠️ Не найдено активной сессии в этой теме.")
+
+
 @pytest.mark.asyncio
 async def test_close_chat_wrong_agent(session: Session, mocker):
     """
     Тест: Агент пытается закрыть сессию, назначенную на другого агента.
     """
     # Arrange
-    mock_bot = AsyncMock()
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
     mocker.patch.object(session_service, "close_session")
 
     assigned_agent = SupportAgent(telegram_id=456, is_active=True)
     another_agent = SupportAgent(telegram_id=789, is_active=True)
     active_session = SupportSession(
-        user_telegram_id=123, agent_telegram_id=assigned_agent.telegram_id, topic_id=101
+        user_telegram_id=123,
+        agent_telegram_id=assigned_agent.telegram_id,
+        chat_id=-100,
+        topic_id=101,
     )
     session.add_all([assigned_agent, another_agent, active_session])
     session.commit()
@@ -98,10 +133,14 @@ async def test_agent_message_forwarded_to_user(session: Session, mocker):
     Тест: Сообщение от назначенного агента успешно пересылается пользователю.
     """
     # Arrange
-    mock_bot = AsyncMock()
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+    mock_bot.copy_message.return_value = MessageId(message_id=50)
     agent = SupportAgent(telegram_id=456, is_active=True)
     active_session = SupportSession(
-        user_telegram_id=123, agent_telegram_id=agent.telegram_id, topic_id=101
+        user_telegram_id=123,
+        agent_telegram_id=agent.telegram_id,
+        chat_id=-100,
+        topic_id=101,
     )
     session.add_all([agent, active_session])
     session.commit()
@@ -124,6 +163,7 @@ async def test_agent_message_forwarded_to_user(session: Session, mocker):
         chat_id=active_session.user_telegram_id,
         from_chat_id=message.chat.id,
         message_id=message.message_id,
+        reply_parameters=None,
     )
 
 
@@ -133,11 +173,14 @@ async def test_agent_message_from_wrong_agent_ignored(session: Session, mocker):
     Тест: Сообщение от другого агента (не назначенного) игнорируется.
     """
     # Arrange
-    mock_bot = AsyncMock()
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
     assigned_agent = SupportAgent(telegram_id=456, is_active=True)
     another_agent = SupportAgent(telegram_id=789, is_active=True)
     active_session = SupportSession(
-        user_telegram_id=123, agent_telegram_id=assigned_agent.telegram_id, topic_id=101
+        user_telegram_id=123,
+        agent_telegram_id=assigned_agent.telegram_id,
+        chat_id=-100,
+        topic_id=101,
     )
     session.add_all([assigned_agent, another_agent, active_session])
     session.commit()
@@ -167,7 +210,7 @@ async def test_agent_message_in_topic_with_no_session_ignored(session: Session,
     Тест: Сообщение в теме без активной сессии игнорируется.
     """
     # Arrange
-    mock_bot = AsyncMock()
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
     agent = SupportAgent(telegram_id=456, is_active=True)
     session.add(agent)
     session.commit()
@@ -187,3 +230,160 @@ async def test_agent_message_in_topic_with_no_session_ignored(session: Session,
 
     # Assert
     mock_bot.copy_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_agent_message_records_first_response(session: Session, mocker):
+    """
+    Тест: первый ответ агента фиксируется в сессии для SLA-статистики.
+    """
+    # Arrange
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+    mock_bot.copy_message.return_value = MessageId(message_id=50)
+    agent = SupportAgent(telegram_id=456, is_active=True)
+    active_session = SupportSession(
+        user_telegram_id=123,
+        agent_telegram_id=agent.telegram_id,
+        chat_id=-100,
+        topic_id=101,
+    )
+    session.add_all([agent, active_session])
+    session.commit()
+
+    message = Message(
+        message_id=5,
+        chat=Chat(id=-100, type="supergroup"),
+        from_user=User(id=agent.telegram_id, is_bot=False, first_name="Agent"),
+        message_thread_id=active_session.topic_id,
+        text="Hello!",
+        date=datetime.datetime.now(),
+        bot=mock_bot,
+    )
+
+    # Act
+    await handle_agent_message(message, bot=mock_bot, session=session)
+
+    # Assert
+    session.refresh(active_session)
+    assert active_session.first_response_at is not None
+
+
+@pytest.mark.asyncio
+async def test_agent_message_routed_by_chat_and_topic(session: Session):
+    """
+    Тест: одинаковые ID тем в разных супергруппах не путаются.
+    """
+    # Arrange
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+    mock_bot.copy_message.return_value = MessageId(message_id=50)
+    agent = SupportAgent(telegram_id=456, is_active=True)
+    session.add_all(
+        [
+            agent,
+            SupportSession(user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=7),
+            SupportSession(user_telegram_id=124, agent_telegram_id=456, chat_id=-200, topic_id=7),
+        ]
+    )
+    session.commit()
+
+    message = Message(
+        message_id=5,
+        chat=Chat(id=-200, type="supergroup"),
+        from_user=User(id=agent.telegram_id, is_bot=False, first_name="Agent"),
+        message_thread_id=7,
+        text="Answer",
+        date=datetime.datetime.now(),
+        bot=mock_bot,
+    )
+
+    # Act
+    await handle_agent_message(message, bot=mock_bot, session=session)
+
+    # Assert
+    mock_bot.copy_message.assert_awaited_once_with(
+        chat_id=124, from_chat_id=-200, message_id=5, reply_parameters=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_agent_message_ignored_by_other_bot(session: Session):
+    """
+    Тест: сообщение агента пересылает только бот сессии, остальные боты группы его игнорируют.
+    """
+    # Arrange
+    session_bot = AsyncMock(id=1001)
+    session_bot.copy_message.return_value = MessageId(message_id=50)
+    other_bot = AsyncMock(id=1002)
+    agent = SupportAgent(telegram_id=456, is_active=True)
+    session.add_all(
+        [
+            agent,
+            SupportSession(
+                user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=7, bot_id=1001
+            ),
+        ]
+    )
+    session.commit()
+
+    message = Message(
+        message_id=5,
+        chat=Chat(id=-100, type="supergroup"),
+        from_user=User(id=agent.telegram_id, is_bot=False, first_name="Agent"),
+        message_thread_id=7,
+        text="Answer",
+        date=datetime.datetime.now(),
+    )
+
+    # Act
+    await handle_agent_message(message, bot=other_bot, session=session)
+    await handle_agent_message(message, bot=session_bot, session=session)
+
+    # Assert
+    other_bot.copy_message.assert_not_awaited()
+    other_bot.send_message.assert_not_awaited()
+    session_bot.copy_message.assert_awaited_once_with(
+        chat_id=123, from_chat_id=-100, message_id=5, reply_parameters=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_agent_reply_and_edit_relayed_to_user_copy(session: Session):
+    """
+    Тест: ответ агента на пересланное сообщение остается ответом у пользователя,
+    а правка сообщения агента применяется к его копии.
+    """
+    # Arrange
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+    mock_bot.copy_message.return_value = MessageId(message_id=70)
+    session.add_all(
+        [
+            SupportAgent(telegram_id=456, is_active=True),
+            SupportSession(user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=101),
+        ]
+    )
+    session.commit()
+    # Сообщение пользователя 10 было переслано в тему как сообщение 50
+    message_link_service.link_messages(session, settings.primary_bot_id, (123, 10), (-100, 50))
+    chat = Chat(id=-100, type="supergroup")
+    agent = User(id=456, is_bot=False, first_name="Agent")
+    reply = Message(
+        message_id=51,
+        chat=chat,
+        from_user=agent,
+        message_thread_id=101,
+        is_topic_message=True,
+        reply_to_message=Message(message_id=50, chat=chat, date=datetime.datetime.now(), text="Help"),
+        text="Answer",
+        date=datetime.datetime.now(),
+    )
+    edited = reply.model_copy(update={"text": "Fixed answer"})
+
+    # Act
+    await handle_agent_message(reply, bot=mock_bot, session=session)
+    await handle_agent_edit(edited, bot=mock_bot, session=session)
+
+    # Assert
+    assert mock_bot.copy_message.await_args.kwargs["reply_parameters"].message_id == 10
+    mock_bot.edit_message_text.assert_awaited_once_with(
+        chat_id=123, message_id=70, text="Fixed answer", entities=None, parse_mode=None
+    )
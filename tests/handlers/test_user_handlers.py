@@ -2,12 +2,18 @@ import datetime
 from unittest.mock import AsyncMock
 
 import pytest
-from aiogram.types import User, Chat, Message
+from aiogram.types import CallbackQuery, User, Chat, Message, MessageId
 from sqlmodel import Session
 
-from app.handlers.user_handlers import handle_user_message
+from app.handlers.user_handlers import (
+    CHOOSE_TOPIC_TEXT,
+    USER_EDITED_TEXT,
+    handle_topic_choice,
+    handle_user_edit,
+    handle_user_message,
+)
 from app.models.models import SupportSession
-from app.services import session_service
+from app.services import message_link_service, session_service
 
 
 @pytest.mark.asyncio
@@ -24,6 +30,7 @@ async def test_start_new_session_handler_success(session: Session, mocker):
         ),
     )
     mock_bot = AsyncMock()
+    mock_bot.forward_message.return_value = MessageId(message_id=50)
     answer_mock = mocker.patch("aiogram.types.Message.answer", new_callable=AsyncMock)
 
     mock_message = Message(
@@ -52,9 +59,10 @@ async def test_forward_message_in_existing_session(session: Session, mocker):
     """
     # Arrange
     mock_bot = AsyncMock()
+    mock_bot.forward_message.return_value = MessageId(message_id=50)
     user = User(id=123, is_bot=False, first_name="John")
     chat = Chat(id=123, type="private")
-    mocker.patch("app.handlers.user_handlers.settings.SUPERGROUP_ID", -100987654321)
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -100987654321)
     session.add(
         SupportSession(
             user_telegram_id=user.id,
@@ -114,3 +122,91 @@ async def test_start_new_session_no_agents_available(session: Session, mocker):
         "Пожалуйста, попробуйте написать позже."
     )
     mock_bot.forward_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_topic_menu_routes_session_by_language_and_topic(session: Session, mocker):
+    """
+    Тест: при настроенных темах сессия создается после выбора темы с маршрутом (язык, тема),
+    а первое сообщение пользователя пересылается в созданную тему.
+    """
+    # Arrange
+    mocker.patch("app.core.config.settings.SUPPORT_TOPICS", {"billing": "Оплата"})
+    create_mock = mocker.patch.object(
+        session_service,
+        "create_new_session",
+        return_value=SupportSession(
+            id=1, chat_id=-100, topic_id=100, user_telegram_id=123, agent_telegram_id=456
+        ),
+    )
+    mock_bot = AsyncMock()
+    mock_bot.forward_message.return_value = MessageId(message_id=50)
+    answer_mock = mocker.patch("aiogram.types.Message.answer", new_callable=AsyncMock)
+    mocker.patch("aiogram.types.CallbackQuery.answer", new_callable=AsyncMock)
+    user = User(id=123, is_bot=False, first_name="John", language_code="ru-RU")
+    message = Message(
+        message_id=7,
+        chat=Chat(id=123, type="private"),
+        from_user=user,
+        text="Не проходит оплата",
+        date=datetime.datetime.now(),
+        bot=mock_bot,
+    )
+    callback = CallbackQuery(
+        id="1", from_user=user, chat_instance="1", data="topic:billing"
+    )
+
+    # Act
+    await handle_user_message(message, bot=mock_bot, session=session)
+    create_mock.assert_not_called()
+    await handle_topic_choice(callback, bot=mock_bot, session=session)
+
+    # Assert
+    assert answer_mock.await_args.args[0] == CHOOSE_TOPIC_TEXT
+    assert create_mock.call_args.kwargs["route"] == ("ru", "billing")
+    mock_bot.forward_message.assert_awaited_once_with(
+        chat_id=-100, from_chat_id=123, message_id=7, message_thread_id=100
+    )
+
+
+@pytest.mark.asyncio
+async def test_user_reply_and_edit_relayed_to_topic(session: Session):
+    """
+    Тест: ответ пользователя на копию сообщения агента копируется в тему ответом
+    на оригинал, а об изменении сообщения агент узнает ответом на его копию.
+    """
+    # Arrange
+    mock_bot = AsyncMock(id=42)
+    mock_bot.copy_message.return_value = MessageId(message_id=60)
+    mock_bot.send_message.return_value = MessageId(message_id=61)
+    session.add(
+        SupportSession(user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=101, status="active")
+    )
+    session.commit()
+    # Сообщение агента 155 было скопировано пользователю как сообщение 9
+    message_link_service.link_messages(session, 42, (-100, 155), (123, 9))
+    chat = Chat(id=123, type="private")
+    user = User(id=123, is_bot=False, first_name="John")
+    message = Message(
+        message_id=10,
+        chat=chat,
+        from_user=user,
+        reply_to_message=Message(message_id=9, chat=chat, date=datetime.datetime.now(), text="Answer"),
+        text="Thanks",
+        date=datetime.datetime.now(),
+    )
+    edited = message.model_copy(update={"text": "Thanks a lot"})
+
+    # Act
+    await handle_user_message(message, bot=mock_bot, session=session)
+    await handle_user_edit(edited, bot=mock_bot, session=session)
+
+    # Assert
+    mock_bot.forward_message.assert_not_awaited()
+    copy_kwargs = mock_bot.copy_message.await_args.kwargs
+    assert copy_kwargs["message_thread_id"] == 101
+    assert copy_kwargs["reply_parameters"].message_id == 155
+    notice_kwargs = mock_bot.send_message.await_args.kwargs
+    assert notice_kwargs["text"] == f"{USER_EDITED_TEXT}\n\nThanks a lot"
+    assert notice_kwargs["reply_parameters"].message_id == 60
+    assert message_link_service.find_peer(session, 42, -100, 61) == (123, 10)
@@ -0,0 +1,82 @@
+import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.types import Chat, Message, Update, User
+
+from app.core.config import settings
+from app.core.scheduler import Priority, UpdateScheduler
+from app.middlewares.scheduler_middleware import (
+    OVERLOADED_TEXT,
+    SchedulerMiddleware,
+    classify_update,
+)
+from app.services.idle_service import idle_tracker
+
+
+def make_update(chat_id: int, user_id: int, chat_type: str = "private", update_id: int = 1) -> Update:
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            chat=Chat(id=chat_id, type=chat_type),
+            from_user=User(id=user_id, is_bot=False, first_name="John"),
+            text="hello",
+            date=datetime.datetime.now(),
+        ),
+    )
+
+
+def test_classify_update_by_sender_and_session():
+    """
+    Тест: сообщения агентов — высший приоритет, сообщения в активных сессиях — выше новых сессий.
+    """
+    idle_tracker.register((settings.SUPERGROUP_ID, 77), 555)
+    try:
+        assert classify_update(make_update(settings.SUPERGROUP_ID, 987654321, "supergroup")) == Priority.AGENT
+        assert classify_update(make_update(settings.ADMIN_ID, settings.ADMIN_ID)) == Priority.AGENT
+        assert classify_update(make_update(555, 555)) == Priority.RELAY
+        assert classify_update(make_update(556, 556)) == Priority.NEW_SESSION
+    finally:
+        idle_tracker.forget((settings.SUPERGROUP_ID, 77))
+
+
+@pytest.mark.asyncio
+async def test_scheduler_middleware_sheds_with_friendly_reply():
+    """
+    Тест: при переполненной очереди новое обращение не обрабатывается,
+    пользователь получает одно уведомление о нагрузке.
+    """
+    # Arrange
+    scheduler = UpdateScheduler(concurrency=1, queue_limit=0)
+    await scheduler.acquire(Priority.AGENT)  # слот занят
+    middleware = SchedulerMiddleware(scheduler)
+    handler = AsyncMock()
+    bot = AsyncMock()
+
+    # Act
+    for update_id in range(3):
+        await middleware(handler, make_update(556, 556, update_id=update_id), {"bot": bot})
+
+    # Assert
+    handler.assert_not_awaited()
+    bot.send_message.assert_awaited_once_with(556, OVERLOADED_TEXT)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_middleware_runs_handler_in_slot():
+    """
+    Тест: при свободном слоте хэндлер вызывается, слот освобождается после обработки.
+    """
+    # Arrange
+    scheduler = UpdateScheduler(concurrency=1, queue_limit=10)
+    middleware = SchedulerMiddleware(scheduler)
+    handler = AsyncMock(return_value="ok")
+
+    # Act
+    result = await middleware(handler, make_update(556, 556), {"bot": AsyncMock()})
+
+    # Assert
+    assert result == "ok"
+    handler.assert_awaited_once()
+    assert scheduler.running == 0
@@ -0,0 +1,143 @@
+import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from app.middlewares.throttling_middleware import (
+    THROTTLED_CALLBACK_TEXT,
+    THROTTLED_TEXT,
+    ThrottlingMiddleware,
+)
+from app.services.backlog_service import BACKLOG_REPLAY
+
+
+class FakeClock:
+    """Управляемые часы для тестов."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_message(user_id: int, message_id: int = 1) -> Message:
+    return Message(
+        message_id=message_id,
+        chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="John"),
+        text="spam",
+        date=datetime.datetime.now(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_throttling_drops_excess_messages_and_warns_once(mocker):
+    """
+    Тест: сверх лимита сообщения не доходят до хэндлера, предупреждение отправляется один раз.
+    """
+    # Arrange
+    clock = FakeClock()
+    middleware = ThrottlingMiddleware(rate=1, burst=3, cooldown=0, clock=clock)
+    handler = AsyncMock()
+    answer_mock = mocker.patch("aiogram.types.Message.answer", new_callable=AsyncMock)
+
+    # Act: 10 сообщений одновременно
+    for i in range(10):
+        await middleware(handler, make_message(123, i), {})
+
+    # Assert
+    assert handler.await_count == 3
+    answer_mock.assert_awaited_once_with(THROTTLED_TEXT)
+
+
+@pytest.mark.asyncio
+async def test_throttling_refills_bucket_over_time(mocker):
+    """
+    Тест: токены восстанавливаются со временем, лимиты пользователей независимы.
+    """
+    # Arrange
+    clock = FakeClock()
+    middleware = ThrottlingMiddleware(rate=2, burst=1, cooldown=0, clock=clock)
+    handler = AsyncMock()
+    mocker.patch("aiogram.types.Message.answer", new_callable=AsyncMock)
+
+    # Act
+    await middleware(handler, make_message(1), {})
+    await middleware(handler, make_message(1), {})  # отброшено
+    await middleware(handler, make_message(2), {})  # другой пользователь
+    clock.now = 0.5
+    await middleware(handler, make_message(1), {})
+
+    # Assert
+    assert handler.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_throttling_creation_cooldown_expires(mocker):
+    """
+    Тест: после отказа в создании сессии сообщения отбрасываются до конца паузы.
+    """
+    # Arrange
+    clock = FakeClock()
+    middleware = ThrottlingMiddleware(rate=0, burst=1, cooldown=30, clock=clock)
+    handler = AsyncMock()
+
+    # Act
+    middleware.start_creation_cooldown(123)
+    await middleware(handler, make_message(123), {})
+    clock.now = 31
+    await middleware(handler, make_message(123), {})
+
+    # Assert
+    assert handler.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_throttling_skips_backlog_replay(mocker):
+    """
+    Тест: сообщения, накопившиеся за время простоя, не отбрасываются лимитом частоты.
+    """
+    # Arrange
+    clock = FakeClock()
+    middleware = ThrottlingMiddleware(rate=1, burst=3, cooldown=0, clock=clock)
+    handler = AsyncMock()
+    answer_mock = mocker.patch("aiogram.types.Message.answer", new_callable=AsyncMock)
+
+    # Act
+    for i in range(20):
+        await middleware(handler, make_message(123, i), {BACKLOG_REPLAY: True})
+
+    # Assert
+    assert handler.await_count == 20
+    answer_mock.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_throttling_limits_topic_menu_callbacks(mocker):
+    """
+    Тест: нажатия кнопок стартового меню ограничиваются лимитом и паузой после отказа,
+    а на отброшенное нажатие бот все равно отвечает.
+    """
+    # Arrange
+    clock = FakeClock()
+    middleware = ThrottlingMiddleware(rate=1, burst=2, cooldown=30, clock=clock)
+    handler = AsyncMock()
+    answer_mock = mocker.patch("aiogram.types.CallbackQuery.answer", new_callable=AsyncMock)
+
+    def make_callback(user_id: int) -> CallbackQuery:
+        return CallbackQuery(
+            id="1", from_user=User(id=user_id, is_bot=False, first_name="John"), chat_instance="1", data="topic:billing"
+        )
+
+    # Act
+    for _ in range(3):
+        await middleware(handler, make_callback(123), {})
+    middleware.start_creation_cooldown(456)
+    await middleware(handler, make_callback(456), {})
+
+    # Assert
+    assert handler.await_count == 2
+    assert answer_mock.await_count == 2
+    answer_mock.assert_any_await(THROTTLED_CALLBACK_TEXT)
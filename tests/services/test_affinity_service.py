@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+from sqlmodel import Session
+
+from app.models.models import SupportSession
+from app.services.affinity_service import LastSession, LastSessionCache, preferred_agent
+
+
+def closed_session(user_id: int, agent_id: int, topic_id: int) -> SupportSession:
+    return SupportSession(
+        user_telegram_id=user_id,
+        agent_telegram_id=agent_id,
+        chat_id=-100,
+        topic_id=topic_id,
+        status="closed",
+        closed_at=datetime.datetime(2024, 1, 1, 10, 0),
+    )
+
+
+def test_warm_loads_latest_session_per_user(session: Session):
+    """
+    Тест: прогрев загружает последнюю закрытую сессию каждого пользователя,
+    а промах полного кэша не обращается к БД.
+    """
+    # Arrange
+    session.add_all(
+        [closed_session(1, 10, 100), closed_session(1, 11, 101), closed_session(2, 12, 102)]
+    )
+    session.commit()
+    cache = LastSessionCache(maxsize=10)
+
+    # Act
+    loaded = cache.warm(session)
+    session.add(closed_session(3, 13, 103))
+    session.commit()
+
+    # Assert
+    assert loaded == 2
+    assert cache.complete is True
+    assert cache.get(session, 1).agent_telegram_id == 11
+    assert cache.get(session, 3) is None  # полный кэш отвечает без запроса к БД
+
+
+def test_cache_falls_back_to_db_after_eviction(session: Session):
+    """
+    Тест: после вытеснения записей промах кэша проверяется по БД.
+    """
+    # Arrange
+    session.add_all([closed_session(1, 10, 100), closed_session(2, 11, 101)])
+    session.commit()
+    cache = LastSessionCache(maxsize=1)
+
+    # Act
+    cache.warm(session)
+
+    # Assert
+    assert cache.complete is False
+    assert len(cache) == 1
+    assert cache.get(session, 1).topic_id == 100
+    assert cache.get(session, 2).topic_id == 101
+    assert len(cache) == 1
+
+
+@pytest.mark.parametrize(
+    "closed_minutes_ago, agent_ids, expected",
+    [(30, [10], 10), (600, [10], None), (30, [11], None)],
+)
+def test_preferred_agent_respects_ttl_and_roster(mocker, closed_minutes_ago, agent_ids, expected):
+    """Тест: закрепление действует в пределах TTL и только для агентов из текущего состава."""
+    # Arrange
+    mocker.patch("app.core.config.settings.AFFINITY_TTL_SECONDS", 3600)
+    mocker.patch("app.core.config.settings.AGENT_IDS", agent_ids)
+    now = datetime.datetime(2024, 1, 1, 12, 0)
+    last = LastSession(10, -100, 100, now - datetime.timedelta(minutes=closed_minutes_ago))
+
+    # Act & Assert
+    assert preferred_agent(last, now) == expected
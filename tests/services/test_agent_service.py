@@ -1,7 +1,18 @@
+from unittest.mock import AsyncMock
+
+import pytest
 from sqlmodel import Session
 
+from app.core.config import settings
 from app.models.models import SupportAgent
-from app.services.agent_service import find_available_agent, sync_agents_from_env
+from app.services.agent_service import (
+    find_available_agent,
+    load_agent_index,
+    reload_agents,
+    sync_agent_skills,
+    sync_agents,
+    sync_agents_from_env,
+)
 
 
 # --- Тесты для функции find_available_agent ---
@@ -141,3 +152,151 @@ def test_sync_agents_deactivates_removed(session: Session, mocker):
     assert deactivated_agent.is_active is False
     assert new_agent is not None
     assert new_agent.is_active is True
+
+
+def test_sync_agents_applies_only_diff(session: Session):
+    """Тест: `sync_agents` меняет только затронутых агентов и не трогает занятость."""
+    # Arrange
+    session.add(SupportAgent(telegram_id=1, is_active=True, is_available=False))
+    session.add(SupportAgent(telegram_id=2, is_active=True, is_available=False))
+    session.add(SupportAgent(telegram_id=3, is_active=False, is_available=True))
+    session.commit()
+
+    # Act
+    diff = sync_agents(session, [1, 3, 4])
+
+    # Assert
+    assert diff.added == [4]
+    assert diff.deactivated == [2]
+    assert diff.reactivated == [3]
+    session.expire_all()
+    removed_agent = session.get(SupportAgent, 2)
+    # Агент с активной сессией деактивирован, но остается занятым до ее закрытия
+    assert removed_agent.is_active is False
+    assert removed_agent.is_available is False
+    assert session.get(SupportAgent, 1).is_available is False
+    assert session.get(SupportAgent, 4).is_active is True
+
+
+def test_reload_agents_reads_env_file(session: Session, mocker, tmp_path):
+    """Тест: `reload_agents` перечитывает .env и обновляет список в настройках."""
+    # Arrange
+    env_file = tmp_path / ".env"
+    env_file.write_text('AGENT_IDS="10,20"\nAGENT_SKILLS=\'{"20": ["ru", "billing"]}\'\n')
+    mocker.patch.dict(settings.model_config, {"env_file": str(env_file)})
+    mocker.patch.object(settings, "AGENT_IDS", [10])
+    mocker.patch.object(settings, "AGENT_SKILLS", {})
+    session.add(SupportAgent(telegram_id=10, is_active=True))
+    session.commit()
+
+    # Act
+    diff = reload_agents(session)
+
+    # Assert
+    assert diff.added == [20]
+    assert diff.skills_updated == [20]
+    assert settings.AGENT_IDS == [10, 20]
+    assert session.get(SupportAgent, 20).skills == "billing,ru"
+
+
+def test_reload_agents_refreshes_new_agent_profiles(session: Session, mocker, tmp_path):
+    """Тест: для добавленных агентов профили запрашиваются в фоне сразу после перечитывания."""
+    # Arrange
+    env_file = tmp_path / ".env"
+    env_file.write_text('AGENT_IDS="10,20"\n')
+    mocker.patch.dict(settings.model_config, {"env_file": str(env_file)})
+    mocker.patch.object(settings, "AGENT_IDS", [10])
+    mocker.patch.object(settings, "AGENT_SKILLS", {})
+    refresh = mocker.patch(
+        "app.services.agent_service.profile_service.refresh_stale_profiles", new_callable=mocker.Mock
+    )
+    start_task = mocker.patch("app.services.agent_service.start_background_task")
+    mock_bot = AsyncMock()
+
+    # Act
+    reload_agents(session, mock_bot)
+    reload_agents(session, mock_bot)
+
+    # Assert: второе перечитывание ничего не изменило и профили не запрашивает
+    refresh.assert_called_once_with(mock_bot)
+    start_task.assert_called_once_with(refresh.return_value, name="agent-profiles")
+
+
+def test_reload_agents_keeps_roster_on_invalid_file(session: Session, mocker, tmp_path):
+    """Тест: при некорректном AGENT_IDS текущий состав агентов сохраняется."""
+    # Arrange
+    env_file = tmp_path / ".env"
+    env_file.write_text('AGENT_IDS="10,abc"\n')
+    mocker.patch.dict(settings.model_config, {"env_file": str(env_file)})
+    mocker.patch.object(settings, "AGENT_IDS", [10])
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        reload_agents(session)
+    assert settings.AGENT_IDS == [10]
+
+
+def test_find_available_agent_routes_by_skills(session: Session):
+    """
+    Тест: выбирается агент с навыками маршрута, при их отсутствии — любой свободный.
+    """
+    # Arrange
+    session.add_all(
+        [
+            SupportAgent(telegram_id=1, skills="en"),
+            SupportAgent(telegram_id=2, skills="billing,ru"),
+        ]
+    )
+    session.commit()
+
+    # Act
+    first = find_available_agent(session, ("ru", "billing"))
+    second = find_available_agent(session, ("ru", "billing"))
+    third = find_available_agent(session, ("ru", "billing"))
+
+    # Assert
+    assert first.telegram_id == 2
+    assert second.telegram_id == 1
+    assert third is None
+
+
+def test_find_available_agent_skips_stale_index_entries(session: Session):
+    """
+    Тест: агент, занятый в обход индекса, не назначается повторно.
+    """
+    # Arrange
+    session.add_all([SupportAgent(telegram_id=1), SupportAgent(telegram_id=2)])
+    session.commit()
+    load_agent_index(session)
+    busy = session.get(SupportAgent, 1)
+    busy.is_available = False
+    session.add(busy)
+    session.commit()
+
+    # Act
+    found_agent = find_available_agent(session)
+
+    # Assert
+    assert found_agent.telegram_id == 2
+    assert find_available_agent(session) is None
+
+
+def test_sync_agent_skills_updates_changed_agents(session: Session):
+    """Тест: навыки приводятся к настройкам, агенты без навыков в настройках их лишаются."""
+    # Arrange
+    session.add_all(
+        [
+            SupportAgent(telegram_id=1, skills="ru"),
+            SupportAgent(telegram_id=2, skills="en"),
+            SupportAgent(telegram_id=3, skills="billing,ru"),
+        ]
+    )
+    session.commit()
+
+    # Act
+    updated = sync_agent_skills(session, {1: ["ru"], 2: ["EN", "tech"], 3: []})
+
+    # Assert
+    assert updated == [2, 3]
+    assert session.get(SupportAgent, 2).skills == "en,tech"
+    assert session.get(SupportAgent, 3).skills == ""
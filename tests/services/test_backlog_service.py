@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+import random
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Chat, Message, Update, User
+from sqlmodel import Session
+
+from app.models.models import ProcessedUpdate
+from app.services.backlog_service import drain_backlog, update_ordering_key
+
+
+def _private_update(update_id: int, user_id: int, text: str) -> Update:
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="User"),
+            text=text,
+            date=datetime.datetime.now(),
+        ),
+    )
+
+
+def _make_bot(mocker, updates):
+    """Создает бота, отдающего накопившиеся обновления пачками, как Bot API."""
+    bot = Bot(token="42:TEST")
+
+    async def get_updates(offset=None, limit=100, timeout=0, allowed_updates=None):
+        pending = [u for u in updates if offset is None or u.update_id >= offset]
+        return pending[:limit]
+
+    mocker.patch.object(bot, "get_updates", side_effect=get_updates)
+    return bot
+
+
+def _make_dispatcher(received):
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        # Случайная задержка перемешала бы порядок без упорядочивания по ключу
+        await asyncio.sleep(random.random() / 1000)
+        received.setdefault(message.chat.id, []).append(int(message.text))
+
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    return dispatcher
+
+
+@pytest.mark.asyncio
+async def test_drain_backlog_preserves_per_user_order(session: Session, mocker):
+    """
+    Тест: все обновления обработаны, порядок внутри пользователя сохранен.
+    """
+    # Arrange
+    updates = [_private_update(i, user_id=i % 7, text=str(i)) for i in range(1, 351)]
+    bot = _make_bot(mocker, updates)
+    received = {}
+    dispatcher = _make_dispatcher(received)
+
+    # Act
+    report = await drain_backlog(dispatcher, bot, session, concurrency=10)
+
+    # Assert
+    assert report.fetched == 350
+    assert report.processed == 350
+    for user_id, texts in received.items():
+        assert texts == sorted(texts)
+    assert sum(len(texts) for texts in received.values()) == 350
+    assert session.get(ProcessedUpdate, (42, 350)) is not None
+
+
+@pytest.mark.asyncio
+async def test_drain_backlog_skips_processed_updates(session: Session, mocker):
+    """
+    Тест: обновления, обработанные до сбоя, повторно не обрабатываются.
+    """
+    # Arrange
+    updates = [_private_update(i, user_id=1, text=str(i)) for i in range(1, 6)]
+    session.add_all(
+        [
+            ProcessedUpdate(bot_id=42, update_id=1),
+            ProcessedUpdate(bot_id=42, update_id=2),
+            # Обновление другого бота с тем же ID не считается обработанным
+            ProcessedUpdate(bot_id=43, update_id=3),
+        ]
+    )
+    session.commit()
+    bot = _make_bot(mocker, updates)
+    received = {}
+    dispatcher = _make_dispatcher(received)
+
+    # Act
+    report = await drain_backlog(dispatcher, bot, session, concurrency=4)
+
+    # Assert
+    assert report.duplicates == 2
+    assert received == {1: [3, 4, 5]}
+
+
+def test_update_ordering_key_for_topic_message():
+    """Тест: сообщения в теме упорядочиваются по (чат, тема)."""
+    update = Update(
+        update_id=1,
+        message=Message(
+            message_id=1,
+            chat=Chat(id=-100, type="supergroup"),
+            message_thread_id=55,
+            date=datetime.datetime.now(),
+            text="hi",
+        ),
+    )
+    assert update_ordering_key(update) == ("topic", -100, 55)
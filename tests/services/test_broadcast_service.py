@@ -0,0 +1,174 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.models import Broadcast, BroadcastDelivery, SupportAgent, SupportSession
+from app.services.broadcast_service import (
+    BLOCKED,
+    SENT,
+    create_broadcast,
+    get_unfinished_broadcasts,
+    iter_pending_recipients,
+    run_broadcast,
+    stop_broadcasts,
+)
+
+METHOD = SendMessage(chat_id=1, text="news")
+
+
+@pytest.fixture(autouse=True)
+def fast_broadcast_settings(mocker):
+    """Снимаем ограничение частоты, чтобы тесты не ждали."""
+    mocker.patch("app.services.broadcast_service.settings.BROADCAST_RATE_LIMIT", 10_000.0)
+    mocker.patch("app.services.broadcast_service.settings.BROADCAST_CONCURRENCY", 5)
+
+
+def _add_users(session: Session, user_ids, sessions_per_user: int = 1):
+    session.add(SupportAgent(telegram_id=1, is_available=True, is_active=True))
+    topic_id = 0
+    for _ in range(sessions_per_user):
+        for user_id in user_ids:
+            topic_id += 1
+            session.add(
+                SupportSession(
+                    user_telegram_id=user_id,
+                    agent_telegram_id=1,
+                    topic_id=topic_id,
+                    status="closed",
+                    bot_id=settings.primary_bot_id,
+                )
+            )
+    session.commit()
+
+
+def test_iter_pending_recipients_pages_distinct_users(session: Session):
+    """
+    Тест: каждый пользователь возвращается один раз, страницы не теряют и не повторяют получателей.
+    """
+    # Arrange
+    _add_users(session, range(1, 8), sessions_per_user=3)
+    broadcast = create_broadcast(session, "news")
+
+    # Act
+    recipients = list(iter_pending_recipients(session, broadcast.id, page_size=2))
+
+    # Assert
+    assert [user_id for user_id, _ in recipients] == list(range(1, 8))
+    assert {bot_id for _, bot_id in recipients} == {settings.primary_bot_id}
+
+
+@pytest.mark.asyncio
+async def test_run_broadcast_records_statuses_and_skips_blocked(session: Session):
+    """
+    Тест: заблокировавшие бота пользователи не прерывают рассылку, итоги сохраняются.
+    """
+    # Arrange
+    _add_users(session, range(1, 101), sessions_per_user=2)
+    broadcast = create_broadcast(session, "news")
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+
+    async def send_message(chat_id, text):
+        if chat_id % 10 == 0:
+            raise TelegramForbiddenError(METHOD, "Forbidden: bot was blocked by the user")
+
+    mock_bot.send_message.side_effect = send_message
+    progress = AsyncMock()
+
+    # Act
+    result = await run_broadcast(session, mock_bot, broadcast.id, on_progress=progress)
+
+    # Assert
+    assert (result.total, result.sent, result.blocked, result.deferred) == (100, 90, 10, 0)
+    assert mock_bot.send_message.await_count == 100
+    progress.assert_awaited_with(100, 100)
+    statuses = session.exec(select(BroadcastDelivery.status)).all()
+    assert statuses.count(SENT) == 90 and statuses.count(BLOCKED) == 10
+    assert session.get(Broadcast, broadcast.id).finished_at is not None
+    assert await run_broadcast(session, mock_bot, broadcast.id) is None
+
+
+@pytest.mark.asyncio
+async def test_run_broadcast_resumes_deferred_users(session: Session):
+    """
+    Тест: после временных ошибок рассылка остается незавершенной и при продолжении
+    отправляется только тем, кому не была доставлена.
+    """
+    # Arrange
+    _add_users(session, range(1, 21))
+    broadcast = create_broadcast(session, "news")
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+
+    async def flaky_send(chat_id, text):
+        if chat_id in (3, 17):
+            raise TelegramNetworkError(METHOD, "timeout")
+
+    mock_bot.send_message.side_effect = flaky_send
+
+    # Act
+    first = await run_broadcast(session, mock_bot, broadcast.id)
+    unfinished = get_unfinished_broadcasts(session)
+    mock_bot.send_message.reset_mock(side_effect=True)
+    second = await run_broadcast(session, mock_bot, broadcast.id)
+
+    # Assert
+    assert (first.sent, first.deferred) == (18, 2)
+    assert [b.id for b in unfinished] == [broadcast.id]
+    assert (second.total, second.sent) == (2, 2)
+    resent_to = sorted(call.kwargs["chat_id"] for call in mock_bot.send_message.await_args_list)
+    assert resent_to == [3, 17]
+    assert get_unfinished_broadcasts(session) == []
+
+
+@pytest.mark.asyncio
+async def test_run_broadcast_retries_after_flood_control(session: Session):
+    """
+    Тест: при `retry_after` сообщение отправляется повторно после паузы.
+    """
+    # Arrange
+    _add_users(session, [42])
+    broadcast = create_broadcast(session, "news")
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+    mock_bot.send_message.side_effect = [
+        TelegramRetryAfter(METHOD, "Flood control exceeded", retry_after=0),
+        None,
+    ]
+
+    # Act
+    result = await run_broadcast(session, mock_bot, broadcast.id)
+
+    # Assert
+    assert result.sent == 1
+    assert mock_bot.send_message.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stop_broadcasts_saves_progress_and_keeps_broadcast_resumable(session: Session):
+    """
+    Тест: остановленная рассылка досылает взятых получателей, сохраняет итоги
+    и остается незавершенной, а оставшиеся пользователи считаются отложенными.
+    """
+    # Arrange
+    _add_users(session, range(1, 101))
+    broadcast = create_broadcast(session, "news")
+    mock_bot = AsyncMock(id=settings.primary_bot_id)
+
+    async def slow_send(chat_id, text):
+        if chat_id == 20:
+            stop_broadcasts()
+        await asyncio.sleep(0.001)
+
+    mock_bot.send_message.side_effect = slow_send
+
+    # Act
+    result = await run_broadcast(session, mock_bot, broadcast.id)
+
+    # Assert
+    assert 20 <= result.sent < 100
+    assert result.deferred == 100 - result.sent
+    assert len(session.exec(select(BroadcastDelivery)).all()) == result.sent
+    assert session.get(Broadcast, broadcast.id).finished_at is None
@@ -0,0 +1,213 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models.models import AgentStats, SupportAgent, SupportSession
+from app.services.agent_service import load_agent_index
+from app.services.bulk_service import close_sessions_bulk, reassign_sessions_bulk
+from app.services.routing_service import agent_index
+from app.services.session_service import close_session
+
+
+@pytest.fixture(autouse=True)
+def fast_bulk_settings(mocker):
+    """Снимаем ограничение частоты, чтобы тесты не ждали."""
+    mocker.patch("app.services.bulk_service.settings.BULK_API_RATE_LIMIT", 10_000.0)
+    mocker.patch("app.services.bulk_service.settings.BULK_CONCURRENCY", 50)
+    mocker.patch("app.services.bulk_service.settings.SUPERGROUP_ID", -100999888)
+
+
+def _add_sessions(session: Session, agent_id: int, topic_ids):
+    session.add(SupportAgent(telegram_id=agent_id, is_available=False, is_active=True))
+    for topic_id in topic_ids:
+        session.add(
+            SupportSession(
+                user_telegram_id=topic_id * 10,
+                agent_telegram_id=agent_id,
+                topic_id=topic_id,
+                status="active",
+            )
+        )
+    session.commit()
+
+
+@pytest.mark.asyncio
+async def test_close_sessions_bulk_closes_all(session: Session):
+    """
+    Позитивный случай: все сессии закрыты, агенты освобождены, пользователи уведомлены.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    _add_sessions(session, 1, range(1, 301))
+    _add_sessions(session, 2, range(301, 501))
+    progress = AsyncMock()
+
+    # Act
+    result = await close_sessions_bulk(session, mock_bot, on_progress=progress)
+
+    # Assert
+    assert result.total == 500
+    assert result.succeeded == 500
+    assert result.failed == 0
+    assert mock_bot.delete_forum_topic.await_count == 500
+    assert mock_bot.send_message.await_count == 500
+    progress.assert_awaited_with(500, 500)
+    active = session.exec(
+        select(SupportSession).where(SupportSession.status == "active")
+    ).all()
+    assert active == []
+    assert session.get(SupportAgent, 1).is_available is True
+    assert session.get(SupportAgent, 2).is_available is True
+
+
+@pytest.mark.asyncio
+async def test_close_sessions_bulk_only_for_agent(session: Session):
+    """
+    Тест: закрываются только сессии указанного агента.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    _add_sessions(session, 1, [101, 102])
+    _add_sessions(session, 2, [201])
+
+    # Act
+    result = await close_sessions_bulk(session, mock_bot, agent_telegram_id=1)
+
+    # Assert
+    assert result.succeeded == 2
+    assert session.get(SupportAgent, 1).is_available is True
+    assert session.get(SupportAgent, 2).is_available is False
+    remaining = session.exec(
+        select(SupportSession).where(SupportSession.status == "active")
+    ).all()
+    assert [s.topic_id for s in remaining] == [201]
+
+
+@pytest.mark.asyncio
+async def test_close_sessions_bulk_keeps_failed_sessions_active(session: Session):
+    """
+    Граничный случай: ошибка удаления темы оставляет сессию активной, а агента занятым.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+
+    async def delete_forum_topic(chat_id, message_thread_id):
+        if message_thread_id == 102:
+            raise Exception("Telegram API Error")
+
+    mock_bot.delete_forum_topic.side_effect = delete_forum_topic
+    _add_sessions(session, 1, [101, 102])
+
+    # Act
+    result = await close_sessions_bulk(session, mock_bot, agent_telegram_id=1)
+
+    # Assert
+    assert result.succeeded == 1
+    failed_session = session.get(SupportSession, result.failed_session_ids[0])
+    assert failed_session.topic_id == 102
+    assert failed_session.status == "active"
+    assert session.get(SupportAgent, 1).is_available is False
+
+
+@pytest.mark.asyncio
+async def test_close_sessions_bulk_skips_sessions_closed_meanwhile(session: Session):
+    """
+    Граничный случай: сессия, закрытая другим путем во время удаления тем,
+    не закрывается повторно, не учитывается в статистике и не получает второе уведомление.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    _add_sessions(session, 1, [101, 102])
+    closed_meanwhile = session.exec(select(SupportSession).where(SupportSession.topic_id == 102)).one()
+
+    async def delete_forum_topic(chat_id, message_thread_id):
+        if message_thread_id == 102:
+            # Например, агент закрыл сессию командой /close_chat
+            closed_meanwhile.status = "closed"
+            session.add(closed_meanwhile)
+            session.commit()
+
+    mock_bot.delete_forum_topic.side_effect = delete_forum_topic
+
+    # Act
+    await close_sessions_bulk(session, mock_bot, agent_telegram_id=1)
+
+    # Assert
+    session.refresh(closed_meanwhile)
+    assert closed_meanwhile.closed_at is None
+    assert session.get(AgentStats, 1).sessions_closed == 1
+    assert mock_bot.send_message.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reassign_sessions_bulk(session: Session):
+    """
+    Позитивный случай: сессии переданы другому агенту, в темы отправлены уведомления.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    _add_sessions(session, 1, [101, 102])
+    session.add(SupportAgent(telegram_id=2, is_available=True, is_active=True))
+    session.commit()
+
+    # Act
+    result = await reassign_sessions_bulk(session, mock_bot, 1, 2)
+
+    # Assert
+    assert result.total == 2
+    assert result.succeeded == 2
+    assert mock_bot.send_message.await_count == 2
+    sessions = session.exec(select(SupportSession)).all()
+    assert {s.agent_telegram_id for s in sessions} == {2}
+    assert session.get(SupportAgent, 1).is_available is True
+    assert session.get(SupportAgent, 2).is_available is False
+
+
+@pytest.mark.asyncio
+async def test_close_one_of_reassigned_sessions_keeps_agent_busy(session: Session):
+    """
+    Тест: после /reassign у агента две сессии; закрытие одной не освобождает его,
+    закрытие последней — освобождает.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    _add_sessions(session, 1, [101, 102])
+    session.add(SupportAgent(telegram_id=2, is_available=True, is_active=True))
+    session.commit()
+    await reassign_sessions_bulk(session, mock_bot, 1, 2)
+    load_agent_index(session)
+    first, second = session.exec(select(SupportSession).order_by(SupportSession.id)).all()
+
+    # Act
+    closed_first = await close_session(session, mock_bot, first)
+    busy_after_first = session.get(SupportAgent, 2).is_available
+    indexed_after_first = 2 in agent_index
+    await close_session(session, mock_bot, second)
+
+    # Assert
+    assert closed_first is True
+    assert busy_after_first is False
+    assert indexed_after_first is False
+    assert session.get(SupportAgent, 2).is_available is True
+    assert 2 in agent_index
+
+
+@pytest.mark.asyncio
+async def test_reassign_sessions_bulk_inactive_target(session: Session):
+    """
+    Негативный случай: целевой агент неактивен, ничего не меняется.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    _add_sessions(session, 1, [101])
+    session.add(SupportAgent(telegram_id=2, is_available=True, is_active=False))
+    session.commit()
+
+    # Act
+    result = await reassign_sessions_bulk(session, mock_bot, 1, 2)
+
+    # Assert
+    assert result is None
+    assert session.get(SupportSession, 1).agent_telegram_id == 1
+    mock_bot.send_message.assert_not_awaited()
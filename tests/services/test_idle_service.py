@@ -0,0 +1,125 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlmodel import Session
+
+from app.models.models import SupportAgent, SupportSession
+from app.services import idle_service
+from app.services.idle_service import TIMEOUT, WARNING, IdleTracker
+
+TOPIC = (-100, 101)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_idle_tracker_warns_then_closes():
+    """
+    Тест: сначала приходит предупреждение, затем — закрытие по таймауту.
+    """
+    # Arrange
+    clock = FakeClock()
+    tracker = IdleTracker(timeout=600, warning=60, clock=clock)
+    tracker.register(topic=TOPIC, user_telegram_id=123)
+
+    # Act / Assert
+    clock.now = 539
+    assert tracker.process_due() == []
+    clock.now = 540
+    assert tracker.process_due() == [(WARNING, TOPIC, 123)]
+    clock.now = 599
+    assert tracker.process_due() == []
+    clock.now = 600
+    assert tracker.process_due() == [(TIMEOUT, TOPIC, 123)]
+    assert len(tracker) == 0
+    assert tracker.topic_for_user(123) is None
+
+
+def test_idle_tracker_activity_postpones_deadline():
+    """
+    Тест: активность в сессии сбрасывает предупреждение и переносит дедлайн.
+    """
+    # Arrange
+    clock = FakeClock()
+    tracker = IdleTracker(timeout=600, warning=60, clock=clock)
+    tracker.register(topic=TOPIC, user_telegram_id=123)
+
+    # Act
+    clock.now = 540
+    assert tracker.process_due() == [(WARNING, TOPIC, 123)]
+    clock.now = 550
+    tracker.touch(TOPIC)
+    clock.now = 600
+
+    # Assert: закрытия нет, новое предупреждение — через 540 с после активности
+    assert tracker.process_due() == []
+    clock.now = 1090
+    assert tracker.process_due() == [(WARNING, TOPIC, 123)]
+
+
+def test_idle_tracker_forget_skips_stale_heap_entries():
+    """
+    Тест: закрытая вручную сессия не порождает действий.
+    """
+    # Arrange
+    clock = FakeClock()
+    tracker = IdleTracker(timeout=600, warning=60, clock=clock)
+    tracker.load([(-100, 101, 1), (-100, 102, 2)])
+
+    # Act
+    tracker.forget(TOPIC)
+    clock.now = 10_000
+
+    # Assert
+    assert tracker.process_due() == [(WARNING, (-100, 102), 2)]
+
+
+def test_idle_tracker_disabled_only_tracks_activity():
+    """
+    Тест: при нулевом таймауте трекер только учитывает сессии, не планируя закрытие.
+    """
+    # Arrange
+    clock = FakeClock()
+    tracker = IdleTracker(timeout=0, warning=60, clock=clock)
+
+    # Act
+    tracker.register(topic=TOPIC, user_telegram_id=123)
+    clock.now = 10_000
+
+    # Assert
+    assert tracker.topic_for_user(123) == TOPIC
+    assert tracker.process_due() == []
+
+
+@pytest.mark.asyncio
+async def test_close_idle_session_uses_close_session(session: Session, mocker):
+    """
+    Тест: неактивная сессия закрывается через session_service.close_session.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    session.add_all(
+        [
+            SupportAgent(telegram_id=456, is_available=False),
+            SupportSession(
+                user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=101
+            ),
+        ]
+    )
+    session.commit()
+    mocker.patch.object(idle_service, "get_session", return_value=iter([session]))
+    close_mock = mocker.patch(
+        "app.services.session_service.close_session", new_callable=AsyncMock, return_value=True
+    )
+
+    # Act
+    await idle_service.close_idle_session(mock_bot, topic=TOPIC, user_telegram_id=123)
+
+    # Assert
+    close_mock.assert_awaited_once()
+    mock_bot.send_message.assert_awaited_once()
@@ -0,0 +1,123 @@
+import datetime
+
+from sqlmodel import Session, select
+
+from app.models.models import MessageLink
+from app.services import message_link_service
+from app.services.message_link_service import (
+    MessageLinkCache,
+    cleanup_message_links,
+    find_peer,
+    flush_message_links,
+    link_messages,
+    message_links,
+)
+
+BOT_ID = 42
+
+
+def test_link_found_in_both_directions_after_cache_eviction(session: Session):
+    """Тест: связь находится из обоих чатов, в том числе после записи в БД и вытеснения из кэша."""
+    # Arrange
+    link_messages(session, BOT_ID, (123, 1), (-100, 50))
+    flush_message_links(session)
+    message_links.clear()
+
+    # Act
+    copy = find_peer(session, BOT_ID, 123, 1)
+    source = find_peer(session, BOT_ID, -100, 50)
+
+    # Assert
+    assert copy == (-100, 50)
+    assert source == (123, 1)
+    assert find_peer(session, BOT_ID, 123, 2) is None
+    assert len(message_links) == 2
+
+
+def test_links_are_separate_per_bot(session: Session):
+    """
+    Тест: связи разных ботов с одинаковыми ID личного чата и сообщения не пересекаются.
+
+    ID сообщений личного чата у каждого бота свои.
+    """
+    # Arrange
+    link_messages(session, 1, (123, 1), (-100, 50))
+    link_messages(session, 2, (123, 1), (-100, 70))
+    flush_message_links(session)
+    message_links.clear()
+
+    # Act & Assert
+    assert find_peer(session, 1, 123, 1) == (-100, 50)
+    assert find_peer(session, 2, 123, 1) == (-100, 70)
+    assert find_peer(session, 2, -100, 50) is None
+
+
+def test_links_written_in_batches(session: Session, mocker):
+    """
+    Тест: новые связи сразу доступны из кэша, а в БД записываются пакетом —
+    периодически или при накоплении FLUSH_BATCH_SIZE связей.
+    """
+    # Arrange
+    mocker.patch.object(message_link_service, "FLUSH_BATCH_SIZE", 4)
+
+    # Act
+    link_messages(session, BOT_ID, (123, 1), (-100, 50))
+    stored_before_batch = session.exec(select(MessageLink)).all()
+    link_messages(session, BOT_ID, (123, 2), (-100, 51))
+
+    # Assert
+    assert stored_before_batch == []
+    assert find_peer(session, BOT_ID, 123, 1) == (-100, 50)
+    assert len(session.exec(select(MessageLink)).all()) == 4
+    assert message_links.unsaved == 0
+    assert flush_message_links(session) == 0
+
+
+def test_relink_replaces_previous_copy(session: Session):
+    """Тест: новая копия того же сообщения заменяет прежнюю связь, старая копия ведет к исходнику."""
+    # Act
+    link_messages(session, BOT_ID, (123, 1), (-100, 50))
+    flush_message_links(session)
+    link_messages(session, BOT_ID, (123, 1), (-100, 60))
+    flush_message_links(session)
+    message_links.clear()
+
+    # Assert
+    assert find_peer(session, BOT_ID, 123, 1) == (-100, 60)
+    assert find_peer(session, BOT_ID, -100, 50) == (123, 1)
+
+
+def test_cache_evicts_least_recently_used():
+    """Тест: кэш ограничен по размеру и вытесняет давно не использованные связи."""
+    # Arrange
+    cache = MessageLinkCache(maxsize=2)
+    cache.put((BOT_ID, 1, 1), (2, 1))
+    cache.put((BOT_ID, 1, 2), (2, 2))
+
+    # Act
+    cache.get((BOT_ID, 1, 1))
+    cache.put((BOT_ID, 1, 3), (2, 3))
+
+    # Assert
+    assert cache.get((BOT_ID, 1, 1)) == (2, 1)
+    assert cache.get((BOT_ID, 1, 2)) is None
+    assert len(cache) == 2
+
+
+def test_cleanup_removes_expired_links(session: Session):
+    """Тест: очистка удаляет только связи старше срока хранения."""
+    # Arrange
+    old = datetime.datetime.now() - datetime.timedelta(days=30)
+    session.add(
+        MessageLink(bot_id=BOT_ID, chat_id=123, message_id=1, peer_chat_id=-100, peer_message_id=50, created_at=old)
+    )
+    session.commit()
+    link_messages(session, BOT_ID, (123, 2), (-100, 51))
+    flush_message_links(session)
+
+    # Act
+    removed = cleanup_message_links(session)
+
+    # Assert
+    assert removed == 1
+    assert {link.message_id for link in session.exec(select(MessageLink)).all()} == {2, 51}
@@ -0,0 +1,55 @@
+from sqlmodel import Session
+
+from app.models.models import SupportSession
+from app.services.placement_service import choose_supergroup
+
+
+def test_choose_supergroup_least_loaded(session: Session, mocker):
+    """
+    Тест: новая сессия попадает в группу с наименьшим числом активных сессий.
+    """
+    # Arrange
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -1)
+    mocker.patch("app.core.config.settings.EXTRA_SUPERGROUP_IDS", [-2, -3])
+    mocker.patch("app.core.config.settings.SESSION_PLACEMENT", "least_loaded")
+    session.add_all(
+        [
+            SupportSession(user_telegram_id=1, agent_telegram_id=1, chat_id=-1, topic_id=1),
+            SupportSession(user_telegram_id=2, agent_telegram_id=1, chat_id=-2, topic_id=1),
+            SupportSession(
+                user_telegram_id=3, agent_telegram_id=1, chat_id=-3, topic_id=1, status="closed"
+            ),
+        ]
+    )
+    session.commit()
+
+    # Act
+    chat_id = choose_supergroup(session, user_telegram_id=42)
+
+    # Assert: закрытые сессии не учитываются
+    assert chat_id == -3
+
+
+def test_choose_supergroup_hash_is_stable(session: Session, mocker):
+    """
+    Тест: при политике hash группа определяется ID пользователя.
+    """
+    # Arrange
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -1)
+    mocker.patch("app.core.config.settings.EXTRA_SUPERGROUP_IDS", [-2])
+    mocker.patch("app.core.config.settings.SESSION_PLACEMENT", "hash")
+
+    # Act / Assert
+    assert choose_supergroup(session, user_telegram_id=10) == -1
+    assert choose_supergroup(session, user_telegram_id=11) == -2
+    assert choose_supergroup(session, user_telegram_id=11) == -2
+
+
+def test_choose_supergroup_single_group(session: Session, mocker):
+    """Тест: при одной группе запрос к БД не нужен."""
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -1)
+    mocker.patch("app.core.config.settings.EXTRA_SUPERGROUP_IDS", [])
+    exec_spy = mocker.spy(session, "exec")
+
+    assert choose_supergroup(session, user_telegram_id=10) == -1
+    exec_spy.assert_not_called()
@@ -0,0 +1,94 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.types import Chat, ForumTopic
+from sqlmodel import Session
+
+from app.models.models import SupportAgent
+from app.services.profile_service import AgentProfile, agent_profiles, load_profiles, refresh_profiles
+from app.services.session_service import create_new_session
+
+
+@pytest.fixture(autouse=True)
+def fast_bulk_settings(mocker):
+    """Снимаем ограничение частоты, чтобы тесты не ждали."""
+    mocker.patch("app.services.bulk_service.settings.BULK_API_RATE_LIMIT", 10_000.0)
+    mocker.patch("app.services.bulk_service.settings.BULK_CONCURRENCY", 50)
+
+
+def _chat(agent_id: int, username=None, first_name="Anna", last_name=None) -> Chat:
+    return Chat(id=agent_id, type="private", username=username, first_name=first_name, last_name=last_name)
+
+
+@pytest.mark.asyncio
+async def test_refresh_profiles_persists_and_caches(session: Session):
+    """
+    Тест: профили запрашиваются для агентов без профиля, сохраняются в БД и кэше;
+    ошибка для одного агента не мешает остальным и не повторяется до истечения TTL.
+    """
+    # Arrange
+    session.add_all(SupportAgent(telegram_id=agent_id) for agent_id in (1, 2, 3))
+    session.commit()
+    mock_bot = AsyncMock()
+
+    async def get_chat(agent_id):
+        if agent_id == 3:
+            raise Exception("chat not found")
+        return _chat(agent_id, username="anna" if agent_id == 1 else None, last_name="Smith")
+
+    mock_bot.get_chat.side_effect = get_chat
+
+    # Act
+    refreshed = await refresh_profiles(session, mock_bot)
+    second = await refresh_profiles(session, mock_bot)
+
+    # Assert
+    assert refreshed == 2
+    assert agent_profiles.mention(1) == "@anna"
+    assert agent_profiles.mention(2) == "Anna Smith"
+    assert agent_profiles.mention(3) == "3"
+    assert session.get(SupportAgent, 1).username == "anna"
+    assert session.get(SupportAgent, 2).full_name == "Anna Smith"
+    assert session.get(SupportAgent, 3).profile_updated_at is not None
+    # Неудачная попытка тоже запоминается: до истечения TTL профиль не запрашивается повторно
+    assert second == 0
+    assert mock_bot.get_chat.await_count == 3
+
+
+def test_load_profiles_fills_cache_from_db(session: Session):
+    """
+    Тест: сохраненные профили доступны сразу после старта, без запросов к Telegram.
+    """
+    # Arrange
+    session.add(SupportAgent(telegram_id=1, username="anna"))
+    session.add(SupportAgent(telegram_id=2, full_name="<Bob>"))
+    session.add(SupportAgent(telegram_id=3))
+    session.commit()
+
+    # Act
+    loaded = load_profiles(session)
+
+    # Assert
+    assert loaded == 2
+    assert agent_profiles.mention(1) == "@anna"
+    assert agent_profiles.mention(2) == "&lt;Bob&gt;"
+
+
+@pytest.mark.asyncio
+async def test_create_new_session_greets_with_cached_name(session: Session):
+    """
+    Тест: приветствие в теме содержит имя агента из кэша, профиль не запрашивается.
+    """
+    # Arrange
+    session.add(SupportAgent(telegram_id=456, is_available=True, is_active=True))
+    session.commit()
+    agent_profiles.put(456, AgentProfile(username="support_anna", full_name="Anna"))
+    mock_bot = AsyncMock(id=42)
+    mock_bot.create_forum_topic.return_value = ForumTopic(message_thread_id=100, name="Topic", icon_color=1)
+
+    # Act
+    await create_new_session(session=session, bot=mock_bot, user_telegram_id=123, user_username="john")
+
+    # Assert
+    assert "@support_anna" in mock_bot.send_message.await_args.kwargs["text"]
+    mock_bot.get_chat.assert_not_awaited()
@@ -0,0 +1,198 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendChatAction
+from sqlmodel import Session, update
+
+from app.core.missing_topics import missing_topics
+from app.models.models import AgentStats, SupportAgent, SupportSession
+from app.services.affinity_service import last_sessions
+from app.services import reconcile_service, session_service
+from app.services.reconcile_service import reconcile, recompute_agent_availability
+
+
+@pytest.fixture(autouse=True)
+def fast_bulk_settings(mocker):
+    """Снимаем ограничение частоты, чтобы тесты не ждали."""
+    mocker.patch("app.services.bulk_service.settings.BULK_API_RATE_LIMIT", 10_000.0)
+    mocker.patch("app.services.bulk_service.settings.BULK_CONCURRENCY", 50)
+
+
+def test_recompute_agent_availability(session: Session):
+    """
+    Тест: занятый агент без сессии освобождается, свободный агент с сессией блокируется.
+    """
+    # Arrange
+    session.add_all(
+        [
+            SupportAgent(telegram_id=1, is_available=False),  # завис после сбоя
+            SupportAgent(telegram_id=2, is_available=True),  # имеет активную сессию
+            SupportAgent(telegram_id=3, is_available=False),  # корректно занят
+            SupportAgent(telegram_id=4, is_available=True),  # корректно свободен
+            SupportSession(user_telegram_id=10, agent_telegram_id=2, topic_id=101),
+            SupportSession(user_telegram_id=11, agent_telegram_id=3, topic_id=102),
+        ]
+    )
+    session.commit()
+
+    # Act
+    fixed = recompute_agent_availability(session)
+
+    # Assert
+    assert fixed == 2
+    assert session.get(SupportAgent, 1).is_available is True
+    assert session.get(SupportAgent, 2).is_available is False
+    assert session.get(SupportAgent, 3).is_available is False
+    assert session.get(SupportAgent, 4).is_available is True
+
+
+def test_recompute_skips_pending_claims(session: Session, mocker):
+    """
+    Граничный случай: агент, занятый незавершенным созданием сессии, не освобождается.
+    """
+    # Arrange
+    session.add(SupportAgent(telegram_id=1, is_available=False))
+    session.commit()
+    mocker.patch.object(session_service, "pending_agent_claims", {1})
+
+    # Act
+    fixed = recompute_agent_availability(session)
+
+    # Assert
+    assert fixed == 0
+    assert session.get(SupportAgent, 1).is_available is False
+
+
+@pytest.mark.asyncio
+async def test_reconcile_closes_sessions_without_topic(session: Session):
+    """
+    Тест: сессия с удаленной темой закрывается, ее агент освобождается, пользователь уведомлен.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+
+    async def send_chat_action(chat_id, action, message_thread_id):
+        if message_thread_id == 102:
+            raise TelegramBadRequest(
+                method=SendChatAction(chat_id=chat_id, action=action),
+                message="Bad Request: message thread not found",
+            )
+
+    mock_bot.send_chat_action.side_effect = send_chat_action
+    session.add_all(
+        [
+            SupportAgent(telegram_id=1, is_available=False),
+            SupportAgent(telegram_id=2, is_available=False),
+            SupportSession(user_telegram_id=10, agent_telegram_id=1, topic_id=101),
+            SupportSession(user_telegram_id=11, agent_telegram_id=2, topic_id=102),
+        ]
+    )
+    session.commit()
+
+    # Act
+    report = await reconcile(session, mock_bot)
+
+    # Assert
+    assert report.sessions_checked == 2
+    assert report.orphaned_session_ids == [2]
+    assert report.agents_fixed == 1
+    assert session.get(SupportSession, 1).status == "active"
+    assert session.get(SupportSession, 2).status == "closed"
+    assert session.get(SupportAgent, 2).is_available is True
+    assert last_sessions.get(session, 11).topic_id == 102
+    mock_bot.send_message.assert_awaited_once_with(
+        chat_id=11, text=reconcile_service.SESSION_LOST_TEXT
+    )
+
+
+@pytest.mark.asyncio
+async def test_reconcile_skips_sessions_closed_during_check(session: Session):
+    """
+    Тест: сессия, закрытая другим путем во время проверки тем, не учитывается
+    повторно, а ее пользователь не получает сообщение о потере сессии.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+
+    async def send_chat_action(chat_id, action, message_thread_id):
+        # Пока тема проверялась, агент закрыл сессию командой /close_chat
+        session.exec(update(SupportSession).where(SupportSession.id == 1).values(status="closed"))
+        session.commit()
+        raise TelegramBadRequest(
+            method=SendChatAction(chat_id=chat_id, action=action),
+            message="Bad Request: message thread not found",
+        )
+
+    mock_bot.send_chat_action.side_effect = send_chat_action
+    session.add_all(
+        [
+            SupportAgent(telegram_id=1, is_available=False),
+            SupportSession(user_telegram_id=10, agent_telegram_id=1, topic_id=101),
+        ]
+    )
+    session.commit()
+
+    # Act
+    report = await reconcile(session, mock_bot)
+
+    # Assert
+    assert report.orphaned_session_ids == []
+    assert session.get(AgentStats, 1) is None
+    mock_bot.send_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_keeps_sessions_on_unknown_errors(session: Session):
+    """
+    Негативный случай: прочие ошибки API не приводят к закрытию сессий.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    mock_bot.send_chat_action.side_effect = Exception("Network error")
+    session.add_all(
+        [
+            SupportAgent(telegram_id=1, is_available=False),
+            SupportSession(user_telegram_id=10, agent_telegram_id=1, topic_id=101),
+        ]
+    )
+    session.commit()
+
+    # Act
+    report = await reconcile(session, mock_bot)
+
+    # Assert
+    assert report.topic_check_errors == 1
+    assert report.has_changes is False
+    assert session.get(SupportSession, 1).status == "active"
+
+
+@pytest.mark.asyncio
+async def test_periodic_reconcile_closes_only_reported_topics(session: Session):
+    """
+    Тест: без полной проверки темы не опрашиваются, закрываются только сессии тем,
+    которые Bot API назвал несуществующими.
+    """
+    # Arrange
+    mock_bot = AsyncMock()
+    session.add_all(
+        [
+            SupportAgent(telegram_id=1, is_available=False),
+            SupportAgent(telegram_id=2, is_available=False),
+            SupportSession(user_telegram_id=10, agent_telegram_id=1, chat_id=-100, topic_id=101),
+            SupportSession(user_telegram_id=11, agent_telegram_id=2, chat_id=-100, topic_id=102),
+        ]
+    )
+    session.commit()
+    missing_topics.report(-100, 102)
+    missing_topics.report(-200, 102)  # тема без активной сессии
+
+    # Act
+    report = await reconcile(session, mock_bot, check_topics=False)
+
+    # Assert
+    mock_bot.send_chat_action.assert_not_awaited()
+    assert report.orphaned_session_ids == [2]
+    assert session.get(SupportSession, 1).status == "active"
+    assert session.get(SupportAgent, 2).is_available is True
+    assert len(missing_topics) == 0
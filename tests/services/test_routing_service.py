@@ -0,0 +1,52 @@
+from app.services.routing_service import AgentIndex, build_route, fallback_keys
+
+
+def test_build_route_normalizes_language_and_topic():
+    """Тест: маршрут состоит из основного языка пользователя и темы обращения."""
+    assert build_route("pt-BR", "Billing") == ("pt", "billing")
+    assert build_route(None, "tech") == ("tech",)
+    assert build_route(None, None) == ()
+
+
+def test_fallback_keys_order():
+    """Тест: маршрут ослабляется от полного набора навыков к отдельным навыкам и любому агенту."""
+    assert fallback_keys(("ru", "billing")) == (
+        frozenset({"ru", "billing"}),
+        frozenset({"ru"}),
+        frozenset({"billing"}),
+        frozenset(),
+    )
+    assert fallback_keys(("ru",), fallback_to_any=False) == (frozenset({"ru"}),)
+
+
+def test_agent_index_prefers_full_match_then_falls_back():
+    """
+    Тест: выбирается агент со всеми навыками маршрута, при его отсутствии — по языку, затем любой.
+    """
+    # Arrange
+    index = AgentIndex()
+    index.load([(1, "en,tech"), (2, "ru,tech"), (3, "billing,ru"), (4, "")])
+
+    # Act & Assert
+    assert index.candidate(("ru", "billing")) == 3
+    index.discard(3)
+    assert index.candidate(("ru", "billing")) == 2
+    index.discard(2)
+    assert index.candidate(("ru", "billing")) == 1
+    assert index.candidate(("ru", "billing"), fallback_to_any=False) is None
+    assert len(index) == 2
+
+
+def test_agent_index_returns_longest_waiting_agent():
+    """Тест: внутри корзины первым выбирается агент, освободившийся раньше остальных."""
+    # Arrange
+    index = AgentIndex()
+    index.add(1, frozenset({"ru"}))
+    index.add(2, frozenset({"ru"}))
+
+    # Act: агент 1 получил сессию и освободился снова
+    index.discard(1)
+    index.add(1, frozenset({"ru"}))
+
+    # Assert
+    assert index.candidate(("ru",)) == 2
@@ -1,9 +1,13 @@
+import asyncio
 from unittest.mock import AsyncMock
 
 import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import ReopenForumTopic
 from aiogram.types import ForumTopic, User
 from sqlmodel import Session
 
+from app.core.circuit_breaker import CircuitOpenError, circuit_breakers
 from app.models.models import SupportAgent, SupportSession
 from app.services.session_service import create_new_session, close_session
 
@@ -18,7 +22,7 @@ async def test_create_new_session_success(session: Session):
     Проверяем, что все вызовы API сделаны и данные в БД корректны.
     """
     # Arrange:
-    mock_bot = AsyncMock()
+    mock_bot = AsyncMock(id=42)
     mock_bot.create_forum_topic.return_value = ForumTopic(
         message_thread_id=100, name="Test Topic", icon_color=1
     )
@@ -40,6 +44,7 @@ async def test_create_new_session_success(session: Session):
     assert new_session.user_telegram_id == user.id
     assert new_session.agent_telegram_id == agent.telegram_id
     assert new_session.topic_id == 100
+    assert new_session.bot_id == 42
     agent_in_db = session.get(SupportAgent, agent.telegram_id)
     assert agent_in_db.is_available is False
     mock_bot.create_forum_topic.assert_awaited_once()
@@ -68,6 +73,29 @@ async def test_create_new_session_no_available_agents(session: Session):
     mock_bot.create_forum_topic.assert_not_awaited()
 
 
+@pytest.mark.asyncio
+async def test_create_new_session_circuit_open_does_not_claim_agent(session: Session):
+    """
+    Граничный случай: при разомкнутом выключателе агент не занимается,
+    а к Telegram не делается ни одного запроса.
+    """
+    # Arrange:
+    mock_bot = AsyncMock()
+    agent = SupportAgent(telegram_id=456, is_available=True, is_active=True)
+    session.add(agent)
+    session.commit()
+    breaker = circuit_breakers["createForumTopic"]
+    for _ in range(breaker.min_requests):
+        breaker.record(failed=True)
+
+    # Act / Assert:
+    with pytest.raises(CircuitOpenError):
+        await create_new_session(session=session, bot=mock_bot, user_telegram_id=123, user_username="Test")
+
+    assert session.get(SupportAgent, 456).is_available is True
+    mock_bot.create_forum_topic.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_create_new_session_api_error_rollbacks_agent_status(session: Session):
     """
@@ -95,6 +123,150 @@ async def test_create_new_session_api_error_rollbacks_agent_status(session: Sess
     assert agent_in_db.is_available is True
 
 
+@pytest.mark.asyncio
+async def test_returning_user_reopens_previous_topic(session: Session, mocker):
+    """
+    Тест: при TOPIC_REUSE повторное обращение открывает прежнюю тему вместо создания новой,
+    а закрытие сессии закрывает тему вместо удаления.
+    """
+    # Arrange
+    mocker.patch("app.core.config.settings.TOPIC_REUSE", True)
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -100)
+    mock_bot = AsyncMock(id=42)
+    session.add_all(
+        [
+            SupportAgent(telegram_id=456),
+            SupportSession(
+                user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=77, status="closed"
+            ),
+        ]
+    )
+    session.commit()
+
+    # Act
+    new_session = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=123, user_username="john"
+    )
+    closed = await close_session(session, mock_bot, new_session)
+
+    # Assert
+    assert new_session.topic_key == (-100, 77)
+    mock_bot.reopen_forum_topic.assert_awaited_once_with(chat_id=-100, message_thread_id=77)
+    mock_bot.create_forum_topic.assert_not_awaited()
+    assert closed is True
+    mock_bot.close_forum_topic.assert_awaited_once_with(chat_id=-100, message_thread_id=77)
+    mock_bot.delete_forum_topic.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_returning_user_gets_new_topic_if_old_one_is_gone(session: Session, mocker):
+    """
+    Тест: если прежнюю тему открыть нельзя (удалена вручную), создается новая.
+    """
+    # Arrange
+    mocker.patch("app.core.config.settings.TOPIC_REUSE", True)
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -100)
+    mock_bot = AsyncMock(id=42)
+    mock_bot.reopen_forum_topic.side_effect = TelegramBadRequest(
+        method=ReopenForumTopic(chat_id=-100, message_thread_id=77),
+        message="Bad Request: TOPIC_ID_INVALID",
+    )
+    mock_bot.create_forum_topic.return_value = ForumTopic(
+        message_thread_id=78, name="Test Topic", icon_color=1
+    )
+    session.add_all(
+        [
+            SupportAgent(telegram_id=456),
+            SupportSession(
+                user_telegram_id=123, agent_telegram_id=456, chat_id=-100, topic_id=77, status="closed"
+            ),
+        ]
+    )
+    session.commit()
+
+    # Act
+    new_session = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=123, user_username="john"
+    )
+
+    # Assert
+    assert new_session.topic_key == (-100, 78)
+    mock_bot.create_forum_topic.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_returning_user_gets_previous_agent(session: Session, mocker):
+    """
+    Тест: вернувшийся пользователь попадает к прежнему агенту, если тот свободен.
+    """
+    # Arrange
+    mocker.patch("app.core.config.settings.AGENT_IDS", [1, 2])
+    mock_bot = AsyncMock(id=42)
+    mock_bot.create_forum_topic.side_effect = [
+        ForumTopic(message_thread_id=topic_id, name="Test Topic", icon_color=1)
+        for topic_id in (100, 101, 102)
+    ]
+    session.add_all([SupportAgent(telegram_id=1), SupportAgent(telegram_id=2)])
+    session.commit()
+    first = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=123, user_username="john"
+    )
+    other = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=124, user_username="jane"
+    )
+    # Агент второго пользователя освобождается раньше и стоит первым в очереди
+    await close_session(session, mock_bot, other)
+    await close_session(session, mock_bot, first)
+
+    # Act
+    returning = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=123, user_username="john"
+    )
+
+    # Assert
+    assert first.agent_telegram_id != other.agent_telegram_id
+    assert returning.agent_telegram_id == first.agent_telegram_id
+
+
+@pytest.mark.asyncio
+async def test_returning_user_waits_for_busy_previous_agent(session: Session, mocker):
+    """
+    Тест: если прежний агент занят, сессия ждет его освобождения не дольше AFFINITY_WAIT_SECONDS.
+    """
+    # Arrange
+    mocker.patch("app.core.config.settings.AGENT_IDS", [1, 2])
+    mocker.patch("app.core.config.settings.AFFINITY_WAIT_SECONDS", 1.0)
+    mock_bot = AsyncMock(id=42)
+    mock_bot.create_forum_topic.side_effect = [
+        ForumTopic(message_thread_id=topic_id, name="Test Topic", icon_color=1)
+        for topic_id in (100, 101, 102)
+    ]
+    session.add_all([SupportAgent(telegram_id=1, skills="ru"), SupportAgent(telegram_id=2)])
+    session.commit()
+    first = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=123, user_username="john", route=("ru",)
+    )
+    await close_session(session, mock_bot, first)
+    busy = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=124, user_username="jane", route=("ru",)
+    )
+
+    async def release_later():
+        await asyncio.sleep(0.05)
+        await close_session(session, mock_bot, busy)
+
+    # Act
+    releasing = asyncio.create_task(release_later())
+    returning = await create_new_session(
+        session=session, bot=mock_bot, user_telegram_id=123, user_username="john"
+    )
+    await releasing
+
+    # Assert
+    assert busy.agent_telegram_id == 1
+    assert returning.agent_telegram_id == 1
+
+
 # --- Тесты для функции close_session ---
 
 
@@ -106,7 +278,7 @@ async def test_close_session_success(session: Session, mocker):
     # Arrange
     mock_bot = AsyncMock()
     # Мокаем ID группы, чтобы тест не зависел от .env файла
-    mocker.patch("app.services.session_service.settings.SUPERGROUP_ID", -100999888)
+    mocker.patch("app.core.config.settings.SUPERGROUP_ID", -100999888)
 
     agent = SupportAgent(telegram_id=456, is_available=False, is_active=True)
     active_session = SupportSession(
@@ -0,0 +1,79 @@
+import datetime
+
+from sqlmodel import Session
+
+from app.models.models import AgentStats, SupportSession
+from app.services import stats_service
+
+NOW = datetime.datetime(2025, 5, 20, 14, 30)
+
+
+def test_counters_roll_up_into_hour_day_and_total(session: Session):
+    """
+    Тест: событие увеличивает счетчики часа, дня и общего итога.
+    """
+    # Act
+    stats_service.record_session_created(session, 456, NOW)
+    stats_service.record_session_created(session, 456, NOW + datetime.timedelta(hours=1))
+    stats_service.record_rejection(session, NOW)
+    session.commit()
+
+    # Assert
+    snapshot = stats_service.get_stats_snapshot(session, NOW)
+    assert snapshot.current_hour.sessions_created == 1
+    assert snapshot.current_hour.sessions_rejected == 1
+    assert snapshot.today.sessions_created == 2
+    assert snapshot.total.sessions_created == 2
+    assert snapshot.agents[0].sessions_assigned == 2
+
+
+def test_first_response_recorded_once(session: Session):
+    """
+    Тест: время первого ответа фиксируется только один раз.
+    """
+    # Arrange
+    support_session = SupportSession(
+        user_telegram_id=123,
+        agent_telegram_id=456,
+        topic_id=101,
+        created_at=NOW - datetime.timedelta(seconds=90),
+    )
+    session.add(support_session)
+    session.commit()
+
+    # Act
+    stats_service.record_first_response(session, support_session, NOW)
+    stats_service.record_first_response(session, support_session, NOW + datetime.timedelta(minutes=5))
+    session.commit()
+
+    # Assert
+    assert support_session.first_response_at == NOW
+    snapshot = stats_service.get_stats_snapshot(session, NOW)
+    assert snapshot.total.first_responses == 1
+    assert snapshot.total.first_response_seconds_total == 90
+    assert session.get(AgentStats, 456).first_responses == 1
+
+
+def test_sessions_closed_aggregated_per_agent(session: Session):
+    """
+    Тест: пакетное закрытие суммирует длительности по агентам.
+    """
+    # Act
+    stats_service.record_sessions_closed(
+        session,
+        [
+            (1, NOW - datetime.timedelta(minutes=10)),
+            (1, NOW - datetime.timedelta(minutes=20)),
+            (2, NOW - datetime.timedelta(minutes=5)),
+        ],
+        NOW,
+    )
+    session.commit()
+
+    # Assert
+    snapshot = stats_service.get_stats_snapshot(session, NOW)
+    assert snapshot.total.sessions_closed == 3
+    assert snapshot.total.duration_seconds_total == 35 * 60
+    agent_1 = session.get(AgentStats, 1)
+    assert agent_1.sessions_closed == 2
+    assert agent_1.duration_seconds_total == 30 * 60